@@ -0,0 +1,61 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+from backend.DATABASE.database import DB_ACQUIRE_TIMEOUT, DB_POOL_SIZE, DatabaseBusyError, get_db_cursor
+from backend.services.metrics import watch_queue
+
+logger = logging.getLogger(__name__)
+
+# One thread per pooled connection: blocking mysql.connector calls run here,
+# never on the event loop.
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', str(DB_POOL_SIZE)))
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+_queued = 0
+_running = 0
+_counter_lock = threading.Lock()
+watch_queue("db_executor", lambda: _queued, lambda: _running)
+
+
+def _run_with_cursor(func: Callable[..., Any], submitted_at: float, timeout: float, args, kwargs) -> Any:
+    global _queued, _running
+    with _counter_lock:
+        _queued -= 1
+    # Time spent queued for a DB thread counts against the acquire timeout.
+    remaining = timeout - (time.monotonic() - submitted_at)
+    if remaining <= 0:
+        raise DatabaseBusyError("Timed out waiting for a database connection")
+    with _counter_lock:
+        _running += 1
+    try:
+        with get_db_cursor(timeout=remaining) as (cursor, conn):
+            return func(cursor, conn, *args, **kwargs)
+    finally:
+        with _counter_lock:
+            _running -= 1
+
+
+async def run_db(func: Callable[..., Any], *args, timeout: float = DB_ACQUIRE_TIMEOUT, **kwargs) -> Any:
+    """Run func(cursor, conn, *args, **kwargs) on the DB thread pool and await its result.
+
+    Raises DatabaseBusyError if no connection is available within `timeout`
+    seconds of the call, including time spent waiting for a DB thread.
+    """
+    global _queued
+    loop = asyncio.get_running_loop()
+    with _counter_lock:
+        _queued += 1
+    # Run in a copy of the caller's context so trace spans nest under the request
+    call = partial(_run_with_cursor, func, time.monotonic(), timeout, args, kwargs)
+    return await loop.run_in_executor(_executor, partial(contextvars.copy_context().run, call))
+
+
+def db_pool_stats() -> Dict[str, int]:
+    return {"workers": DB_EXECUTOR_WORKERS, "pool_size": DB_POOL_SIZE, "queued": _queued, "running": _running}
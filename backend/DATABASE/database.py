@@ -2,10 +2,14 @@ import mysql.connector
 from mysql.connector import Error, pooling
 from contextlib import contextmanager
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import logging
 from typing import Optional
 from pathlib import Path
+from backend.services.metrics import DB_POOL_IN_USE, DB_POOL_WAIT
+from backend.services.tracing import current_trace, span
 
 # Get the project root directory
 ROOT_DIR = Path(__file__).parent.parent.parent
@@ -18,46 +22,109 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Database configuration
-
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))  # mysql.connector caps pools at 32
+DB_ACQUIRE_TIMEOUT = float(os.getenv('DB_ACQUIRE_TIMEOUT', '5'))
 
 DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': 'nn03092005neeA@',
-    'database': 'chatbot',
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': int(os.getenv('DB_PORT', '3306')),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'database': os.getenv('DB_NAME', 'chatbot'),
     'pool_name': 'mypool',
-    'pool_size': 5
+    'pool_size': DB_POOL_SIZE
 }
-# Create connection pool
-try:
-    connection_pool = mysql.connector.pooling.MySQLConnectionPool(**DB_CONFIG)
-    logger.info("Database connection pool created successfully")
-except Error as e:
-    logger.error(f"Error creating connection pool: {e}")
-    raise
-
-def get_db_connection():
-    """Get a database connection from the pool"""
-    print(f"DB_HOST: {os.getenv('DB_HOST')}")
-    print(f"DB_USER: {os.getenv('DB_USER')}")
-    print(f"DB_PASSWORD: {os.getenv('DB_PASSWORD')}")
-    print(f"DB_NAME: {os.getenv('DB_NAME')}")
+# The pool opens DB_POOL_SIZE connections, so it is created on first use
+# (or by init_db() at startup) rather than at import.
+connection_pool = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool():
+    """Create the connection pool on first call"""
+    global connection_pool
+    if connection_pool is None:
+        with _pool_lock:
+            if connection_pool is None:
+                try:
+                    connection_pool = mysql.connector.pooling.MySQLConnectionPool(**DB_CONFIG)
+                    logger.info("Database connection pool created successfully")
+                except Error as e:
+                    logger.error(f"Error creating connection pool: {e}")
+                    raise
+    return connection_pool
+
+# mysql.connector fails immediately when the pool is exhausted; this semaphore
+# makes callers wait for a free connection, up to an acquire timeout.
+_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+_in_use = 0
+_in_use_lock = threading.Lock()
+DB_POOL_IN_USE.set_function(lambda: _in_use, "mysql")
+
+class DatabaseBusyError(Exception):
+    """No pooled connection became free before the acquire timeout"""
+
+def _count_in_use(delta: int) -> None:
+    global _in_use
+    with _in_use_lock:
+        _in_use += delta
+
+def get_db_connection(timeout: Optional[float] = None):
+    """Get a database connection from the pool, waiting up to timeout seconds for one"""
+    timeout = DB_ACQUIRE_TIMEOUT if timeout is None else timeout
+    start = time.perf_counter()
+    if timeout <= 0 or not _pool_slots.acquire(timeout=timeout):
+        DB_POOL_WAIT.labels("mysql").observe(time.perf_counter() - start)
+        logger.error("Timed out waiting for a database connection")
+        raise DatabaseBusyError("Timed out waiting for a database connection")
     try:
-        connection = connection_pool.get_connection()
-        return connection
+        connection = get_connection_pool().get_connection()
     except Error as e:
+        _pool_slots.release()
         logger.error(f"Error getting connection from pool: {e}")
         raise
+    finally:
+        DB_POOL_WAIT.labels("mysql").observe(time.perf_counter() - start)
+    _count_in_use(1)
+    return connection
+
+def release_db_connection(conn) -> None:
+    """Return a connection obtained from get_db_connection() to the pool"""
+    try:
+        conn.close()
+    finally:
+        _count_in_use(-1)
+        _pool_slots.release()
+
+class _TracedCursor:
+    """Cursor wrapper adding a trace span per statement; only used inside traced requests"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, *args, **kwargs):
+        with span("db.query", statement=operation):
+            return self._cursor.execute(operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        with span("db.query", statement=operation, many=True):
+            return self._cursor.executemany(operation, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
 
 @contextmanager
-def get_db_cursor():
+def get_db_cursor(timeout: Optional[float] = None):
     """Context manager for database cursor"""
     conn = None
     cursor = None
     try:
-        conn = get_db_connection()
+        with span("db.acquire", pool="mysql"):
+            conn = get_db_connection(timeout)
         cursor = conn.cursor(dictionary=True, buffered=True)
-        yield cursor, conn
+        yield (_TracedCursor(cursor) if current_trace() is not None else cursor), conn
     except Error as e:
         logger.error(f"Database error: {e}")
         if conn:
@@ -68,62 +135,22 @@ def get_db_cursor():
             if cursor:
                 cursor.close()
             if conn:
-                conn.close()
+                release_db_connection(conn)
         except Error as e:
             logger.error(f"Error closing database connection: {e}")
             raise
 
 def init_db():
-    """Initialize the database with required tables"""
+    """Initialize the database by applying pending schema migrations"""
+    from backend.migrations import upgrade
+    conn = None
     try:
-        with get_db_cursor() as (cursor, conn):
-            # Create users table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    email VARCHAR(255) UNIQUE NOT NULL,
-                    name VARCHAR(255) NOT NULL,
-                    phone VARCHAR(20),
-                    country VARCHAR(100),
-                    state VARCHAR(100),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Create chat_conversations table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chat_conversations (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT NOT NULL,
-                    title VARCHAR(255) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    email_status ENUM('pending', 'sent', 'failed') DEFAULT 'pending',
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                )
-            """)
-
-            # Create qa_pairs table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS qa_pairs (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT NOT NULL,
-                    conversation_id INT NOT NULL,
-                    question TEXT NOT NULL,
-                    answer TEXT NOT NULL,
-                    category VARCHAR(50) DEFAULT 'general',
-                    rating INT,
-                    suggestion TEXT,
-                    is_helpful BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    FOREIGN KEY (conversation_id) REFERENCES chat_conversations(id)
-                )
-            """)
-
-            conn.commit()
-            logger.info("Database initialized successfully")
+        conn = get_db_connection()
+        upgrade(conn)
+        logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
         raise
-
+    finally:
+        if conn:
+            release_db_connection(conn)
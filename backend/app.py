@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+logger = logging.getLogger(__name__)
+
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
+WARMUP_RETRY_DELAY = float(os.getenv("WARMUP_RETRY_DELAY", "5"))
+
+
+class MetricsMiddleware:
+    """Records request count and latency per route template, method and status (see /metrics).
+
+    Plain ASGI rather than BaseHTTPMiddleware so streamed responses pass
+    through untouched; the duration covers the whole body, including streams.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        from backend.services.metrics import observe_http
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            # Templates like /chat/history/{email} keep the label set bounded
+            observe_http(scope["method"], getattr(route, "path", "unmatched"), status, time.perf_counter() - start)
+
+
+class TracingMiddleware:
+    """Traces sampled requests (TRACE_SAMPLE_RATE, PROFILE_SAMPLE_RATE or the TRACE_HEADER token).
+
+    Untraced requests pay one header lookup. Traced ones get an X-Trace-Id
+    response header naming the span tree (and folded-stack profile) written
+    to TRACE_DIR.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        from backend.services import tracing
+
+        header = tracing.TRACE_HEADER.lower().encode()
+        value = next((v.decode() for k, v in scope["headers"] if k == header), None)
+        started = tracing.begin(f"{scope['method']} {scope['path']}", value)
+        if started is None:
+            await self.app(scope, receive, send)
+            return
+        trace_id = started[0].id
+        status = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-trace-id", trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            route = scope.get("route")
+            trace = tracing.end(started, route=getattr(route, "path", None), status=status)
+            await run_in_threadpool(tracing.write, trace)
+
+
+def _warm_up() -> None:
+    """Open DB pools, apply migrations, start LLM/hashing clients and load the semantic index before taking traffic."""
+    from sqlalchemy import text
+    from backend.DATABASE.database import init_db
+    from backend.database import get_db_session
+    from backend.services.model_registry import model_registry
+    from backend.services.password_hasher import password_hasher
+    from backend.services.conversation_purge import conversation_purger
+    from backend.services.semantic_cache import semantic_cache
+
+    init_db()  # mysql.connector pool + schema migrations
+    with next(get_db_session()) as db:
+        db.execute(text("SELECT 1"))  # SQLAlchemy pool
+    model_registry.warm_up()
+    password_hasher.warm_up()
+    semantic_cache.warm_up()
+    conversation_purger.start()  # resumes purges left unfinished by the last run
+
+
+def _shut_down() -> None:
+    """Flush buffered writes and stop background workers."""
+    from backend.services.chat_writer import chat_writer
+    from backend.services.conversation_purge import conversation_purger
+    from backend.services.email_queue import email_queue
+    from backend.services.password_hasher import password_hasher
+
+    chat_writer.close()
+    conversation_purger.stop()
+    email_queue.stop()
+    password_hasher.shutdown()
+
+
+async def _warm_up_until_ready(app: FastAPI) -> None:
+    while True:
+        try:
+            await run_in_threadpool(_warm_up)
+            app.state.ready = True
+            logger.info("Warm-up complete, ready for traffic")
+            return
+        except Exception as e:
+            app.state.warmup_error = str(e)
+            logger.error(f"Warm-up failed, retrying in {WARMUP_RETRY_DELAY}s: {e}")
+            await asyncio.sleep(WARMUP_RETRY_DELAY)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.warmup_error = None
+    # Warm up in the background so liveness answers while MySQL or Gemini are slow to come up
+    warmup = asyncio.create_task(_warm_up_until_ready(app))
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        warmup.cancel()
+        await run_in_threadpool(_shut_down)
+
+
+def create_app() -> FastAPI:
+    """ASGI application serving the chat, user and feedback APIs."""
+    from backend.routes import chat, feedback, user
+
+    app = FastAPI(title="CA Chatbot API", lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization", "X-Gemini-Api-Key"],
+    )
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(chat.router)
+    app.include_router(feedback.router)
+    app.include_router(user.router, prefix="/user")
+
+    @app.exception_handler(StarletteHTTPException)
+    async def chat_error_shape(request: Request, exc: StarletteHTTPException):
+        # The frontend reads {"error": ...} from /chat endpoints (the Flask shape) and {"detail": ...} from /user
+        if request.url.path.startswith("/chat"):
+            return JSONResponse({"error": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+        return await http_exception_handler(request, exc)
+
+    @app.get("/healthz")
+    async def healthz():
+        """Liveness: the process is up and serving the event loop."""
+        return {"status": "ok"}
+
+    @app.get("/readyz")
+    async def readyz(request: Request):
+        """Readiness: green only once warm-up has finished (and until shutdown starts)."""
+        if request.app.state.ready:
+            return {"status": "ready"}
+        return JSONResponse({"status": "starting", "error": request.app.state.warmup_error}, status_code=503)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus text format; each worker process reports its own series."""
+        from backend.services.metrics import CONTENT_TYPE, registry
+        return Response(registry.expose(), media_type=CONTENT_TYPE)
+
+    return app
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import List
+
+from backend.DATABASE.async_database import run_db
+from backend.DATABASE.database import get_db_cursor
+
+LOGIN_QUERY = """
+    SELECT id, email, name, phone, country, state, created_at, last_active, password
+    FROM users WHERE email = %s
+"""
+
+
+def _login_query(cursor, conn, email: str) -> None:
+    cursor.execute(LOGIN_QUERY, (email,))
+    cursor.fetchone()
+
+
+def _slow_query(cursor, conn, seconds: float) -> None:
+    # Stands in for a heavy aggregate such as the chat-stats query
+    cursor.execute("SELECT SLEEP(%s)", (seconds,))
+    cursor.fetchall()
+
+
+async def _blocking_login(email: str) -> None:
+    # What the routes used to do: blocking driver calls straight on the event loop
+    with get_db_cursor() as (cursor, conn):
+        _login_query(cursor, conn, email)
+
+
+async def _blocking_slow(seconds: float) -> None:
+    with get_db_cursor() as (cursor, conn):
+        _slow_query(cursor, conn, seconds)
+
+
+async def _async_login(email: str) -> None:
+    await run_db(_login_query, email)
+
+
+async def _async_slow(seconds: float) -> None:
+    await run_db(_slow_query, seconds)
+
+
+async def _measure_logins(login, email: str, count: int, interval: float) -> List[float]:
+    latencies = []
+
+    async def one():
+        start = time.perf_counter()
+        await login(email)
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    for _ in range(count):
+        tasks.append(asyncio.create_task(one()))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def _summary(latencies: List[float]) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+async def _scenario(mode: str, email: str, logins: int, slow_seconds: float, with_slow: bool) -> dict:
+    login, slow = (_async_login, _async_slow) if mode == "async" else (_blocking_login, _blocking_slow)
+    slow_task = asyncio.create_task(slow(slow_seconds)) if with_slow else None
+    await asyncio.sleep(0.05)  # let the slow query start first
+    latencies = await _measure_logins(login, email, logins, interval=slow_seconds / max(logins, 1) / 2)
+    if slow_task:
+        await slow_task
+    return _summary(latencies)
+
+
+async def main_async(args) -> int:
+    report = {}
+    for mode in ("blocking", "async"):
+        report[mode] = {
+            "idle": await _scenario(mode, args.email, args.logins, args.slow_seconds, with_slow=False),
+            "with_slow_query": await _scenario(mode, args.email, args.logins, args.slow_seconds, with_slow=True),
+        }
+    print(json.dumps(report, indent=2))
+
+    idle = report["async"]["idle"]["p95_ms"]
+    loaded = report["async"]["with_slow_query"]["p95_ms"]
+    if loaded > idle * args.max_ratio + args.slack_ms:
+        print(f"FAIL: async login p95 {loaded}ms under a slow query vs {idle}ms idle", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Login latency with and without a concurrent slow DB query")
+    parser.add_argument("--email", default="bench@example.com", help="user to look up (need not exist)")
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--slow-seconds", type=float, default=2.0)
+    parser.add_argument("--max-ratio", type=float, default=2.0, help="allowed p95 growth factor under load")
+    parser.add_argument("--slack-ms", type=float, default=20.0)
+    return asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import argparse
+import json
+import smtplib
+import socketserver
+import sys
+import threading
+import time
+
+from backend.services.email_queue import EmailQueue
+from backend.services.email_service import build_message
+
+SENDER = "bench@localhost"
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept and discard mail, with an optional per-command delay."""
+
+    def _reply(self, line: str) -> None:
+        time.sleep(self.server.delay)
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self) -> None:
+        self.server.connections += 1
+        self._reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self._reply("250 sink")
+            elif command == "DATA":
+                self._reply("354 end with .")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.messages += 1
+                self._reply("250 queued")
+            elif command == "QUIT":
+                self._reply("221 bye")
+                return
+            else:
+                self._reply("250 ok")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay: float):
+        super().__init__(("127.0.0.1", 0), _SinkHandler)
+        self.delay = delay
+        self.connections = 0
+        self.messages = 0
+
+
+def _per_message_connections(port: int, count: int) -> dict:
+    # What send_email does: a new connection (and handshake) for every message
+    start = time.perf_counter()
+    for i in range(count):
+        msg = build_message(SENDER, f"user{i}@example.com", "Benchmark", "<p>hello</p>", "hello")
+        with smtplib.SMTP("127.0.0.1", port) as server:
+            server.sendmail(SENDER, f"user{i}@example.com", msg.as_string())
+    elapsed = time.perf_counter() - start
+    return {"messages": count, "seconds": round(elapsed, 3), "sent_per_second": round(count / elapsed, 2)}
+
+
+def _queued(port: int, count: int, workers: int, batch_size: int) -> dict:
+    pipeline = EmailQueue(host="127.0.0.1", port=port, user=None, password=None, starttls=False,
+                          sender=SENDER, workers=workers, batch_size=batch_size, maxsize=count)
+    start = time.perf_counter()
+    for i in range(count):
+        pipeline.enqueue(f"user{i}@example.com", "Benchmark", "<p>hello</p>", "hello")
+    enqueue_seconds = time.perf_counter() - start
+    while pipeline.sent + pipeline.failed < count:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    stats = pipeline.stats()
+    pipeline.stop()
+    return {
+        "messages": count,
+        "workers": workers,
+        "enqueue_ms": round(enqueue_seconds * 1000, 2),
+        "seconds": round(elapsed, 3),
+        "sent_per_second": round(count / elapsed, 2),
+        "failed": stats["failed"],
+        "connections_opened": stats["connections_opened"],
+        "max_queue_lag_ms": stats["queue_lag_ms"]["max_sent"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Email throughput: per-message connections vs. the pooled queue")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--server-delay-ms", type=float, default=2.0, help="latency the sink adds to each reply")
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.server_delay_ms / 1000)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    port = sink.server_address[1]
+    try:
+        report = {
+            "server_delay_ms": args.server_delay_ms,
+            "per_message_connection": _per_message_connections(port, args.messages),
+            "queued": _queued(port, args.messages, args.workers, args.batch_size),
+            "sink": {"connections": sink.connections, "messages": sink.messages},
+        }
+    finally:
+        sink.shutdown()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import List
+
+import bcrypt
+
+from backend.services.password_hasher import PasswordHasher
+
+PASSWORD = "correct horse battery staple"
+
+
+def _worker_counts(max_workers: int) -> List[int]:
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+
+async def _loop_lag(stop: asyncio.Event) -> float:
+    """Worst delay seen by a 10ms ticker: how long the event loop was blocked."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - start - 0.01)
+    return worst
+
+
+async def _inline(hashed: str, logins: int) -> dict:
+    # What login used to do: bcrypt straight on the event loop
+    async def one():
+        bcrypt.checkpw(PASSWORD.encode(), hashed.encode())
+
+    return await _run(one, logins)
+
+
+async def _pooled(hasher: PasswordHasher, hashed: str, logins: int) -> dict:
+    async def one():
+        await hasher.verify(PASSWORD, hashed)
+
+    return await _run(one, logins)
+
+
+async def _run(one, logins: int) -> dict:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return {
+        "logins": logins,
+        "seconds": round(elapsed, 3),
+        "logins_per_second": round(logins / elapsed, 2),
+        "max_loop_lag_ms": round(await lag_task * 1000, 2),
+    }
+
+
+async def main_async(args) -> int:
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=args.rounds)).decode()
+    report = {"rounds": args.rounds, "cpu_count": os.cpu_count(), "inline": await _inline(hashed, args.logins), "pool": {}}
+
+    for workers in _worker_counts(args.max_workers):
+        hasher = PasswordHasher(workers=workers, rounds=args.rounds, max_pending=args.logins)
+        hasher.warm_up()
+        try:
+            await hasher.verify(PASSWORD, hashed)
+            report["pool"][workers] = await _pooled(hasher, hashed, args.logins)
+        finally:
+            hasher.shutdown()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Login (bcrypt verify) throughput vs. hashing worker count")
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    return asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
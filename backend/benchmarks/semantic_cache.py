@@ -0,0 +1,126 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# Offline tooling for services/semantic_cache.py:
+#   rebuild   embed every rated first question from the database and save the index
+#   evaluate  precision/recall on labelled question pairs, and the share of LLM calls
+#             a chronological replay of the chat history would have saved
+
+DEFAULT_THRESHOLDS = "0.70,0.75,0.80,0.85,0.88,0.90,0.95"
+
+
+def rebuild(args) -> int:
+    from backend.services.semantic_cache import SEMANTIC_CACHE_PATH, build_index, create_embedder
+    path = args.output or SEMANTIC_CACHE_PATH
+    start = time.perf_counter()
+    embedder = create_embedder()
+    index = build_index(embedder)
+    tmp = f"{path}.tmp"
+    index.save(tmp, embedder=embedder.name, built_at=time.time())
+    os.replace(tmp, path)  # workers never see a half-written file
+    print(json.dumps({
+        "path": path,
+        "embedder": embedder.name,
+        "seconds": round(time.perf_counter() - start, 1),
+        **index.stats(),
+    }, indent=2))
+    return 0
+
+
+def _pair_metrics(pairs: List[Dict], similarities: List[float], thresholds: List[float]) -> Dict:
+    results = {}
+    for threshold in thresholds:
+        predicted = [s >= threshold for s in similarities]
+        true_positive = sum(1 for p, pair in zip(predicted, pairs) if p and pair["same"])
+        reused = sum(predicted)
+        same = sum(1 for pair in pairs if pair["same"])
+        precision = true_positive / reused if reused else 1.0
+        recall = true_positive / same if same else 0.0
+        results[f"{threshold:.2f}"] = {
+            "precision": round(precision, 4),
+            "recall": round(recall, 4),
+            "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+            "reused": reused,
+        }
+    return results
+
+
+def evaluate_pairs(embedder, path: str, thresholds: List[float]) -> Dict:
+    """Pairs are JSON lines {"a": "...", "b": "...", "same": true|false}; "same" means b may reuse a's answer."""
+    pairs = [json.loads(line) for line in Path(path).read_text().splitlines() if line.strip()]
+    a = embedder.embed([pair["a"] for pair in pairs])
+    b = embedder.embed([pair["b"] for pair in pairs])
+    similarities = [float(x @ y) for x, y in zip(a, b)]
+    return {"pairs": len(pairs), "thresholds": _pair_metrics(pairs, similarities, thresholds)}
+
+
+def replay_history(embedder, thresholds: List[float]) -> Dict:
+    """Walk first questions in id order against an index of the earlier rated ones, as production would."""
+    from backend.services.semantic_cache import SemanticCache, first_turns
+    from backend.services.vector_index import VectorIndex
+    cache = SemanticCache(enabled=False, min_similarity=-1.0)  # rating check only
+    index = VectorIndex(embedder.dim)
+    best: List[float] = []  # per question: similarity of an eligible nearest neighbour, or -1
+    searched_ms = 0.0
+    for rows in first_turns(rated_only=False):
+        vectors = embedder.embed([row.user_message for row in rows])
+        for row, vector in zip(rows, vectors):
+            start = time.perf_counter()
+            matches = index.search(vector)
+            searched_ms += (time.perf_counter() - start) * 1000
+            best.append(matches[0]["similarity"] if matches and cache.passes(matches[0]) else -1.0)
+            if row.rating_count:
+                index.add(row.id, vector, float(row.rating_sum), int(row.rating_count))
+    questions = len(best)
+    return {
+        "questions": questions,
+        "indexed": len(index),
+        "avg_search_ms": round(searched_ms / questions, 3) if questions else 0.0,
+        "llm_calls_saved": {
+            f"{t:.2f}": round(sum(1 for s in best if s >= t) / questions, 4) if questions else 0.0
+            for t in thresholds
+        },
+    }
+
+
+def evaluate(args) -> int:
+    from backend.services.semantic_cache import create_embedder
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    embedder = create_embedder()
+    report: Dict = {"embedder": embedder.name}
+    if args.pairs:
+        report["pairs"] = evaluate_pairs(embedder, args.pairs, thresholds)
+    if args.replay:
+        report["replay"] = replay_history(embedder, thresholds)
+    print(json.dumps(report, indent=2))
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build and evaluate the semantic answer-reuse index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("rebuild", help="embed rated first questions from the database and save the index")
+    build.add_argument("--output", help="index file (default: SEMANTIC_CACHE_PATH)")
+    check = sub.add_parser("evaluate", help="precision/recall per similarity threshold and LLM calls saved")
+    check.add_argument("--pairs", help="JSON lines of labelled question pairs")
+    check.add_argument("--replay", action="store_true", help="replay the chat history from the database")
+    check.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="comma-separated similarity thresholds")
+    check.add_argument("--save", help="write the report here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "evaluate" and not (args.pairs or args.replay):
+        parser.error("evaluate needs --pairs and/or --replay")
+    return rebuild(args) if args.command == "rebuild" else evaluate(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+
+# Fail when a cold import of the app takes longer than this (median of --runs)
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+# Point every dependency at something unreachable: importing must not need MySQL, SMTP or Gemini
+OFFLINE_ENV = {
+    "DB_HOST": "127.0.0.1",
+    "DB_PORT": "1",
+    "SMTP_HOST": "127.0.0.1",
+    "SMTP_PORT": "1",
+    "GEMINI_API_KEY": "",
+}
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])  # importlib.import_module bypasses -X importtime
+module = sys.modules[sys.argv[1]]
+if sys.argv[2]:
+    getattr(module, sys.argv[2])()
+print(json.dumps({"ms": (time.perf_counter() - start) * 1000}))
+"""
+
+# "import time:  self [us] | cumulative | imported package"
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def _run_once(target: str) -> Dict:
+    module, _, factory = target.partition(":")
+    env = {**os.environ, **OFFLINE_ENV, "PYTHONDONTWRITEBYTECODE": "1"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD, module, factory],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, timeout=120,
+    )
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"importing {target} failed offline:\n" + "\n".join(errors[-20:]))
+
+    modules: Dict[str, Dict] = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            self_us, cumulative_us, name = match.groups()
+            modules[name] = {"self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000}
+    total = json.loads(proc.stdout.strip().splitlines()[-1])["ms"]
+    return {"total_ms": total, "modules": modules}
+
+
+def _summarize(target: str, runs: List[Dict], top: int) -> Dict:
+    totals = [run["total_ms"] for run in runs]
+    names = set().union(*(run["modules"] for run in runs))
+    per_module = {}
+    for name in names:
+        samples = [run["modules"][name] for run in runs if name in run["modules"]]
+        per_module[name] = {
+            "cumulative_ms": round(statistics.median(s["cumulative_ms"] for s in samples), 2),
+            "self_ms": round(statistics.median(s["self_ms"] for s in samples), 2),
+        }
+    slowest = sorted(per_module.items(), key=lambda item: item[1]["cumulative_ms"], reverse=True)
+    ours = {name: stats for name, stats in per_module.items() if name.split(".")[0] in ("backend", "services", "config")}
+    return {
+        "target": target,
+        "runs": len(runs),
+        "median_ms": round(statistics.median(totals), 2),
+        "min_ms": round(min(totals), 2),
+        "max_ms": round(max(totals), 2),
+        "modules_imported": len(per_module),
+        "slowest": dict(slowest[:top]),
+        "project_modules": dict(sorted(ours.items(), key=lambda item: item[1]["cumulative_ms"], reverse=True)),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold-start import time per module (python -X importtime)")
+    parser.add_argument("targets", nargs="*", default=["backend.app:create_app"],
+                        help="module or module:factory to import in a fresh interpreter")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--max-ms", type=float, default=STARTUP_BUDGET_MS, help="fail above this median")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs. --baseline")
+    parser.add_argument("--save", help="write the report here (e.g. a new baseline)")
+    args = parser.parse_args()
+
+    report = {}
+    failures = []
+    for target in args.targets:
+        try:
+            runs = [_run_once(target) for _ in range(args.runs)]
+        except RuntimeError as e:
+            failures.append(str(e))
+            continue
+        summary = report[target] = _summarize(target, runs, args.top)
+        if summary["median_ms"] > args.max_ms:
+            failures.append(f"{target}: {summary['median_ms']}ms exceeds the {args.max_ms}ms budget")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        for target, summary in report.items():
+            if target not in baseline:
+                continue
+            allowed = baseline[target]["median_ms"] * (1 + args.tolerance)
+            if summary["median_ms"] > allowed:
+                failures.append(
+                    f"{target}: {summary['median_ms']}ms regressed past baseline "
+                    f"{baseline[target]['median_ms']}ms (+{args.tolerance:.0%} allowed)"
+                )
+
+    print(json.dumps(report, indent=2))
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2))
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,13 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from backend.models.chat import Base
+from sqlalchemy.pool import QueuePool
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
+from backend.services.metrics import DB_POOL_IN_USE, DB_POOL_WAIT
+from backend.services.tracing import span
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '../.env'))
 
@@ -20,13 +24,79 @@ DB_NAME = os.getenv('DB_NAME', 'chatbot')
 
 DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Created on first use so importing this module never touches MySQL
+_engine = None
+_engine_lock = threading.Lock()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
-# Create tables if they don't exist
-Base.metadata.create_all(bind=engine)
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports checkout wait time to /metrics"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            with span("db.acquire", pool="sqlalchemy"):
+                return super()._do_get()
+        finally:
+            DB_POOL_WAIT.labels("sqlalchemy").observe(time.perf_counter() - start)
+
+def _trace_queries(engine):
+    """Trace spans for each statement, flush and commit; span() is a no-op outside traced requests"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        context._trace_span = span("db.query", statement=statement)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        context._trace_span.finish()
+
+    @event.listens_for(engine, "handle_error")
+    def failed_execute(exception_context):
+        query_span = getattr(exception_context.execution_context, "_trace_span", None)
+        if query_span is not None:
+            query_span.finish()
+
+    def start(name):
+        def listener(session, *args):
+            session.info[name] = span(name)
+        return listener
+
+    def finish(name):
+        def listener(session, *args):
+            pending = session.info.pop(name, None)
+            if pending is not None:
+                pending.finish()
+        return listener
+
+    event.listen(SessionLocal, "before_flush", start("db.flush"))
+    event.listen(SessionLocal, "after_flush_postexec", finish("db.flush"))
+    event.listen(SessionLocal, "before_commit", start("db.commit"))
+    event.listen(SessionLocal, "after_commit", finish("db.commit"))
+    event.listen(SessionLocal, "after_rollback", finish("db.commit"))
+
+def get_engine():
+    """Shared SQLAlchemy engine, created on first call"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(DATABASE_URL, pool_pre_ping=True, poolclass=TimedQueuePool)
+                SessionLocal.configure(bind=_engine)
+                _trace_queries(_engine)
+                DB_POOL_IN_USE.set_function(_engine.pool.checkedout, "sqlalchemy")
+    return _engine
+
+def init_db():
+    """Create or upgrade tables and indexes (see backend/migrations); call at startup"""
+    from backend.migrations import upgrade
+    conn = get_engine().raw_connection()
+    try:
+        upgrade(conn)
+    finally:
+        conn.close()
 
 def get_db_session():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
@@ -1,16 +1,12 @@
 from flask import Flask, request, jsonify
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '../.env'))
 
-app = Flask(__name__)
-
-SYSTEM_PROMPT = "You are an expert tax and finance chatbot of advit itec, specializing in GST filing, income tax, financial planning, and accounting services.\n\nGuidelines:\n1. Always respond only in English.\n2. Focus on accuracy and clarity in tax and finance-related information.\n3. Keep explanations clear, concise, and professional.\n4. For GST and tax-related queries, always mention applicable sections and rules.\n5. Break down complex financial concepts into simple steps.\n6. Provide disclaimers when necessary about consulting a qualified professional.\n7. Stay updated with current tax rates and GST slabs.\n\nKey Areas of Expertise:\n- GST Filing and Compliance\n- Income Tax Returns\n- Tax Planning and Savings\n- Financial Record Keeping\n- Business Accounting\n- Corporate Tax\n- Tax Deductions and Exemptions\n\nRemember:\n- Always provide accurate tax-related information\n- Include relevant tax laws and regulations\n- Suggest proper documentation requirements\n- Explain filing deadlines and compliance requirements\n\n**Formatting Instructions:**\n- ALWAYS use markdown for your output.\n- Use bullet points or numbered lists for all answers.\n- Add TWO line breaks between each point or paragraph for clear separation.\n- Never return a single long paragraph.\n- Never combine multiple points in one paragraph.\n- Each point must be on its own line, separated by two line breaks.\n- Use bold or italics for emphasis where appropriate.\n- Mimic the style and clarity of ChatGPT.\n\nDo not provide responses in any language other than English.\nImportant: Always include disclaimers for complex tax matters and recommend consulting a certified tax professional for specific cases."
+from backend.services.model_registry import model_registry
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+app = Flask(__name__)
 
 @app.route('/chat', methods=['POST'])
 def chat():
@@ -18,10 +14,8 @@ def chat():
     user_query = data.get('user_query', '')
     if not user_query.strip():
         return jsonify({'error': 'user_query is required'}), 400
-    prompt = f"{SYSTEM_PROMPT}\n\nUser: {user_query}"
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        response = model.generate_content(prompt)
+        response = model_registry.get().generate_content(user_query)
         return jsonify({'response': response.text if hasattr(response, 'text') else str(response)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
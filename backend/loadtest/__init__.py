@@ -0,0 +1 @@
+# End-to-end load tests against a local fake LLM; run with python -m backend.loadtest
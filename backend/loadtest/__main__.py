@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from backend.loadtest.runner import SCENARIOS, LoadState, run_step, seed
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+
+
+def _get_json(url: str, timeout: float = 5.0) -> Optional[Dict[str, Any]]:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+def _wait_until(url: str, timeout: float, process: Optional[subprocess.Popen] = None) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        if _get_json(url, timeout=1.0) is not None:
+            return
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def _reset_database(name: str) -> None:
+    """Recreate the throwaway schema on the local MySQL server named by DB_HOST/DB_PORT/DB_USER."""
+    import mysql.connector
+
+    conn = mysql.connector.connect(
+        host=os.getenv("DB_HOST", "localhost"), port=int(os.getenv("DB_PORT", "3306")),
+        user=os.getenv("DB_USER", "root"), password=os.getenv("DB_PASSWORD", ""),
+    )
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+        cursor.execute(f"CREATE DATABASE `{name}` CHARACTER SET utf8mb4")
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _start(args: List[str], env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, "-m", *args], cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def run(args: argparse.Namespace) -> int:
+    processes: List[subprocess.Popen] = []
+    log_dir = Path(args.log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    base_url = args.target.rstrip("/") if args.target else f"http://127.0.0.1:{args.port}"
+    fake_url = args.fake_llm_url or f"http://127.0.0.1:{args.fake_llm_port}"
+    try:
+        if not args.fake_llm_url:
+            # Latency, tokens/s, error and timeout rates come from the FAKE_LLM_* environment
+            processes.append(_start(["backend.loadtest.fake_gemini", "--port", str(args.fake_llm_port)],
+                                    dict(os.environ), log_dir / "fake_llm.log"))
+            _wait_until(f"{fake_url}/stats", 30, processes[-1])
+
+        if not args.target:
+            _reset_database(args.db_name)
+            env = {
+                **os.environ,
+                "LLM_BACKEND": "fake",
+                "FAKE_LLM_URL": fake_url,
+                "DB_NAME": args.db_name,
+                "PORT": str(args.port),
+                "HOST": "127.0.0.1",
+                "WEB_CONCURRENCY": str(args.workers),
+                # Every simulated user shares one IP; keep the per-IP buckets out of capacity numbers
+                "RATE_LIMIT_ENABLED": "true" if args.rate_limits else "false",
+            }
+            processes.append(_start(["backend.serve"], env, log_dir / "app.log"))
+            _wait_until(f"{base_url}/readyz", args.startup_timeout, processes[-1])
+
+        state = LoadState(args.users, unique_queries=not args.repeat_queries)
+        asyncio.run(seed(base_url, state))
+
+        results = []
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                result = asyncio.run(run_step(base_url, scenario, concurrency, args.duration, args.warmup, state))
+                results.append(result)
+                print(f"{scenario:<9} c={concurrency:<4} {result['throughput_rps']:>8} rps  "
+                      f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms  "
+                      f"errors={result['error_rate']:.2%}", flush=True)
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "git_revision": _git_revision(),
+                "target": base_url,
+                "workers": None if args.target else args.workers,
+                "users": args.users,
+                "duration_s": args.duration,
+                "warmup_s": args.warmup,
+                "unique_queries": not args.repeat_queries,
+            },
+            "fake_llm": _get_json(f"{fake_url}/stats"),
+            "results": results,
+            # Server-side view of the same run, from the existing stats endpoints
+            "server_stats": {path: _get_json(f"{base_url}{path}") for path in (
+                "/chat/llm-stats", "/chat/write-stats", "/chat/cache-stats", "/user/auth-stats",
+            )},
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Report written to {args.output}")
+        return 0
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def compare(args: argparse.Namespace) -> int:
+    """Print per-step deltas between two reports; fail if a p95 regressed past the threshold."""
+    old = {(r["scenario"], r["concurrency"]): r for r in json.loads(Path(args.old).read_text())["results"]}
+    new = {(r["scenario"], r["concurrency"]): r for r in json.loads(Path(args.new).read_text())["results"]}
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        deltas = []
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "error_rate"):
+            change = (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            deltas.append(f"{metric}={after[metric]} ({change:+.1%})")
+            if metric == "p95_ms" and change > args.threshold:
+                regressions.append(f"{key[0]} c={key[1]}: p95 {before[metric]}ms -> {after[metric]}ms")
+        print(f"{key[0]:<9} c={key[1]:<4} " + "  ".join(deltas))
+    for regression in regressions:
+        print(f"REGRESSION: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.loadtest", description="End-to-end load tests")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    up = sub.add_parser("run", help="start a fake LLM and the app, then run the scenarios")
+    up.add_argument("--scenarios", type=lambda s: s.split(","), default=list(SCENARIOS),
+                    help=f"comma separated, from {','.join(SCENARIOS)}")
+    up.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 16, 64])
+    up.add_argument("--duration", type=float, default=20.0, help="measured seconds per step")
+    up.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before each step")
+    up.add_argument("--users", type=int, default=50)
+    up.add_argument("--repeat-queries", action="store_true", help="reuse questions so the response cache can hit")
+    up.add_argument("--rate-limits", action="store_true", help="keep per-user/IP rate limiting on in the app")
+    up.add_argument("--target", help="URL of an already running app (skips starting the app and the DB reset)")
+    up.add_argument("--port", type=int, default=8100)
+    up.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    up.add_argument("--db-name", default="chatbot_loadtest", help="dropped and recreated on the local MySQL")
+    up.add_argument("--fake-llm-url", help="use an already running fake LLM")
+    up.add_argument("--fake-llm-port", type=int, default=8090)
+    up.add_argument("--startup-timeout", type=float, default=120.0)
+    up.add_argument("--log-dir", default="loadtest-logs")
+    up.add_argument("--output", default="loadtest-report.json")
+
+    diff = sub.add_parser("compare", help="compare two reports")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=0.1, help="allowed p95 increase")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "run":
+        unknown = set(args.scenarios) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        return run(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
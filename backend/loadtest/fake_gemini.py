@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+from typing import Any, Dict
+
+from aiohttp import web
+
+# Behaviour of the stand-in LLM (CLI flags override these)
+FAKE_LLM_TTFT_MEDIAN_MS = float(os.getenv("FAKE_LLM_TTFT_MEDIAN_MS", "400"))
+FAKE_LLM_TTFT_P95_MS = float(os.getenv("FAKE_LLM_TTFT_P95_MS", "1500"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "80"))
+FAKE_LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "250"))
+FAKE_LLM_CHUNK_TOKENS = int(os.getenv("FAKE_LLM_CHUNK_TOKENS", "8"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_TIMEOUT_RATE = float(os.getenv("FAKE_LLM_TIMEOUT_RATE", "0"))
+FAKE_LLM_HANG_SECONDS = float(os.getenv("FAKE_LLM_HANG_SECONDS", "120"))
+
+WORDS = ("tax", "GST", "income", "return", "filing", "deduction", "section", "audit",
+         "invoice", "credit", "assessment", "liability", "rebate", "advance", "notice")
+
+
+class FakeGemini:
+    """Answers /generate like a slow, occasionally failing LLM.
+
+    Time to first token is lognormal (median and p95 configurable), the body
+    is generated at a fixed tokens/second, and a configurable fraction of
+    requests fail with 503 or hang past any client timeout.
+    """
+
+    def __init__(self, ttft_median_ms: float, ttft_p95_ms: float, tokens_per_second: float,
+                 output_tokens: int, chunk_tokens: int, error_rate: float, timeout_rate: float,
+                 hang_seconds: float, seed: int = 0):
+        self.mu = math.log(ttft_median_ms / 1000)
+        # 1.645 = z-score of the 95th percentile
+        self.sigma = max(math.log(max(ttft_p95_ms, ttft_median_ms) / ttft_median_ms) / 1.645, 0.0)
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.chunk_tokens = chunk_tokens
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.output_tokens_sent = 0
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "ttft_median_ms": round(math.exp(self.mu) * 1000, 1),
+            "ttft_p95_ms": round(math.exp(self.mu + 1.645 * self.sigma) * 1000, 1),
+            "tokens_per_second": self.tokens_per_second,
+            "output_tokens": self.output_tokens,
+            "chunk_tokens": self.chunk_tokens,
+            "error_rate": self.error_rate,
+            "timeout_rate": self.timeout_rate,
+        }
+
+    def _ttft(self) -> float:
+        return self.random.lognormvariate(self.mu, self.sigma)
+
+    def _tokens(self) -> int:
+        return max(1, int(self.output_tokens * self.random.uniform(0.5, 1.5)))
+
+    def _text(self, tokens: int) -> str:
+        return " ".join(self.random.choice(WORDS) for _ in range(tokens))
+
+    async def generate(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            roll = self.random.random()
+            if roll < self.timeout_rate:
+                self.timeouts += 1
+                await asyncio.sleep(self.hang_seconds)
+                return web.json_response({"error": "deadline exceeded"}, status=504)
+            await asyncio.sleep(self._ttft())
+            if roll < self.timeout_rate + self.error_rate:
+                self.errors += 1
+                return web.json_response({"error": "model overloaded"}, status=503)
+
+            prompt = json.dumps(body.get("contents", "")) + body.get("system_instruction", "")
+            usage = {"prompt_tokens": len(prompt) // 4 + 1, "output_tokens": self._tokens()}
+            self.output_tokens_sent += usage["output_tokens"]
+            if not body.get("stream"):
+                await asyncio.sleep(usage["output_tokens"] / self.tokens_per_second)
+                return web.json_response({"text": self._text(usage["output_tokens"]), "usage": usage})
+
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            remaining = usage["output_tokens"]
+            while remaining > 0:
+                tokens = min(self.chunk_tokens, remaining)
+                remaining -= tokens
+                await response.write(json.dumps({"text": self._text(tokens) + " "}).encode() + b"\n")
+                if remaining:
+                    await asyncio.sleep(tokens / self.tokens_per_second)
+            await response.write(json.dumps({"usage": usage}).encode() + b"\n")
+            await response.write_eof()
+            return response
+        finally:
+            self.in_flight -= 1
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            **self.config(),
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "output_tokens_sent": self.output_tokens_sent,
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/generate", self.generate)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local stand-in for Gemini (use with LLM_BACKEND=fake)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--ttft-median-ms", type=float, default=FAKE_LLM_TTFT_MEDIAN_MS)
+    parser.add_argument("--ttft-p95-ms", type=float, default=FAKE_LLM_TTFT_P95_MS)
+    parser.add_argument("--tokens-per-second", type=float, default=FAKE_LLM_TOKENS_PER_SECOND)
+    parser.add_argument("--output-tokens", type=int, default=FAKE_LLM_OUTPUT_TOKENS)
+    parser.add_argument("--chunk-tokens", type=int, default=FAKE_LLM_CHUNK_TOKENS)
+    parser.add_argument("--error-rate", type=float, default=FAKE_LLM_ERROR_RATE)
+    parser.add_argument("--timeout-rate", type=float, default=FAKE_LLM_TIMEOUT_RATE)
+    parser.add_argument("--hang-seconds", type=float, default=FAKE_LLM_HANG_SECONDS)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    fake = FakeGemini(
+        args.ttft_median_ms, args.ttft_p95_ms, args.tokens_per_second, args.output_tokens,
+        args.chunk_tokens, args.error_rate, args.timeout_rate, args.hang_seconds, args.seed,
+    )
+    print(f"Fake Gemini on http://{args.host}:{args.port} {json.dumps(fake.config())}", flush=True)
+    web.run_app(fake.app(), host=args.host, port=args.port, print=None, access_log=None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import asyncio
+import math
+import random
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+
+PASSWORD = "LoadTest#2024"
+QUESTIONS = (
+    "What is the GST rate on restaurant services?",
+    "How do I claim a deduction under section 80C?",
+    "When is the due date for filing ITR for salaried individuals?",
+    "Is advance tax applicable to freelancers?",
+    "How is long term capital gain on equity taxed?",
+    "What documents are needed for a GST refund?",
+    "Can I switch between the old and new tax regime every year?",
+    "How do I respond to an income tax notice under section 143(1)?",
+)
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def user_email(index: int) -> str:
+    return f"loadtest-{index}@example.com"
+
+
+class LoadState:
+    """Fixtures shared by the scenarios: seeded users and message ids to rate."""
+
+    def __init__(self, users: int, unique_queries: bool = True):
+        self.users = users
+        self.unique_queries = unique_queries
+        self.message_ids: List[int] = []
+        self.sessions: Dict[str, int] = {}
+        self.random = random.Random(0)
+        self.sequence = 0
+
+    def email(self) -> str:
+        return user_email(self.random.randrange(self.users))
+
+    def question(self) -> str:
+        self.sequence += 1
+        question = self.random.choice(QUESTIONS)
+        # A unique suffix defeats the response cache so every request reaches the LLM
+        return f"{question} (#{self.sequence})" if self.unique_queries else question
+
+    def remember(self, email: str, body: Dict[str, Any]) -> None:
+        if body.get("message_id"):
+            self.message_ids.append(body["message_id"])
+            del self.message_ids[:-10000]
+        if body.get("session_id"):
+            self.sessions[email] = body["session_id"]
+
+
+Scenario = Callable[[aiohttp.ClientSession, str, LoadState], Awaitable[int]]
+
+
+async def _chat(session: aiohttp.ClientSession, base_url: str, state: LoadState) -> int:
+    email = state.email()
+    payload = {"user_query": state.question(), "email": email}
+    # Every other turn continues the user's conversation, so history is replayed to the LLM
+    if email in state.sessions and state.random.random() < 0.5:
+        payload["session_id"] = state.sessions[email]
+    async with session.post(f"{base_url}/chat", json=payload) as response:
+        if response.status == 200:
+            state.remember(email, await response.json())
+        else:
+            await response.read()
+        return response.status
+
+
+async def _history(session: aiohttp.ClientSession, base_url: str, state: LoadState) -> int:
+    async with session.get(f"{base_url}/chat/history/{state.email()}", params={"limit": 20}) as response:
+        await response.read()
+        return response.status
+
+
+async def _login(session: aiohttp.ClientSession, base_url: str, state: LoadState) -> int:
+    async with session.post(f"{base_url}/user/login", json={"email": state.email(), "password": PASSWORD}) as response:
+        await response.read()
+        return response.status
+
+
+async def _feedback(session: aiohttp.ClientSession, base_url: str, state: LoadState) -> int:
+    chat_id = state.random.choice(state.message_ids)
+    payload = {"rating": state.random.randint(1, 5), "suggestion": "load test"}
+    async with session.post(f"{base_url}/chat/feedback/{chat_id}", json=payload) as response:
+        await response.read()
+        return response.status
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "chat": _chat,
+    "history": _history,
+    "login": _login,
+    "feedback": _feedback,
+}
+
+
+async def seed(base_url: str, state: LoadState, chats_per_user: int = 2) -> None:
+    """Create the load-test users and a little chat history for them (idempotent for users)."""
+    async with aiohttp.ClientSession() as session:
+        for index in range(state.users):
+            profile = {"email": user_email(index), "password": PASSWORD, "name": f"Load Test {index}",
+                       "phone": "9999999999"}
+            async with session.post(f"{base_url}/user/profile", json=profile) as response:
+                if response.status not in (200, 409):
+                    raise RuntimeError(f"Seeding user {index} failed: {response.status} {await response.text()}")
+        for index in range(state.users):
+            for _ in range(chats_per_user):
+                email = user_email(index)
+                payload = {"user_query": state.question(), "email": email, "session_id": state.sessions.get(email)}
+                async with session.post(f"{base_url}/chat", json=payload) as response:
+                    if response.status == 200:
+                        state.remember(email, await response.json())
+    if not state.message_ids:
+        raise RuntimeError("Seeding produced no chat messages; is the fake LLM reachable from the app?")
+
+
+async def run_step(base_url: str, scenario: str, concurrency: int, duration: float, warmup: float,
+                   state: LoadState, timeout: float = 60.0) -> Dict[str, Any]:
+    """Closed loop: `concurrency` workers send back-to-back requests for warmup + duration seconds.
+
+    Only requests started after the warm-up period are measured.
+    """
+    call = SCENARIOS[scenario]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        while True:
+            began = time.perf_counter()
+            if began >= stop_at:
+                return
+            status: Optional[int] = None
+            error: Optional[str] = None
+            try:
+                status = await call(session, base_url, state)
+            except asyncio.TimeoutError:
+                error = "timeout"
+            except aiohttp.ClientError as e:
+                error = type(e).__name__
+            if began < measure_from:
+                continue
+            latencies.append(time.perf_counter() - began)
+            if error is not None:
+                errors[error] += 1
+            else:
+                statuses[str(status)] += 1
+                if status >= 400:
+                    errors[f"http_{status}"] += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    elapsed = min(time.perf_counter(), stop_at + timeout) - measure_from
+    return summarize(scenario, concurrency, latencies, statuses, errors, elapsed)
+
+
+def summarize(scenario: str, concurrency: int, latencies: List[float], statuses: Counter,
+              errors: Counter, elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    requests = len(ordered)
+    failed = sum(errors.values())
+
+    def ms(value: float) -> float:
+        return round(value * 1000, 2)
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": failed,
+        "error_rate": round(failed / requests, 4) if requests else 0.0,
+        "throughput_rps": round((requests - failed) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1]) if ordered else 0.0,
+        "status_codes": dict(statuses),
+        "error_kinds": dict(errors),
+    }
@@ -0,0 +1,3 @@
+from backend.migrations.runner import current_version, pending_migrations, upgrade
+
+__all__ = ["current_version", "pending_migrations", "upgrade"]
@@ -0,0 +1,80 @@
+import argparse
+import logging
+import sys
+
+from backend.migrations.explain_check import check_query_plans
+from backend.migrations.runner import current_version, pending_migrations, upgrade
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.migrations", description="Manage the chatbot database schema")
+    sub = parser.add_subparsers(dest="command", required=True)
+    up = sub.add_parser("upgrade", help="apply pending migrations")
+    up.add_argument("--target", type=int, default=None, help="stop at this version")
+    sub.add_parser("status", help="show the current version and pending migrations")
+    sub.add_parser("check", help="EXPLAIN the known queries and fail on any full table scan")
+    rebuild = sub.add_parser("rebuild-stats", help="recompute user_chat_stats from chat history")
+    rebuild.add_argument("--email", default=None, help="rebuild only this user")
+    rebuild.add_argument("--after", default="", help="resume a full rebuild after this email")
+    archive = sub.add_parser("archive", help="move idle sessions to compressed segment files")
+    archive.add_argument("--days", type=int, default=None, help="idle days before archiving (ARCHIVE_AFTER_DAYS)")
+    archive.add_argument("--rate", type=float, default=None,
+                         help="sessions per second (ARCHIVE_SESSIONS_PER_SECOND)")
+    archive.add_argument("--after", type=int, default=0, help="resume after this session id")
+    archive.add_argument("--limit", type=int, default=None, help="stop after archiving this many sessions")
+    compact = sub.add_parser("compact-archive", help="reclaim segment space of deleted and restored sessions")
+    compact.add_argument("--min-live-ratio", type=float, default=0.5,
+                         help="rewrite segments with less than this share of referenced bytes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from backend.database import get_engine
+    conn = get_engine().raw_connection()
+    try:
+        if args.command == "upgrade":
+            applied = upgrade(conn, target=args.target)
+            print(f"Applied {len(applied)} migration(s); schema version {current_version(conn)}")
+        elif args.command == "status":
+            print(f"Schema version: {current_version(conn)}")
+            for version, description in pending_migrations(conn):
+                print(f"  pending {version:04d}: {description}")
+        elif args.command == "check":
+            cursor = conn.cursor()
+            try:
+                problems = check_query_plans(cursor)
+            finally:
+                cursor.close()
+            for problem in problems:
+                print(f"FULL SCAN: {problem['query']} on {problem['table']}")
+            if problems:
+                return 1
+            print("All known queries use an index")
+        elif args.command == "rebuild-stats":
+            from backend.services.chat_stats import rebuild_all, rebuild_user
+            if args.email:
+                cursor = conn.cursor()
+                try:
+                    stats = rebuild_user(cursor, args.email)
+                    conn.commit()
+                finally:
+                    cursor.close()
+                print(f"Rebuilt chat stats for {args.email}: {stats}")
+            else:
+                print(f"Rebuilt chat stats for {rebuild_all(conn, after=args.after)} users")
+        elif args.command == "archive":
+            from backend.services.chat_archive import ARCHIVE_AFTER_DAYS, ARCHIVE_SESSIONS_PER_SECOND, ArchiveJob
+            job = ArchiveJob(after_days=args.days or ARCHIVE_AFTER_DAYS,
+                             rate=args.rate if args.rate is not None else ARCHIVE_SESSIONS_PER_SECOND)
+            result = job.run(after=args.after, max_sessions=args.limit)
+            print(f"Archived {result['archived_sessions']} sessions ({result['archived_messages']} messages, "
+                  f"{result['compressed_bytes']} bytes) through id {result['last_id']}")
+        elif args.command == "compact-archive":
+            from backend.services.chat_archive import compact_segments
+            print(f"Compacted archive: {compact_segments(min_live_ratio=args.min_live_ratio)}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
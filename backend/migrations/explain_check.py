@@ -0,0 +1,76 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# The application's hot queries, in the shape the code issues them. Every one
+# must be served by an index; a plan with access type ALL is a full table scan.
+KNOWN_QUERIES: List[Tuple[str, str, tuple]] = [
+    ("session_page", """
+        SELECT id, user_email, title, created_at FROM chat_sessions
+        WHERE user_email = %s AND deleted_at IS NULL ORDER BY created_at DESC, id DESC LIMIT 21
+    """, ("user@example.com",)),
+    ("session_message_count", "SELECT COUNT(*) FROM chat_history WHERE session_id = %s", (1,)),
+    ("session_messages_page", """
+        SELECT id, user_message, bot_response, created_at FROM chat_history
+        WHERE session_id = %s AND id > %s ORDER BY id LIMIT 21
+    """, (1, 0)),
+    ("user_recent_messages", """
+        SELECT id FROM chat_history WHERE user_email = %s ORDER BY created_at DESC LIMIT 20
+    """, ("user@example.com",)),
+    ("chat_search", """
+        SELECT c.id, MATCH(c.user_message, c.bot_response) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+        FROM chat_history c JOIN chat_sessions s ON s.id = c.session_id AND s.deleted_at IS NULL
+        WHERE c.user_email = %s AND MATCH(c.user_message, c.bot_response) AGAINST (%s IN NATURAL LANGUAGE MODE)
+        ORDER BY score DESC, c.id DESC LIMIT 21
+    """, ("invoice", "user@example.com", "invoice")),
+    ("purge_batch", "SELECT id FROM chat_history WHERE session_id = %s ORDER BY id LIMIT 1000", (1,)),
+    ("purge_sweep", """
+        SELECT id FROM chat_sessions WHERE deleted_at IS NOT NULL ORDER BY deleted_at LIMIT 1000
+    """, ()),
+    ("archive_candidates", """
+        SELECT id FROM chat_sessions
+        WHERE id > %s AND id < %s AND deleted_at IS NULL
+          AND COALESCE(last_message_at, created_at) < NOW() - INTERVAL 90 DAY
+        ORDER BY id LIMIT 500
+    """, (0, 1 << 52)),
+    ("archived_session_page", """
+        SELECT id, title, created_at, message_count FROM archived_sessions
+        WHERE user_email = %s ORDER BY created_at DESC, id DESC LIMIT 21
+    """, ("user@example.com",)),
+    ("archived_segment_frames", """
+        SELECT id, frame_offset, frame_length FROM archived_sessions WHERE segment = %s ORDER BY frame_offset
+    """, ("2026/01/segment.jsonl.zst",)),
+    ("feedback_for_message", "SELECT id, rating FROM feedback WHERE chat_id = %s", (1,)),
+    ("user_by_email", "SELECT id, password FROM users WHERE email = %s", ("user@example.com",)),
+    ("user_chat_stats", """
+        SELECT total_chats, total_sessions, rated_responses, helpful_responses, last_activity
+        FROM user_chat_stats WHERE user_email = %s
+    """, ("user@example.com",)),
+    ("user_recent_sessions", """
+        SELECT id, title, created_at, last_message_at, message_count FROM chat_sessions
+        WHERE user_email = %s AND deleted_at IS NULL ORDER BY created_at DESC, id DESC LIMIT 5
+    """, ("user@example.com",)),
+    ("user_stats_rebuild_counts", """
+        SELECT session_id, COUNT(*), MAX(created_at) FROM chat_history
+        WHERE user_email = %s GROUP BY session_id
+    """, ("user@example.com",)),
+    ("qa_pairs_for_conversation", "SELECT id FROM qa_pairs WHERE conversation_id = %s", (1,)),
+    ("user_conversations", """
+        SELECT id, title FROM chat_conversations WHERE user_id = %s ORDER BY last_active DESC LIMIT 5
+    """, (1,)),
+]
+
+
+def check_query_plans(cursor) -> List[Dict[str, Any]]:
+    """EXPLAIN every known query and return the plan rows that fall back to a full scan."""
+    problems = []
+    for name, sql, params in KNOWN_QUERIES:
+        cursor.execute("EXPLAIN " + sql, params)
+        columns = [column[0] for column in cursor.description]
+        for row in cursor.fetchall():
+            plan = dict(zip(columns, row))
+            if plan.get("type") == "ALL":
+                problems.append({"query": name, "table": plan.get("table"), "plan": plan})
+                logger.error(f"Query '{name}' does a full scan of {plan.get('table')}")
+    return problems
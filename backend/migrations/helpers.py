@@ -0,0 +1,69 @@
+from typing import List, Tuple
+
+# Idempotent DDL helpers for migrations (MySQL has no CREATE INDEX IF NOT EXISTS)
+
+
+def column_exists(cursor, table: str, column: str) -> bool:
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def add_column(cursor, table: str, column: str, definition: str) -> None:
+    if not column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def create_index(cursor, table: str, index: str, columns: str, prefix: str = "") -> None:
+    """CREATE [prefix] INDEX index ON table (columns), skipped if it already exists."""
+    if not index_exists(cursor, table, index):
+        cursor.execute(f"CREATE {prefix + ' ' if prefix else ''}INDEX {index} ON {table} ({columns})")
+
+
+def drop_index(cursor, table: str, index: str) -> None:
+    if index_exists(cursor, table, index):
+        cursor.execute(f"DROP INDEX {index} ON {table}")
+
+
+def foreign_keys(cursor, table: str, column: str) -> List[Tuple[str, str]]:
+    """(constraint name, ON DELETE rule) of every foreign key on table.column."""
+    cursor.execute("""
+        SELECT k.constraint_name, r.delete_rule
+        FROM information_schema.key_column_usage k
+        JOIN information_schema.referential_constraints r
+            ON r.constraint_schema = k.constraint_schema AND r.constraint_name = k.constraint_name
+        WHERE k.table_schema = DATABASE() AND k.table_name = %s AND k.column_name = %s
+    """, (table, column))
+    return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def set_foreign_key(cursor, table: str, column: str, name: str, references: str, on_delete: str) -> None:
+    """Make `name` the only foreign key on table.column, with the given ON DELETE rule.
+
+    Existing keys (e.g. auto-named ones from the initial schema) are dropped.
+    The rows were already constrained, so checks are off while the key is added
+    and InnoDB does not rebuild the table to re-validate them.
+    """
+    existing = foreign_keys(cursor, table, column)
+    if existing == [(name, on_delete)]:
+        return
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    try:
+        for constraint, _ in existing:
+            cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {constraint}")
+        cursor.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) "
+            f"REFERENCES {references} ON DELETE {on_delete}"
+        )
+    finally:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
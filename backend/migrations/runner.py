@@ -0,0 +1,101 @@
+import importlib
+import logging
+import pkgutil
+from typing import List, Optional, Tuple
+
+from backend.migrations import versions
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK = "chatbot_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+def load_migrations() -> List[Tuple[int, str, object]]:
+    """All migration modules as (version, description, module), ordered by version.
+
+    Modules live in backend/migrations/versions and are named NNNN_description.py;
+    each defines DESCRIPTION and upgrade(cursor).
+    """
+    migrations = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        prefix = info.name.split("_", 1)[0]
+        if not prefix.isdigit():
+            continue
+        module = importlib.import_module(f"{versions.__name__}.{info.name}")
+        migrations.append((int(prefix), module.DESCRIPTION, module))
+    migrations.sort(key=lambda m: m[0])
+    return migrations
+
+
+def _ensure_version_table(cursor) -> None:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _applied_versions(cursor) -> List[int]:
+    cursor.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def current_version(conn) -> int:
+    """Highest applied migration version (0 for an empty database)."""
+    cursor = conn.cursor()
+    try:
+        _ensure_version_table(cursor)
+        applied = _applied_versions(cursor)
+        return applied[-1] if applied else 0
+    finally:
+        cursor.close()
+
+
+def pending_migrations(conn) -> List[Tuple[int, str]]:
+    cursor = conn.cursor()
+    try:
+        _ensure_version_table(cursor)
+        applied = set(_applied_versions(cursor))
+    finally:
+        cursor.close()
+    return [(version, description) for version, description, _ in load_migrations() if version not in applied]
+
+
+def upgrade(conn, target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to target (default: latest) and return the versions applied.
+
+    Takes a DB-API connection (mysql.connector or SQLAlchemy's raw_connection()).
+    A MySQL named lock keeps several workers booting at once from racing;
+    MySQL DDL auto-commits, so each version is recorded as soon as it succeeds.
+    """
+    cursor = conn.cursor()
+    applied_now = []
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for the schema migration lock")
+        try:
+            _ensure_version_table(cursor)
+            applied = set(_applied_versions(cursor))
+            for version, description, module in load_migrations():
+                if version in applied or (target is not None and version > target):
+                    continue
+                logger.info(f"Applying migration {version:04d}: {description}")
+                module.upgrade(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+                applied_now.append(version)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchall()
+    finally:
+        cursor.close()
+    if applied_now:
+        logger.info(f"Schema upgraded to version {applied_now[-1]}")
+    return applied_now
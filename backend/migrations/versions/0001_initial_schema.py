@@ -0,0 +1,86 @@
+from backend.migrations.helpers import add_column
+
+DESCRIPTION = "initial user and chat schema"
+
+
+def upgrade(cursor):
+    # Tables previously created by DATABASE/database.init_db()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            phone VARCHAR(20),
+            country VARCHAR(100),
+            state VARCHAR(100),
+            password VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # routes/user.py reads and writes these, but the original DDL never created them
+    add_column(cursor, "users", "password", "VARCHAR(255)")
+    add_column(cursor, "users", "last_active", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_conversations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            email_status ENUM('pending', 'sent', 'failed') DEFAULT 'pending',
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS qa_pairs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            conversation_id INT NOT NULL,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            category VARCHAR(50) DEFAULT 'general',
+            rating INT,
+            suggestion TEXT,
+            is_helpful BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (conversation_id) REFERENCES chat_conversations(id)
+        )
+    """)
+
+    # Tables previously created by Base.metadata.create_all() (backend/models/chat.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_email VARCHAR(255) NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_id INT NOT NULL,
+            user_email VARCHAR(255) NOT NULL,
+            user_message TEXT NOT NULL,
+            bot_response TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES chat_sessions(id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            chat_id INT NOT NULL,
+            rating INT NOT NULL,
+            suggestion TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (chat_id) REFERENCES chat_history(id)
+        )
+    """)
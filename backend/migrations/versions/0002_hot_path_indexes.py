@@ -0,0 +1,17 @@
+from backend.migrations.helpers import create_index
+
+DESCRIPTION = "indexes for history, feedback and stats lookups"
+
+
+def upgrade(cursor):
+    # Session list: WHERE user_email = ? ORDER BY created_at DESC, id DESC
+    create_index(cursor, "chat_sessions", "idx_chat_sessions_user_created", "user_email, created_at DESC, id DESC")
+    # Message pages and per-session counts: WHERE session_id IN (...) / ORDER BY id
+    create_index(cursor, "chat_history", "idx_chat_history_session_id", "session_id, id")
+    # A user's recent messages across sessions
+    create_index(cursor, "chat_history", "idx_chat_history_user_created", "user_email, created_at DESC")
+    create_index(cursor, "feedback", "idx_feedback_chat_id", "chat_id")
+    # Stats queries: WHERE user_id = ? (optionally by recency)
+    create_index(cursor, "qa_pairs", "idx_qa_pairs_user_created", "user_id, created_at DESC")
+    create_index(cursor, "qa_pairs", "idx_qa_pairs_conversation_id", "conversation_id")
+    create_index(cursor, "chat_conversations", "idx_chat_conversations_user_last_active", "user_id, last_active DESC")
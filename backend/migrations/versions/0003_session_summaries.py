@@ -0,0 +1,9 @@
+from backend.migrations.helpers import add_column
+
+DESCRIPTION = "rolling conversation summary on chat_sessions"
+
+
+def upgrade(cursor):
+    add_column(cursor, "chat_sessions", "summary", "TEXT NULL")
+    # Last chat_history.id folded into the summary; later messages are replayed verbatim
+    add_column(cursor, "chat_sessions", "summary_through_id", "INT NULL")
@@ -0,0 +1,27 @@
+DESCRIPTION = "BIGINT chat ids for client-generated time-ordered ids"
+
+
+def upgrade(cursor):
+    # Node counter for id generation; superseded by id_node_leases and dropped in 0009
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS id_nodes (
+            name VARCHAR(64) PRIMARY KEY,
+            next_node BIGINT NOT NULL
+        )
+    """)
+    cursor.execute("INSERT IGNORE INTO id_nodes (name, next_node) VALUES ('chat', 0)")
+
+    # Ids are now 53-bit (ms timestamp | node | sequence). Foreign key columns
+    # must match their parent's type, so checks are off while both change.
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    try:
+        cursor.execute("ALTER TABLE chat_sessions MODIFY id BIGINT NOT NULL AUTO_INCREMENT")
+        cursor.execute("ALTER TABLE chat_sessions MODIFY summary_through_id BIGINT NULL")
+        cursor.execute("""
+            ALTER TABLE chat_history
+                MODIFY id BIGINT NOT NULL AUTO_INCREMENT,
+                MODIFY session_id BIGINT NOT NULL
+        """)
+        cursor.execute("ALTER TABLE feedback MODIFY chat_id BIGINT NOT NULL")
+    finally:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
@@ -0,0 +1,49 @@
+from backend.migrations.helpers import add_column
+
+DESCRIPTION = "materialized per-user and per-session chat stats"
+
+HELPFUL_RATING = 4  # mirrors backend/services/chat_stats.py at the time of this migration
+
+
+def upgrade(cursor):
+    # Kept current by the chat writer and feedback/delete paths (services/chat_stats.py)
+    add_column(cursor, "chat_sessions", "message_count", "INT NOT NULL DEFAULT 0")
+    add_column(cursor, "chat_sessions", "last_message_at", "DATETIME NULL")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_chat_stats (
+            user_email VARCHAR(255) PRIMARY KEY,
+            total_chats BIGINT NOT NULL DEFAULT 0,
+            total_sessions INT NOT NULL DEFAULT 0,
+            rated_responses BIGINT NOT NULL DEFAULT 0,
+            helpful_responses BIGINT NOT NULL DEFAULT 0,
+            last_activity DATETIME NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Backfill from existing history in two set-based passes
+    cursor.execute("""
+        UPDATE chat_sessions s
+        JOIN (
+            SELECT session_id, COUNT(*) AS n, MAX(created_at) AS last_at
+            FROM chat_history GROUP BY session_id
+        ) h ON h.session_id = s.id
+        SET s.message_count = h.n, s.last_message_at = h.last_at
+    """)
+    cursor.execute("""
+        INSERT INTO user_chat_stats
+            (user_email, total_chats, total_sessions, rated_responses, helpful_responses, last_activity)
+        SELECT s.user_email, SUM(s.message_count), COUNT(*), COALESCE(SUM(f.rated), 0), COALESCE(SUM(f.helpful), 0),
+               COALESCE(MAX(s.last_message_at), MAX(s.created_at))
+        FROM chat_sessions s
+        LEFT JOIN (
+            SELECT c.session_id, COUNT(*) AS rated, SUM(fb.rating >= %s) AS helpful
+            FROM feedback fb JOIN chat_history c ON c.id = fb.chat_id
+            GROUP BY c.session_id
+        ) f ON f.session_id = s.id
+        GROUP BY s.user_email
+        ON DUPLICATE KEY UPDATE
+            total_chats = VALUES(total_chats), total_sessions = VALUES(total_sessions),
+            rated_responses = VALUES(rated_responses), helpful_responses = VALUES(helpful_responses),
+            last_activity = VALUES(last_activity)
+    """, (HELPFUL_RATING,))
@@ -0,0 +1,8 @@
+from backend.migrations.helpers import create_index
+
+DESCRIPTION = "full-text index over chat messages for /chat/search"
+
+
+def upgrade(cursor):
+    # MATCH(user_message, bot_response) AGAINST (...) must name exactly these columns
+    create_index(cursor, "chat_history", "ft_chat_history_text", "user_message, bot_response", prefix="FULLTEXT")
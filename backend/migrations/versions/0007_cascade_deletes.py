@@ -0,0 +1,15 @@
+from backend.migrations.helpers import add_column, create_index, set_foreign_key
+
+DESCRIPTION = "ON DELETE CASCADE for chat rows and soft-deleted sessions"
+
+
+def upgrade(cursor):
+    # Deleting a session (or a message) removes its children in the database,
+    # so the ORM no longer loads them to delete one by one
+    set_foreign_key(cursor, "chat_history", "session_id", "fk_chat_history_session",
+                    "chat_sessions(id)", "CASCADE")
+    set_foreign_key(cursor, "feedback", "chat_id", "fk_feedback_chat", "chat_history(id)", "CASCADE")
+
+    # Deleted sessions are hidden at once and purged in batches (services/conversation_purge.py)
+    add_column(cursor, "chat_sessions", "deleted_at", "DATETIME NULL")
+    create_index(cursor, "chat_sessions", "idx_chat_sessions_deleted_at", "deleted_at")
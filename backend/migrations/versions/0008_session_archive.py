@@ -0,0 +1,27 @@
+from backend.migrations.helpers import create_index
+
+DESCRIPTION = "manifest of chat sessions archived to compressed segment files"
+
+
+def upgrade(cursor):
+    # One row per archived session (services/chat_archive.py): what the session
+    # listings need, its share of the user's stats, and where its frame lives
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archived_sessions (
+            id BIGINT PRIMARY KEY,
+            user_email VARCHAR(255) NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            created_at DATETIME NULL,
+            last_message_at DATETIME NULL,
+            message_count INT NOT NULL DEFAULT 0,
+            rated_responses INT NOT NULL DEFAULT 0,
+            helpful_responses INT NOT NULL DEFAULT 0,
+            segment VARCHAR(255) NOT NULL,
+            frame_offset BIGINT NOT NULL,
+            frame_length INT NOT NULL,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    create_index(cursor, "archived_sessions", "idx_archived_sessions_user_created",
+                 "user_email, created_at DESC, id DESC")
+    create_index(cursor, "archived_sessions", "idx_archived_sessions_segment", "segment, frame_offset")
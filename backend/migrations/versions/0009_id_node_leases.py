@@ -0,0 +1,21 @@
+DESCRIPTION = "leased id node numbers so a node is never shared by two live processes"
+
+NODES = 256  # 2 ** ID_NODE_BITS in services/chat_writer.py
+
+
+def upgrade(cursor):
+    # Replaces the id_nodes counter, which wrapped and reused nodes still in use
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS id_node_leases (
+            name VARCHAR(64) NOT NULL,
+            node INT NOT NULL,
+            holder VARCHAR(128) NULL,
+            leased_until DATETIME NOT NULL DEFAULT '1970-01-01 00:00:01',
+            PRIMARY KEY (name, node)
+        )
+    """)
+    cursor.executemany(
+        "INSERT IGNORE INTO id_node_leases (name, node) VALUES (%s, %s)",
+        [("chat", node) for node in range(NODES)]
+    )
+    cursor.execute("DROP TABLE IF EXISTS id_nodes")
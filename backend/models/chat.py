@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, func
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -6,18 +6,29 @@ Base = declarative_base()
 
 class ChatSession(Base):
     __tablename__ = 'chat_sessions'
-    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Ids are generated by the application (services/chat_writer.py), time-ordered
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
     user_email = Column(String(255), nullable=False)
     title = Column(String(255), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
-    # Add relationship to messages
-    messages = relationship("ChatHistory", back_populates="session", cascade="all, delete-orphan")
+    # Rolling summary of turns older than the context window (see services/conversation_context.py)
+    summary = Column(Text, nullable=True)
+    summary_through_id = Column(BigInteger, nullable=True)
+    # Maintained with user_chat_stats (see services/chat_stats.py)
+    message_count = Column(Integer, nullable=False, server_default='0')
+    last_message_at = Column(DateTime, nullable=True)
+    # Set when the user deletes the session; the rows are purged in the background
+    deleted_at = Column(DateTime, nullable=True)
+    # Add relationship to messages (ON DELETE CASCADE removes them; the ORM does not load them to delete)
+    messages = relationship("ChatHistory", back_populates="session", cascade="all, delete-orphan",
+                            passive_deletes=True, order_by="ChatHistory.id")
 
 class ChatHistory(Base):
     __tablename__ = 'chat_history'
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    session_id = Column(Integer, ForeignKey('chat_sessions.id'), nullable=False)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    session_id = Column(BigInteger, ForeignKey('chat_sessions.id', name='fk_chat_history_session', ondelete='CASCADE'),
+                        nullable=False)
     user_email = Column(String(255), nullable=False)
     user_message = Column(Text, nullable=False)
     bot_response = Column(Text, nullable=False)
@@ -25,14 +36,46 @@ class ChatHistory(Base):
     # Add relationship back to session
     session = relationship("ChatSession", back_populates="messages")
     # Add relationship to feedback
-    feedback = relationship("Feedback", back_populates="chat", cascade="all, delete-orphan")
+    feedback = relationship("Feedback", back_populates="chat", cascade="all, delete-orphan", passive_deletes=True)
 
 class Feedback(Base):
     __tablename__ = 'feedback'
     id = Column(Integer, primary_key=True, autoincrement=True)
-    chat_id = Column(Integer, ForeignKey('chat_history.id'), nullable=False)
+    chat_id = Column(BigInteger, ForeignKey('chat_history.id', name='fk_feedback_chat', ondelete='CASCADE'),
+                     nullable=False)
     rating = Column(Integer, nullable=False)
     suggestion = Column(Text, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     # Add relationship back to chat
     chat = relationship("ChatHistory", back_populates="feedback")
+
+class ArchivedSession(Base):
+    __tablename__ = 'archived_sessions'
+    # Manifest of a session moved out of the hot tables (see services/chat_archive.py)
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    user_email = Column(String(255), nullable=False)
+    title = Column(String(255), nullable=False)
+    created_at = Column(DateTime, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    message_count = Column(Integer, nullable=False, server_default='0')
+    rated_responses = Column(Integer, nullable=False, server_default='0')
+    helpful_responses = Column(Integer, nullable=False, server_default='0')
+    # The session's compressed frame: segment file under ARCHIVE_DIR, byte offset and length
+    segment = Column(String(255), nullable=False)
+    frame_offset = Column(BigInteger, nullable=False)
+    frame_length = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, server_default=func.now())
+
+# Mirrors of the indexes created by backend/migrations/versions/0002_hot_path_indexes.py
+Index('idx_chat_sessions_user_created', ChatSession.user_email, ChatSession.created_at.desc(), ChatSession.id.desc())
+Index('idx_chat_history_session_id', ChatHistory.session_id, ChatHistory.id)
+Index('idx_chat_history_user_created', ChatHistory.user_email, ChatHistory.created_at.desc())
+Index('idx_feedback_chat_id', Feedback.chat_id)
+# Mirror of 0006_chat_history_fulltext.py (services/chat_search.py)
+Index('ft_chat_history_text', ChatHistory.user_message, ChatHistory.bot_response, mysql_prefix='FULLTEXT')
+# Mirror of 0007_cascade_deletes.py (services/conversation_purge.py)
+Index('idx_chat_sessions_deleted_at', ChatSession.deleted_at)
+# Mirrors of 0008_session_archive.py (services/chat_archive.py)
+Index('idx_archived_sessions_user_created', ArchivedSession.user_email, ArchivedSession.created_at.desc(),
+      ArchivedSession.id.desc())
+Index('idx_archived_sessions_segment', ArchivedSession.segment, ArchivedSession.frame_offset)
@@ -1,42 +1,285 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from backend.services.openai_service import get_openai_response
+from typing import Callable, Optional
+from backend.services.openai_service import get_openai_response_async, astream_openai_response
+from backend.services.admission import (
+    PRIORITY_ANONYMOUS,
+    PRIORITY_USER,
+    Overloaded,
+    RateLimited,
+    admission,
+    request_limiter,
+    retry_after_header,
+)
+from backend.services.auth import verify_token
+from backend.services.llm_concurrency import llm_limiter
+from backend.services.llm_resilience import DEGRADED_RESPONSE, LLMUnavailableError, llm_resilience
+from backend.services.model_registry import model_registry
+from backend.services.model_router import model_router
+from backend.services.response_cache import response_cache
+from backend.services.semantic_cache import semantic_cache
+from backend.services.single_flight import coalescing_stats
+from backend.services.chat_store import (
+    InvalidCursor,
+    UnknownSession,
+    delete_all_conversations,
+    delete_conversation,
+    list_conversations,
+    list_session_messages,
+    list_session_summaries,
+    save_chat_turn,
+)
+from backend.services.chat_archive import archive_reader
+from backend.services.chat_search import InvalidQuery, search_messages
+from backend.services.chat_writer import chat_writer
+from backend.services.email_queue import email_queue
+from backend.services.conversation_context import conversation_context
+from backend.services.conversation_purge import conversation_purger
+from backend.services.streaming import SSE_HEADERS, format_sse_event
+from backend.services.tracing import span
+import anyio
 import logging
 import time
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import weakref
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
-executor = ThreadPoolExecutor(max_workers=2)
 
 class ChatRequest(BaseModel):
     user_query: str
+    email: str = "anonymous"
+    session_id: Optional[int] = None
 
 class ChatResponse(BaseModel):
     response: str
+    degraded: bool = False
+    session_id: Optional[int] = None
+    message_id: Optional[int] = None
+
+async def _history(session_id: Optional[int]):
+    """Earlier turns of the session (summary plus recent turns), loaded off the event loop.
+
+    Raises 404 when the session does not exist or was deleted.
+    """
+    if not session_id:
+        return None
+    with span("chat.history", session_id=session_id):
+        history = await run_in_threadpool(conversation_context.history, session_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail=f"Chat session {session_id} not found")
+    return history
+
+def _authenticated_user(request: Request) -> Optional[str]:
+    """Email from a valid bearer token; chat also accepts anonymous callers."""
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        return None
+    try:
+        return verify_token(auth[len("Bearer "):]).get("sub")
+    except HTTPException:
+        return None
+
+async def _admit(request: Request) -> Callable[[], None]:
+    """Per-user/IP rate limits, then a slot in the admission queue; returns its release function."""
+    user = _authenticated_user(request)
+    ip = request.client.host if request.client else "unknown"
+    try:
+        with span("chat.admission", user=bool(user)):
+            await request_limiter.check(user, ip)
+            return await admission.enter(PRIORITY_USER if user else PRIORITY_ANONYMOUS)
+    except RateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=retry_after_header(e.retry_after))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after_header(e.retry_after))
 
 @router.post("/chat", response_model=ChatResponse)
-def chat_endpoint(chat_request: ChatRequest, request: Request):
-    """Synchronous endpoint for Gemini (Google Generative AI) only."""
+async def chat_endpoint(chat_request: ChatRequest, request: Request):
+    """Answer with Gemini and store the turn (write-behind), returning its ids."""
     start_time = time.time()
+    user_query = chat_request.user_query
+    if not user_query.strip():
+        raise HTTPException(status_code=400, detail="user_query is required")
+    release = await _admit(request)
     try:
-        user_query = chat_request.user_query
         logger.info(f"Request from: {request.client.host}")
-        print("Before Gemini call")  # DEBUG
-        # Run Gemini call in a background thread with timeout
-        future = executor.submit(get_openai_response, user_query)
-        try:
-            response = future.result(timeout=15)
-        except FuturesTimeoutError:
-            logger.error("Gemini API call timed out")
-            raise HTTPException(status_code=504, detail="Gemini API call timed out")
-        print("After Gemini call")   # DEBUG
+        history = await _history(chat_request.session_id)
+        # Awaits the SDK's async call; concurrency and the deadline are enforced by llm_limiter
+        response = await get_openai_response_async(user_query, history=history)
+        with span("chat.save"):
+            session_id, message_id = await run_in_threadpool(
+                save_chat_turn, chat_request.email, chat_request.session_id, user_query, response
+            )
         elapsed = time.time() - start_time
         logger.info(f"/chat response time: {elapsed:.2f} seconds")
-        return ChatResponse(response=response)
+        return ChatResponse(response=response, session_id=session_id, message_id=message_id)
+    except UnknownSession as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except LLMUnavailableError as e:
+        logger.warning(f"Serving degraded /chat answer, circuit open for {e.retry_after:.0f}s")
+        return ChatResponse(response=DEGRADED_RESPONSE, degraded=True)
     except HTTPException as e:
         logger.error(f"HTTPException in /chat: {e.detail}")
         raise
     except Exception as e:
         logger.error(f"Unexpected error in /chat: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        release()
+
+@router.get("/chat/llm-stats")
+async def llm_stats():
+    """Current LLM concurrency, queue depth, call counters, coalesced calls, token usage and context LRU."""
+    return {
+        **llm_limiter.stats(),
+        "coalescing": coalescing_stats(),
+        "models": model_registry.stats(),
+        "router": model_router.stats(),
+        "context": conversation_context.stats(),
+    }
+
+@router.get("/chat/admission-stats")
+async def admission_stats():
+    """Rate limiter and admission queue counters (per worker process)."""
+    return {"rate_limits": request_limiter.stats(), "admission": admission.stats()}
+
+@router.get("/chat/llm-health")
+async def llm_health():
+    """Circuit breaker, adaptive timeout and retry budget state."""
+    return llm_resilience.state()
+
+@router.get("/chat/cache-stats")
+async def cache_stats():
+    """Response cache size, hit/miss counters and evictions, plus semantic answer reuse."""
+    # The SQLite backend counts rows in a file another worker may be writing
+    return {**await run_in_threadpool(response_cache.stats), "semantic": semantic_cache.stats()}
+
+@router.get("/chat/email-stats")
+async def email_stats():
+    """Outbound email queue depth, lag, retries and send throughput."""
+    return email_queue.stats()
+
+@router.get("/chat/write-stats")
+async def write_stats():
+    """Write-behind chat persistence: queue depth, batch sizes, forced flushes."""
+    return chat_writer.stats()
+
+@router.get("/chat/history/{email}")
+async def chat_history(email: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """Sessions with their messages, newest first (keyset-paginated when limit/cursor are given)."""
+    try:
+        return await run_in_threadpool(list_conversations, email, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/chat/search")
+async def chat_search(email: str, q: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """A user's messages matching `q`, best match first, with highlighted snippets."""
+    try:
+        return await run_in_threadpool(search_messages, email, q, limit, cursor)
+    except (InvalidCursor, InvalidQuery) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/chat/sessions/{email}")
+async def chat_sessions(email: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """One page of sessions with message count and last message time."""
+    try:
+        return await run_in_threadpool(list_session_summaries, email, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/chat/conversation/{session_id}/messages")
+async def conversation_messages(session_id: int, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """One page of a conversation's messages in chronological order."""
+    try:
+        page = await run_in_threadpool(list_session_messages, session_id, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return page
+
+@router.delete("/chat/conversation/{session_id}")
+async def delete_conversation_endpoint(session_id: int):
+    """Delete a conversation; it disappears at once and its rows are purged in the background."""
+    if not await run_in_threadpool(delete_conversation, session_id):
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"status": "deleted"}
+
+@router.delete("/chat/conversations/{email}")
+async def delete_all_conversations_endpoint(email: str, request: Request):
+    """Delete every conversation of the signed-in user (purged in the background)."""
+    if _authenticated_user(request) != email:
+        raise HTTPException(status_code=403, detail="Sign in as this user to delete their conversations")
+    deleted = await run_in_threadpool(delete_all_conversations, email)
+    return {"status": "deleted", "deleted_sessions": deleted}
+
+@router.get("/chat/purge-stats")
+async def purge_stats():
+    """Background purge of deleted conversations: queue, rows removed, batch latency."""
+    return conversation_purger.stats()
+
+@router.get("/chat/archive-stats")
+async def archive_stats():
+    """Rehydration of archived conversations: frames cached, hit rate, last read latency."""
+    return archive_reader.stats()
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(chat_request: ChatRequest, request: Request):
+    """Stream the Gemini answer as Server-Sent Events and store the turn when it ends."""
+    user_query = chat_request.user_query
+    if not user_query.strip():
+        raise HTTPException(status_code=400, detail="user_query is required")
+    logger.info(f"Streaming request from: {request.client.host}")
+    release = await _admit(request)
+    try:
+        history = await _history(chat_request.session_id)
+    except Exception:
+        release()
+        raise
+
+    async def event_stream():
+        start_time = time.time()
+        chunks = []
+        saved = False
+        stream = astream_openai_response(user_query, history=history)
+        try:
+            async for text in stream:
+                if not chunks:
+                    logger.info(f"/chat/stream time to first token: {time.time() - start_time:.2f} seconds")
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, stopping Gemini stream")
+                    break
+                chunks.append(text)
+                yield format_sse_event("chunk", {"text": text})
+            else:
+                session_id, message_id = await run_in_threadpool(
+                    save_chat_turn, chat_request.email, chat_request.session_id, user_query, "".join(chunks)
+                )
+                saved = True
+                yield format_sse_event("done", {"session_id": session_id, "message_id": message_id})
+        except LLMUnavailableError:
+            yield format_sse_event("degraded", {"text": DEGRADED_RESPONSE})
+        except Exception as e:
+            logger.error(f"Error in /chat/stream: {str(e)}", exc_info=True)
+            yield format_sse_event("error", {"error": str(e)})
+        finally:
+            # Shield cleanup so a disconnect-triggered cancellation still
+            # closes the upstream call and keeps the partial answer.
+            with anyio.CancelScope(shield=True):
+                await stream.aclose()
+                if not saved and chunks:
+                    try:
+                        await run_in_threadpool(
+                            save_chat_turn, chat_request.email, chat_request.session_id, user_query, "".join(chunks)
+                        )
+                    except Exception as e:
+                        logger.error(f"Error saving partial chat stream: {str(e)}")
+            release()
+            logger.info(f"/chat/stream response time: {time.time() - start_time:.2f} seconds")
+
+    body = event_stream()
+    # The slot is held for the whole stream; also free it if the response never starts
+    weakref.finalize(body, release)
+    return StreamingResponse(body, media_type="text/event-stream", headers=SSE_HEADERS)
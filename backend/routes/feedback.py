@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Optional
+from backend.services.chat_store import save_feedback
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+class FeedbackRequest(BaseModel):
+    rating: int = Field(..., ge=1, le=5)
+    suggestion: Optional[str] = None
+
+@router.post("/chat/feedback/{chat_id}")
+async def submit_feedback(chat_id: int, feedback: FeedbackRequest):
+    """Rate one chatbot answer (1-5) with an optional suggestion."""
+    if not await run_in_threadpool(save_feedback, chat_id, feedback.rating, feedback.suggestion):
+        raise HTTPException(status_code=404, detail="Chat message not found")
+    return {"status": "feedback saved"}
@@ -0,0 +1,32 @@
+import os
+
+import uvicorn
+
+from backend.config import HOST, PORT
+
+# Serving configuration
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+KEEP_ALIVE = int(os.getenv("KEEP_ALIVE", "5"))  # seconds; keep above the proxy's idle timeout
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+
+
+def main() -> None:
+    """Production entry point: one uvicorn worker process per core."""
+    uvicorn.run(
+        "backend.app:create_app",
+        factory=True,
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        timeout_keep_alive=KEEP_ALIVE,
+        backlog=BACKLOG,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        log_level=LOG_LEVEL,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,39 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
+import time
+from contextlib import closing
 from dotenv import load_dotenv
-import google.generativeai as genai
-from backend.database import get_db_session
-from backend.models.chat import ChatHistory, Feedback, ChatSession
+from backend.database import init_db
+from backend.services.chat_store import (
+    InvalidCursor,
+    UnknownSession,
+    delete_all_conversations,
+    delete_conversation as remove_conversation,
+    list_conversations,
+    list_session_messages,
+    list_session_summaries,
+    save_chat_turn,
+    save_feedback,
+)
+from backend.services.openai_service import get_openai_response, stream_openai_response
+from backend.services.model_registry import model_registry
+from backend.services.model_router import model_router
+from backend.services.chat_archive import archive_reader
+from backend.services.chat_search import InvalidQuery, search_messages
+from backend.services.chat_writer import chat_writer
+from backend.services.conversation_purge import conversation_purger
+from backend.services.auth import verify_token
+from backend.services.conversation_context import conversation_context
+from backend.services.llm_resilience import DEGRADED_RESPONSE, LLMUnavailableError, llm_resilience
+from backend.services.response_cache import response_cache
+from backend.services.semantic_cache import semantic_cache
+from backend.services.email_queue import email_queue
+from backend.services.single_flight import coalescing_stats
+from backend.services.metrics import CONTENT_TYPE, observe_http, registry
+from backend.services import tracing
+from fastapi import HTTPException
+from backend.services.streaming import SSE_HEADERS, format_sse_event
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '../.env'))
 
@@ -14,10 +43,35 @@ CORS(app,
      supports_credentials=True,
      allow_headers=["Content-Type", "Authorization", "X-Gemini-Api-Key"])
 
-SYSTEM_PROMPT = """You are an expert tax and finance chatbot of advit itec, specializing in GST filing, income tax, financial planning, and accounting services.\n\nGuidelines:\n1. Always respond only in English.\n2. Focus on accuracy and clarity in tax and finance-related information.\n3. Keep explanations clear, concise, and professional.\n4. For GST and tax-related queries, always mention applicable sections and rules.\n5. Break down complex financial concepts into simple steps.\n6. Provide disclaimers when necessary about consulting a qualified professional.\n7. Stay updated with current tax rates and GST slabs.\n\nKey Areas of Expertise:\n- GST Filing and Compliance\n- Income Tax Returns\n- Tax Planning and Savings\n- Financial Record Keeping\n- Business Accounting\n- Corporate Tax\n- Tax Deductions and Exemptions\n\nRemember:\n- Always provide accurate tax-related information\n- Include relevant tax laws and regulations\n- Suggest proper documentation requirements\n- Explain filing deadlines and compliance requirements\n\n**Formatting Instructions:**\n- ALWAYS use markdown for your output.\n- Use bullet points or numbered lists for all answers.\n- Add TWO line breaks between each point or paragraph for clear separation.\n- Never return a single long paragraph.\n- Never combine multiple points in one paragraph.\n- Each point must be on its own line, separated by two line breaks.\n- Use bold or italics for emphasis where appropriate.\n- Mimic the style and clarity of ChatGPT.\n\nDo not provide responses in any language other than English.\nImportant: Always include disclaimers for complex tax matters and recommend consulting a certified tax professional for specific cases."""
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    g.trace = tracing.begin(f"{request.method} {request.path}", request.headers.get(tracing.TRACE_HEADER))
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+@app.after_request
+def record_request(response):
+    start = g.get('request_start')
+    if start is None:
+        return response
+    method = request.method
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = response.status_code
+    started = g.get('trace')
+    if started is not None:
+        response.headers['X-Trace-Id'] = started[0].id
+
+    def on_close():
+        # Runs once the body has been sent, so streamed answers count their full duration
+        observe_http(method, route, status, time.perf_counter() - start)
+        if started is not None:
+            tracing.write(tracing.end(started, route=route, status=status))
+
+    response.call_on_close(on_close)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.expose(), content_type=CONTENT_TYPE)
 
 @app.route('/chat', methods=['POST'])
 def chat():
@@ -29,73 +83,173 @@ def chat():
     if not user_query.strip():
         return jsonify({'error': 'user_query is required'}), 400
     
-    prompt = f"{SYSTEM_PROMPT}\n\nUser: {user_query}"
-    
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        response = model.generate_content(prompt)
-        bot_response = response.text if hasattr(response, 'text') else str(response)
-        
+        history = conversation_context.history(session_id) if session_id else None
+        if session_id and history is None:
+            return jsonify({'error': f'Chat session {session_id} not found'}), 404
+        bot_response = get_openai_response(user_query, history=history)
+    except LLMUnavailableError:
+        # Gemini is unhealthy: answer immediately instead of queueing behind it
+        return jsonify({'response': DEGRADED_RESPONSE, 'degraded': True})
+    except HTTPException as e:
+        print(f"Error in chat endpoint: {e.detail}")
+        return jsonify({'error': e.detail}), e.status_code
+
+    try:
         # Store chat in DB
-        with next(get_db_session()) as db:
-            # Create new session if none exists
-            if not session_id:
-                session = ChatSession(user_email=user_email, title=user_query[:50] + "...")
-                db.add(session)
-                db.flush()  # Get the session ID
-                session_id = session.id
-            
-            chat = ChatHistory(
-                session_id=session_id,
-                user_email=user_email,
-                user_message=user_query,
-                bot_response=bot_response
-            )
-            db.add(chat)
-            db.commit()
-            
-            return jsonify({
-                'response': bot_response,
-                'session_id': session_id,
-                'message_id': chat.id
-            })
-            
+        session_id, message_id = save_chat_turn(user_email, session_id, user_query, bot_response)
+        return jsonify({
+            'response': bot_response,
+            'session_id': session_id,
+            'message_id': message_id
+        })
+    except UnknownSession as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the answer as Server-Sent Events, storing the turn once the stream ends."""
+    data = request.get_json()
+    user_query = data.get('user_query', '')
+    user_email = data.get('email', 'anonymous')
+    session_id = data.get('session_id')
+
+    if not user_query.strip():
+        return jsonify({'error': 'user_query is required'}), 400
+    history = conversation_context.history(session_id) if session_id else None
+    if session_id and history is None:
+        return jsonify({'error': f'Chat session {session_id} not found'}), 404
+
+    def generate():
+        chunks = []
+        saved = False
+        try:
+            with closing(stream_openai_response(user_query, history=history)) as stream:
+                for text in stream:
+                    chunks.append(text)
+                    yield format_sse_event('chunk', {'text': text})
+            new_session_id, message_id = save_chat_turn(user_email, session_id, user_query, ''.join(chunks))
+            saved = True
+            yield format_sse_event('done', {'session_id': new_session_id, 'message_id': message_id})
+        except LLMUnavailableError:
+            yield format_sse_event('degraded', {'text': DEGRADED_RESPONSE})
+        except Exception as e:
+            print(f"Error in chat stream: {str(e)}")
+            yield format_sse_event('error', {'error': str(e)})
+        finally:
+            # Client disconnected (GeneratorExit) or upstream failed mid-answer:
+            # keep whatever was generated so the conversation is not lost.
+            if not saved and chunks:
+                try:
+                    save_chat_turn(user_email, session_id, user_query, ''.join(chunks))
+                except Exception as e:
+                    print(f"Error saving partial chat stream: {str(e)}")
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/chat/llm-health', methods=['GET'])
+def llm_health():
+    return jsonify(llm_resilience.state())
+
+@app.route('/chat/llm-stats', methods=['GET'])
+def llm_stats():
+    return jsonify({
+        'coalescing': coalescing_stats(),
+        'models': model_registry.stats(),
+        'router': model_router.stats(),
+        'context': conversation_context.stats()
+    })
+
+@app.route('/chat/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({**response_cache.stats(), "semantic": semantic_cache.stats()})
+
+@app.route('/chat/write-stats', methods=['GET'])
+def write_stats():
+    return jsonify(chat_writer.stats())
+
+@app.route('/chat/email-stats', methods=['GET'])
+def email_stats():
+    return jsonify(email_queue.stats())
+
 @app.route('/chat/history/<email>', methods=['GET'])
 def chat_history(email):
-    with next(get_db_session()) as db:
-        sessions = db.query(ChatSession).filter(
-            ChatSession.user_email == email
-        ).order_by(ChatSession.created_at.desc()).all()
-        
-        return jsonify({'conversations': [
-            {
-                'id': session.id,
-                'title': session.title,
-                'created_at': session.created_at.isoformat(),
-                'messages': [
-                    {
-                        'id': msg.id,
-                        'user_message': msg.user_message,
-                        'bot_response': msg.bot_response,
-                        'created_at': msg.created_at.isoformat()
-                    } for msg in session.messages
-                ]
-            } for session in sessions
-        ]})
+    try:
+        return jsonify(list_conversations(
+            email,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor')
+        ))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/chat/search', methods=['GET'])
+def chat_search():
+    """A user's messages matching ?q=, best match first, with highlighted snippets."""
+    try:
+        return jsonify(search_messages(
+            request.args.get('email', ''),
+            request.args.get('q', ''),
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor')
+        ))
+    except (InvalidCursor, InvalidQuery) as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/chat/sessions/<email>', methods=['GET'])
+def chat_sessions(email):
+    """Paginated session list with message counts, without message bodies."""
+    try:
+        return jsonify(list_session_summaries(
+            email,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor')
+        ))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/chat/conversation/<int:session_id>/messages', methods=['GET'])
+def conversation_messages(session_id):
+    try:
+        page = list_session_messages(
+            session_id,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor')
+        )
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    if page is None:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(page)
 
 @app.route('/chat/conversation/<int:session_id>', methods=['DELETE'])
 def delete_conversation(session_id):
-    with next(get_db_session()) as db:
-        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
-        if session:
-            db.delete(session)  # This will cascade delete all messages
-            db.commit()
-            return jsonify({'status': 'deleted'})
-        return jsonify({'error': 'Not found'}), 404
+    if remove_conversation(session_id):
+        return jsonify({'status': 'deleted'})
+    return jsonify({'error': 'Not found'}), 404
+
+@app.route('/chat/conversations/<email>', methods=['DELETE'])
+def delete_conversations(email):
+    """Delete every conversation of the signed-in user (purged in the background)."""
+    auth = request.headers.get('Authorization', '')
+    try:
+        user = verify_token(auth[len('Bearer '):]).get('sub') if auth.startswith('Bearer ') else None
+    except HTTPException:
+        user = None
+    if user != email:
+        return jsonify({'error': 'Sign in as this user to delete their conversations'}), 403
+    return jsonify({'status': 'deleted', 'deleted_sessions': delete_all_conversations(email)})
+
+@app.route('/chat/purge-stats', methods=['GET'])
+def purge_stats():
+    return jsonify(conversation_purger.stats())
+
+@app.route('/chat/archive-stats', methods=['GET'])
+def archive_stats():
+    return jsonify(archive_reader.stats())
 
 @app.route('/chat/feedback/<int:chat_id>', methods=['POST'])
 def submit_feedback(chat_id):
@@ -105,17 +259,10 @@ def submit_feedback(chat_id):
     
     if not rating or not isinstance(rating, int) or rating < 1 or rating > 5:
         return jsonify({'error': 'Valid rating (1-5) is required'}), 400
-        
-    with next(get_db_session()) as db:
-        # Verify chat exists
-        chat = db.query(ChatHistory).filter(ChatHistory.id == chat_id).first()
-        if not chat:
-            return jsonify({'error': 'Chat message not found'}), 404
-            
-        feedback = Feedback(chat_id=chat_id, rating=rating, suggestion=suggestion)
-        db.add(feedback)
-        db.commit()
-        return jsonify({'status': 'feedback saved'})
+
+    if not save_feedback(chat_id, rating, suggestion):
+        return jsonify({'error': 'Chat message not found'}), 404
+    return jsonify({'status': 'feedback saved'})
 
 @app.errorhandler(404)
 def not_found(e):
@@ -132,4 +279,8 @@ def handle_exception(e):
     return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    init_db()
+    model_registry.warm_up()
+    semantic_cache.warm_up()
+    conversation_purger.start()
     app.run(host='0.0.0.0', port=8000, debug=True)
@@ -0,0 +1,354 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from backend.services.metrics import watch_queue
+
+logger = logging.getLogger(__name__)
+
+# Rate limit configuration (tokens per second and bucket size)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | sqlite (shared by workers on one host)
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", "rate_limits.sqlite3")
+RATE_LIMIT_USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", "0.5"))
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "10"))
+RATE_LIMIT_IP_RATE = float(os.getenv("RATE_LIMIT_IP_RATE", "1"))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "20"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Admission configuration (per worker process)
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "64"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "128"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+
+PRIORITY_USER = 0
+PRIORITY_ANONYMOUS = 1
+
+
+class RateLimited(Exception):
+    """A token bucket is empty; retry_after is when the next token arrives."""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Too many requests for this {scope}")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """The admission queue is full or the wait for a slot ran out."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Server is busy, please retry shortly")
+        self.retry_after = retry_after
+
+
+# (key, tokens per second, bucket size)
+Bucket = Tuple[str, float, float]
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + (now - updated) * rate)
+
+
+def _waits(levels: Sequence[float], buckets: Sequence[Bucket], cost: float) -> List[float]:
+    """Seconds until each bucket holds `cost` tokens (0 when it already does)."""
+    return [0.0 if tokens >= cost else (cost - tokens) / rate for tokens, (_, rate, _) in zip(levels, buckets)]
+
+
+class MemoryRateLimiter:
+    """Token buckets in this process, LRU-bounded to RATE_LIMIT_MAX_KEYS keys."""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, buckets: Sequence[Bucket], cost: float = 1.0) -> List[float]:
+        """Take `cost` tokens from every bucket, or from none of them.
+
+        Returns each bucket's wait; all zero means the tokens were taken.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, rate, burst in buckets:
+                tokens, updated = self._buckets.pop(key, (burst, now))
+                levels.append(_refill(tokens, updated, now, rate, burst))
+            waits = _waits(levels, buckets, cost)
+            spend = cost if not any(waits) else 0.0
+            for (key, _, _), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens - spend, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return waits
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteRateLimiter:
+    """Token buckets in a SQLite file, so every worker process on a host shares one budget.
+
+    A local stand-in for a shared store such as Redis: each check is one
+    short write transaction.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = RATE_LIMIT_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._checks = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # losing a few bucket updates on a crash is harmless
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limits_updated ON rate_limits (updated)")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, buckets: Sequence[Bucket], cost: float = 1.0) -> List[float]:
+        """Take `cost` tokens from every bucket, or from none, in one transaction."""
+        conn = self._connect()
+        now = time.time()  # wall clock: shared between processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            for key, rate, burst in buckets:
+                row = conn.execute("SELECT tokens, updated FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                levels.append(_refill(row[0], row[1], now, rate, burst) if row else burst)
+            waits = _waits(levels, buckets, cost)
+            spend = cost if not any(waits) else 0.0
+            conn.executemany(
+                "INSERT OR REPLACE INTO rate_limits (key, tokens, updated) VALUES (?, ?, ?)",
+                [(key, tokens - spend, now) for (key, _, _), tokens in zip(buckets, levels)]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._checks += 1
+        if self._checks % 10000 == 0:
+            self.prune()
+        return waits
+
+    def prune(self, idle_seconds: float = 3600) -> int:
+        """Drop buckets untouched for idle_seconds (they would be full again anyway)."""
+        cursor = self._connect().execute("DELETE FROM rate_limits WHERE updated < ?", (time.time() - idle_seconds,))
+        return cursor.rowcount
+
+    def size(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+
+class AdmissionController:
+    """Caps concurrent LLM requests with a small, bounded priority queue in front.
+
+    Requests beyond the cap wait in a heap ordered by (priority, arrival);
+    authenticated users go ahead of anonymous ones. When the queue is full a
+    user request displaces the newest anonymous waiter, otherwise it is
+    rejected at once; waiters give up after ADMISSION_QUEUE_TIMEOUT. Shedding
+    early keeps latency low for the requests that are admitted instead of
+    letting every request time out.
+    """
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, queue_size: int = ADMISSION_QUEUE_SIZE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._service_time = 1.0  # EWMA of slot hold time, for Retry-After
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.displaced = 0
+        self.timed_out = 0
+
+    def retry_after(self) -> float:
+        """Rough time for the current backlog to drain."""
+        return max(1.0, self._service_time * (len(self._waiters) + 1) / self.max_concurrent)
+
+    def _displace_anonymous(self) -> bool:
+        newest = None
+        for entry in self._waiters:
+            if entry[0] == PRIORITY_ANONYMOUS and not entry[2].done() and (newest is None or entry[1] > newest[1]):
+                newest = entry
+        if newest is None:
+            return False
+        self._waiters.remove(newest)
+        heapq.heapify(self._waiters)
+        newest[2].set_exception(Overloaded(self.retry_after()))
+        self.displaced += 1
+        return True
+
+    async def acquire(self, priority: int = PRIORITY_ANONYMOUS) -> None:
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            if priority != PRIORITY_USER or not self._displace_anonymous():
+                self.rejected += 1
+                raise Overloaded(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._sequence), future)
+        heapq.heappush(self._waiters, entry)
+        self.queued += 1
+        try:
+            # The slot is handed over by release(); in_flight already counts us
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not (future.done() and not future.cancelled() and future.exception() is None):
+                self._remove(entry)
+                self.timed_out += 1
+                raise Overloaded(self.retry_after())
+            # else: handed a slot just as the wait expired
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release(0.0)
+            else:
+                self._remove(entry)
+            raise
+        self.admitted += 1
+
+    async def enter(self, priority: int = PRIORITY_ANONYMOUS) -> Callable[[], None]:
+        """Acquire a slot and return a release function that is safe to call more than once."""
+        await self.acquire(priority)
+        start = time.monotonic()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.release(time.monotonic() - start)
+
+        return release
+
+    def _remove(self, entry) -> None:
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        if not entry[2].done():
+            entry[2].cancel()
+
+    def release(self, held: float) -> None:
+        if held:
+            self._service_time = 0.9 * self._service_time + 0.1 * held
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # the slot passes straight to the waiter
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_ANONYMOUS) -> AsyncIterator[None]:
+        release = await self.enter(priority)
+        try:
+            yield
+        finally:
+            release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "displaced": self.displaced,
+            "timed_out": self.timed_out,
+            "avg_service_time": round(self._service_time, 3),
+        }
+
+
+class RequestLimiter:
+    """Per-user and per-IP token buckets in front of the admission queue."""
+
+    def __init__(self, backend, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend
+        self.enabled = enabled
+        self.allowed = 0
+        self.limited: Dict[str, int] = {"user": 0, "ip": 0}
+        self.errors = 0
+
+    def _check(self, user: Optional[str], ip: str) -> None:
+        scopes = ["ip"]
+        buckets: List[Bucket] = [(f"ip:{ip}", RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST)]
+        if user:
+            scopes.insert(0, "user")
+            buckets.insert(0, (f"user:{user}", RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST))
+        # Debits all buckets or none: a request the IP bucket refuses must not spend the user's token
+        for scope, wait in zip(scopes, self.backend.acquire(buckets)):
+            if wait > 0:
+                self.limited[scope] += 1
+                raise RateLimited(scope, wait)
+        self.allowed += 1
+
+    async def check(self, user: Optional[str], ip: str) -> None:
+        """Raise RateLimited if this user's or IP's bucket is empty; fails open on store errors."""
+        if not self.enabled:
+            return
+        try:
+            if self.backend.blocking:
+                await asyncio.get_running_loop().run_in_executor(None, self._check, user, ip)
+            else:
+                self._check(user, ip)
+        except RateLimited:
+            raise
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Rate limit check failed, allowing request: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "keys": self.backend.size(),
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+            "errors": self.errors,
+        }
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+def _create_backend():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteRateLimiter()
+    return MemoryRateLimiter()
+
+
+request_limiter = RequestLimiter(_create_backend())
+admission = AdmissionController()
+watch_queue("admission", lambda: len(admission._waiters), lambda: admission.in_flight)
@@ -5,6 +5,7 @@ from typing import Optional, Dict
 from fastapi import HTTPException
 import os
 from dotenv import load_dotenv
+from backend.services.password_hasher import BCRYPT_ROUNDS
 
 load_dotenv()
 
@@ -23,7 +24,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     """Hash a password for storage"""
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode(), salt)
     return hashed.decode()
 
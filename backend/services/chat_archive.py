@@ -0,0 +1,425 @@
+import gzip
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, text
+
+from backend.database import get_db_session
+from backend.models.chat import ArchivedSession, ChatHistory, ChatSession, Feedback
+from backend.services.chat_stats import HELPFUL_RATING
+from backend.services.chat_writer import ID_EPOCH_MS, ID_NODE_BITS, ID_SEQUENCE_BITS
+
+try:
+    import zstandard
+except ImportError:  # segments fall back to gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Archive configuration
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))  # idle days before a session leaves the hot tables
+ARCHIVE_SESSIONS_PER_SECOND = float(os.getenv("ARCHIVE_SESSIONS_PER_SECOND", "20"))
+ARCHIVE_SEGMENT_BYTES = int(os.getenv("ARCHIVE_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC", "zstd" if zstandard else "gzip")  # zstd | gzip
+ARCHIVE_CACHE_SIZE = int(os.getenv("ARCHIVE_CACHE_SIZE", "256"))  # rehydrated sessions kept per process
+
+# Candidates are walked in primary-key order. Ids are time-ordered, so a
+# session created after the cutoff (which cannot be idle for long enough)
+# has an id above _id_at(cutoff) and the range scan stops there.
+_IDLE = text("COALESCE(last_message_at, created_at) < NOW() - INTERVAL :days DAY")
+_CANDIDATES = text(f"""
+    SELECT id FROM chat_sessions
+    WHERE id > :after AND id < :before AND deleted_at IS NULL AND {_IDLE.text}
+    ORDER BY id
+    LIMIT :limit
+""")
+
+
+_segment_numbers = itertools.count(1)  # unique segment names per process, across writers
+
+
+def _id_at(timestamp: float) -> int:
+    """The smallest time-ordered id generated at `timestamp` (see IdGenerator)."""
+    return max(0, int(timestamp * 1000) - ID_EPOCH_MS) << (ID_NODE_BITS + ID_SEQUENCE_BITS)
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("ARCHIVE_CODEC=zstd needs the zstandard package")
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return gzip.compress(data, mtime=0)
+
+
+def _decompress(frame: bytes, segment: str) -> bytes:
+    if segment.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"Segment {segment} is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(frame)
+    return gzip.decompress(frame)
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def encode_session(session: ChatSession, messages: List[ChatHistory], feedback: List[Feedback]) -> bytes:
+    """A session as JSON lines: its row first, then one line per message with that message's feedback."""
+    ratings: Dict[int, List[Dict[str, Any]]] = {}
+    for item in feedback:
+        ratings.setdefault(item.chat_id, []).append({
+            "id": item.id, "rating": item.rating, "suggestion": item.suggestion, "created_at": _iso(item.created_at),
+        })
+    lines = [{"session": {
+        "id": session.id,
+        "user_email": session.user_email,
+        "title": session.title,
+        "created_at": _iso(session.created_at),
+        "updated_at": _iso(session.updated_at),
+        "summary": session.summary,
+        "summary_through_id": session.summary_through_id,
+        "last_message_at": _iso(session.last_message_at),
+    }}]
+    lines += [{
+        "id": msg.id,
+        "user_message": msg.user_message,
+        "bot_response": msg.bot_response,
+        "created_at": _iso(msg.created_at),
+        "feedback": ratings.get(msg.id, []),
+    } for msg in messages]
+    return "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode()
+
+
+def decode_session(data: bytes) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    lines = [json.loads(line) for line in data.decode().splitlines() if line]
+    return lines[0]["session"], lines[1:]
+
+
+class SegmentWriter:
+    """Appends compressed session frames to segment files under `root`.
+
+    Every frame is a complete zstd frame or gzip member, so a segment is
+    itself a valid .jsonl.zst / .jsonl.gz file, and one session is read
+    back from its (offset, length) without touching the rest. A writer
+    only ever appends to files it created and rolls over after max_bytes.
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR, codec: str = ARCHIVE_CODEC, max_bytes: int = ARCHIVE_SEGMENT_BYTES):
+        self.root = root
+        self.codec = codec
+        self.max_bytes = max_bytes
+        self._file = None
+        self._segment = ""
+        self._size = 0
+
+    def append(self, data: bytes) -> Tuple[str, int, int]:
+        """Write one frame durably; returns (segment, offset, length)."""
+        if self._file is None or self._size >= self.max_bytes:
+            self._open()
+        frame = _compress(data, self.codec)
+        offset = self._size
+        self._file.write(frame)
+        self._file.flush()
+        os.fsync(self._file.fileno())  # durable before the hot rows are deleted
+        self._size += len(frame)
+        return self._segment, offset, len(frame)
+
+    def _open(self) -> None:
+        self.close()
+        suffix = ".jsonl.zst" if self.codec == "zstd" else ".jsonl.gz"
+        self._segment = os.path.join(
+            time.strftime("%Y/%m"),
+            f"{socket.gethostname()}-{os.getpid()}-{int(time.time())}-{next(_segment_numbers)}{suffix}"
+        )
+        path = os.path.join(self.root, self._segment)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "xb")
+        self._size = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_frame(segment: str, offset: int, length: int, root: str = ARCHIVE_DIR) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    with open(os.path.join(root, segment), "rb") as f:
+        f.seek(offset)
+        frame = f.read(length)
+    if len(frame) != length:
+        raise IOError(f"Segment {segment} is truncated at offset {offset}")
+    return decode_session(_decompress(frame, segment))
+
+
+def _manifest_entry(db, session_id: int, lock: bool = False) -> Optional[ArchivedSession]:
+    query = db.query(ArchivedSession).filter(ArchivedSession.id == session_id)
+    return (query.with_for_update() if lock else query).first()
+
+
+class ArchiveReader:
+    """Rehydrates archived sessions from their segment frames, with a small per-process LRU.
+
+    Opening an archived conversation pages through its messages; the frame
+    is read and decompressed once and the following pages come from memory.
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR, max_sessions: int = ARCHIVE_CACHE_SIZE):
+        self.root = root
+        self.max_sessions = max_sessions
+        self._frames: "OrderedDict[Tuple[str, int], Tuple[Dict[str, Any], List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.last_read_ms = 0.0
+
+    def session(self, session_id: int) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """(session row, messages) of an archived session, or None if it is not archived.
+
+        The manifest is checked on every call (a primary-key lookup), so a
+        session deleted or restored through another worker is never served
+        from the cache; only decompressed frames are cached.
+        """
+        for attempt in range(2):
+            with next(get_db_session()) as db:
+                entry = _manifest_entry(db, session_id)
+            if entry is None:
+                return None
+            key = (entry.segment, entry.frame_offset)
+            with self._lock:
+                cached = self._frames.get(key)
+                if cached is not None:
+                    self._frames.move_to_end(key)
+                    self.hits += 1
+                    return cached
+            try:
+                return self._read(key, entry.frame_length)
+            except FileNotFoundError:
+                if attempt:
+                    raise
+                # Moved by a segment compaction after the manifest was read; look it up again
+        return None
+
+    def _read(self, key: Tuple[str, int], length: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        start = time.perf_counter()
+        rehydrated = read_frame(key[0], key[1], length, self.root)
+        self.last_read_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.misses += 1
+            self._frames[key] = rehydrated
+            while len(self._frames) > self.max_sessions:
+                self._frames.popitem(last=False)
+        return rehydrated
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cached_sessions": len(self._frames),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "last_read_ms": round(self.last_read_ms, 2),
+        }
+
+
+archive_reader = ArchiveReader()
+
+
+def restore_session(session_id: int) -> bool:
+    """Move an archived session back into the hot tables; False if it is not archived.
+
+    Used when a user continues an archived conversation. The user's stats
+    never stopped counting it, so they are left alone.
+    """
+    with next(get_db_session()) as db:
+        entry = _manifest_entry(db, session_id, lock=True)
+        if entry is None:
+            return False
+        session, messages = read_frame(entry.segment, entry.frame_offset, entry.frame_length, archive_reader.root)
+        db.execute(insert(ChatSession), [{
+            **session,
+            "created_at": _datetime(session["created_at"]),
+            "updated_at": _datetime(session["updated_at"]),
+            "last_message_at": _datetime(session["last_message_at"]),
+            "message_count": len(messages),
+        }])
+        if messages:
+            db.execute(insert(ChatHistory), [{
+                "id": msg["id"],
+                "session_id": session_id,
+                "user_email": session["user_email"],
+                "user_message": msg["user_message"],
+                "bot_response": msg["bot_response"],
+                "created_at": _datetime(msg["created_at"]),
+            } for msg in messages])
+        feedback = [{**item, "chat_id": msg["id"], "created_at": _datetime(item["created_at"])}
+                    for msg in messages for item in msg["feedback"]]
+        if feedback:
+            db.execute(insert(Feedback), feedback)
+        db.delete(entry)
+        db.commit()
+    logger.info(f"Restored archived session {session_id} ({len(messages)} messages)")
+    return True
+
+
+class ArchiveJob:
+    """Moves sessions idle for `after_days` out of the hot tables into segment files.
+
+    Each session is one transaction: lock it (re-checking it is still idle
+    and not deleted), write its frame durably, add its manifest row and
+    delete the session, whose messages and feedback follow through ON
+    DELETE CASCADE. A crash leaves at most an unreferenced frame behind, and
+    archived sessions drop out of the candidate set, so re-running the job
+    resumes it; `after` skips ahead to the last id it logged. Sessions are
+    archived at no more than `rate` per second to leave the database to
+    the application.
+    """
+
+    def __init__(self, after_days: int = ARCHIVE_AFTER_DAYS, rate: float = ARCHIVE_SESSIONS_PER_SECOND,
+                 writer: Optional[SegmentWriter] = None, batch_size: int = 500):
+        self.after_days = after_days
+        self.rate = rate
+        self.writer = writer or SegmentWriter()
+        self.batch_size = batch_size
+        self.archived = 0
+        self.messages = 0
+        self.bytes = 0
+        self.skipped = 0
+
+    def candidates(self, after: int, limit: int) -> List[int]:
+        before = _id_at(time.time() - self.after_days * 86400)
+        with next(get_db_session()) as db:
+            return db.execute(_CANDIDATES, {
+                "after": after, "before": before, "days": self.after_days, "limit": limit
+            }).scalars().all()
+
+    def archive_session(self, session_id: int) -> bool:
+        with next(get_db_session()) as db:
+            session = db.query(ChatSession).filter(
+                ChatSession.id == session_id,
+                ChatSession.deleted_at.is_(None),
+                _IDLE.bindparams(days=self.after_days)
+            ).with_for_update().first()
+            if session is None:
+                return False  # written to or deleted since it was selected
+            messages = db.query(ChatHistory).filter(ChatHistory.session_id == session_id).order_by(ChatHistory.id).all()
+            feedback = db.query(Feedback).join(ChatHistory).filter(
+                ChatHistory.session_id == session_id
+            ).order_by(Feedback.id).all()
+            segment, offset, length = self.writer.append(encode_session(session, messages, feedback))
+            db.add(ArchivedSession(
+                id=session.id,
+                user_email=session.user_email,
+                title=session.title,
+                created_at=session.created_at,
+                last_message_at=session.last_message_at,
+                message_count=len(messages),
+                rated_responses=len(feedback),
+                helpful_responses=sum(1 for item in feedback if item.rating >= HELPFUL_RATING),
+                segment=segment,
+                frame_offset=offset,
+                frame_length=length,
+            ))
+            db.query(ChatSession).filter(ChatSession.id == session_id).delete(synchronize_session=False)
+            db.commit()
+        self.messages += len(messages)
+        self.bytes += length
+        return True
+
+    def run(self, after: int = 0, max_sessions: Optional[int] = None) -> Dict[str, Any]:
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        next_at = time.monotonic()
+        try:
+            while max_sessions is None or self.archived < max_sessions:
+                ids = self.candidates(after, self.batch_size)
+                if not ids:
+                    break
+                for session_id in ids:
+                    if max_sessions is not None and self.archived >= max_sessions:
+                        break
+                    time.sleep(max(0.0, next_at - time.monotonic()))
+                    next_at = max(next_at + interval, time.monotonic())
+                    if self.archive_session(session_id):
+                        self.archived += 1
+                    else:
+                        self.skipped += 1
+                    after = session_id
+                logger.info(f"Archived {self.archived} sessions ({self.messages} messages, {self.bytes} bytes) "
+                            f"through id {after}")
+        finally:
+            self.writer.close()
+        return {**self.stats(), "last_id": after}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "archived_sessions": self.archived,
+            "archived_messages": self.messages,
+            "compressed_bytes": self.bytes,
+            "skipped": self.skipped,
+        }
+
+
+def compact_segments(root: str = ARCHIVE_DIR, min_live_ratio: float = 0.5, min_age: float = 3600) -> Dict[str, int]:
+    """Rewrite segments whose frames are mostly no longer referenced, and remove unreferenced ones.
+
+    Frames of archived sessions that were deleted or restored stay in their
+    segment until this runs. Files younger than `min_age` seconds are left
+    alone, as an archive job may still be writing them.
+    """
+    with next(get_db_session()) as db:
+        live = {row.segment: int(row.live) for row in db.query(
+            ArchivedSession.segment, func.sum(ArchivedSession.frame_length).label("live")
+        ).group_by(ArchivedSession.segment)}
+    result = {"segments_rewritten": 0, "segments_removed": 0, "bytes_reclaimed": 0}
+    cutoff = time.time() - min_age
+    for directory, _, files in os.walk(root):
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            segment = os.path.relpath(path, root)
+            if not name.endswith((".jsonl.zst", ".jsonl.gz")) or os.path.getmtime(path) > cutoff:
+                continue
+            size = os.path.getsize(path)
+            if segment not in live:
+                os.remove(path)
+                result["segments_removed"] += 1
+                result["bytes_reclaimed"] += size
+            elif live[segment] < size * min_live_ratio:
+                result["bytes_reclaimed"] += size - _rewrite_segment(segment, root)
+                result["segments_rewritten"] += 1
+    return result
+
+
+def _rewrite_segment(segment: str, root: str) -> int:
+    """Copy a segment's referenced frames into a new segment; returns the bytes written."""
+    codec = "zstd" if segment.endswith(".zst") else "gzip"
+    writer = SegmentWriter(root, codec, max_bytes=1 << 62)
+    written = 0
+    try:
+        with next(get_db_session()) as db:
+            entries = db.query(ArchivedSession).filter(
+                ArchivedSession.segment == segment
+            ).order_by(ArchivedSession.frame_offset).with_for_update().all()
+            with open(os.path.join(root, segment), "rb") as f:
+                for entry in entries:
+                    f.seek(entry.frame_offset)
+                    data = _decompress(f.read(entry.frame_length), segment)
+                    entry.segment, entry.frame_offset, entry.frame_length = writer.append(data)
+                    written += entry.frame_length
+            db.commit()
+    finally:
+        writer.close()
+    # Readers that fetched the old location retry once against the manifest
+    os.remove(os.path.join(root, segment))
+    return written
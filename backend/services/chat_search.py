@@ -0,0 +1,131 @@
+import base64
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from backend.database import get_db_session
+from backend.services.chat_store import InvalidCursor, clamp_page_size
+from backend.services.chat_writer import chat_writer
+
+logger = logging.getLogger(__name__)
+
+# Search configuration
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "160"))
+SEARCH_MAX_QUERY_CHARS = 200
+
+# MATCH ... AGAINST is served by the ft_chat_history_text FULLTEXT index
+# (migration 0006); the user filter, keyset condition and the skip of deleted
+# sessions are applied to its matches. Relevance is InnoDB's TF-IDF score:
+# term frequency in the message, weighted by how rare the term is across all
+# messages, normalized by length.
+_MATCH = "MATCH(c.user_message, c.bot_response) AGAINST (:query IN NATURAL LANGUAGE MODE)"
+_SEARCH = f"""
+    SELECT c.id, c.session_id, c.user_message, c.bot_response, c.created_at, {_MATCH} AS score
+    FROM chat_history c
+    JOIN chat_sessions s ON s.id = c.session_id AND s.deleted_at IS NULL
+    WHERE c.user_email = :email AND {_MATCH} {{after}}
+    ORDER BY score DESC, c.id DESC
+    LIMIT :limit
+"""
+_AFTER = f"AND ({_MATCH} < :score OR ({_MATCH} = :score AND c.id < :id))"
+
+
+class InvalidQuery(ValueError):
+    """Raised when a search query is empty or too long."""
+
+
+def encode_search_cursor(score: float, row_id: int) -> str:
+    """Opaque keyset cursor for the (score, id) position of the last result on a page."""
+    # repr() round-trips the float exactly, so the next page starts right after this row
+    return base64.urlsafe_b64encode(f"{score!r}|{row_id}".encode()).decode()
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        score, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return float(score), int(row_id)
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+
+def query_terms(query: str) -> List[str]:
+    return list(dict.fromkeys(word for word in re.findall(r"\w+", query.lower()) if len(word) > 1))
+
+
+def build_snippet(body: str, terms: List[str], width: int = SEARCH_SNIPPET_CHARS) -> Dict[str, Any]:
+    """The window of `body` covering the most distinct query terms, with highlight offsets.
+
+    Terms match as word prefixes, so "invoice" also highlights "invoices".
+    Highlights are [start, end) character offsets into the returned text.
+    """
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE) \
+        if terms else None
+    hits = [(m.start(), m.end(), m.group().lower()) for m in pattern.finditer(body)] if pattern else []
+
+    start = 0
+    if hits and len(body) > width:
+        # Slide a window anchored at each hit; keep the one with the most distinct terms
+        best = -1
+        for i, (anchor, _, _) in enumerate(hits):
+            covered = {word for s, e, word in hits[i:] if e <= anchor + width}
+            distinct = sum(1 for term in terms if any(word.startswith(term) for word in covered))
+            if distinct > best:
+                best, start = distinct, anchor
+        # Back up a little for context, to a word boundary
+        start = max(0, start - width // 4)
+        if start:
+            space = body.rfind(" ", 0, start)
+            start = space + 1 if space >= 0 and start - space < 20 else start
+    end = min(len(body), start + width)
+    if end < len(body):
+        space = body.rfind(" ", start, end)
+        end = space if space > start + width // 2 else end
+
+    prefix = "…" if start > 0 else ""
+    snippet = prefix + body[start:end] + ("…" if end < len(body) else "")
+    highlights = [
+        [s - start + len(prefix), e - start + len(prefix)] for s, e, _ in hits if s >= start and e <= end
+    ]
+    return {"text": snippet, "highlights": highlights}
+
+
+def search_messages(email: str, query: str, limit: Optional[int] = None,
+                    cursor: Optional[str] = None) -> Dict[str, Any]:
+    """One page of a user's messages matching `query`, best match first."""
+    query = (query or "").strip()
+    if not query:
+        raise InvalidQuery("Query must not be empty")
+    if len(query) > SEARCH_MAX_QUERY_CHARS:
+        raise InvalidQuery(f"Query must be at most {SEARCH_MAX_QUERY_CHARS} characters")
+    limit = clamp_page_size(limit)
+    params: Dict[str, Any] = {"email": email, "query": query, "limit": limit + 1}
+    after = ""
+    if cursor:
+        params["score"], params["id"] = decode_search_cursor(cursor)
+        after = _AFTER
+
+    # Answers still in the write-behind buffer become searchable once written
+    chat_writer.wait_for(email=email)
+    with next(get_db_session()) as db:
+        rows = db.execute(text(_SEARCH.format(after=after)), params).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(rows[-1].score, rows[-1].id)
+    terms = query_terms(query)
+    return {
+        "query": query,
+        "results": [{
+            "id": row.id,
+            "session_id": row.session_id,
+            "created_at": row.created_at.isoformat(),
+            "score": round(float(row.score), 4),
+            "user_message": build_snippet(row.user_message, terms),
+            "bot_response": build_snippet(row.bot_response, terms),
+        } for row in rows],
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,285 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Chat stats configuration
+HELPFUL_RATING = int(os.getenv("HELPFUL_RATING", "4"))  # feedback ratings at or above this count as helpful
+CHAT_STATS_CACHE_TTL = float(os.getenv("CHAT_STATS_CACHE_TTL", "30"))
+CHAT_STATS_CACHE_SIZE = int(os.getenv("CHAT_STATS_CACHE_SIZE", "10000"))
+RECENT_SESSIONS = 5
+
+_BUMP_SESSIONS = text("""
+    UPDATE chat_sessions SET message_count = message_count + :messages, last_message_at = NOW()
+    WHERE id = :id
+""")
+_BUMP_USER = text("""
+    INSERT INTO user_chat_stats (user_email, total_chats, total_sessions, last_activity)
+    VALUES (:email, :chats, :sessions, NOW())
+    ON DUPLICATE KEY UPDATE
+        total_chats = total_chats + VALUES(total_chats),
+        total_sessions = total_sessions + VALUES(total_sessions),
+        last_activity = VALUES(last_activity)
+""")
+_BUMP_FEEDBACK = text("""
+    INSERT INTO user_chat_stats (user_email, rated_responses, helpful_responses)
+    VALUES (:email, 1, :helpful)
+    ON DUPLICATE KEY UPDATE
+        rated_responses = rated_responses + 1,
+        helpful_responses = helpful_responses + VALUES(helpful_responses)
+""")
+
+
+# Incremental updates. Each runs inside the caller's transaction, before its
+# commit, so the counters can never disagree with the rows they describe.
+# Row locks are taken sessions first, then archived_sessions, then
+# user_chat_stats, in key order. Archiving a session moves its rows but
+# leaves the counters alone: archived sessions still count.
+
+def record_turns(db, sessions: List[Dict[str, Any]], messages: List[Dict[str, Any]]) -> Set[str]:
+    """Count a batch of new messages (and the new sessions among them); returns the emails touched."""
+    per_session = Counter(message["session_id"] for message in messages)
+    per_user = Counter(message["user_email"] for message in messages)
+    new_sessions = Counter(session["user_email"] for session in sessions)
+    db.execute(_BUMP_SESSIONS, [{"id": session_id, "messages": n} for session_id, n in sorted(per_session.items())])
+    db.execute(_BUMP_USER, [
+        {"email": email, "chats": n, "sessions": new_sessions[email]} for email, n in sorted(per_user.items())
+    ])
+    return set(per_user)
+
+
+def record_feedback(db, email: str, rating: int) -> None:
+    db.execute(_BUMP_FEEDBACK, {"email": email, "helpful": int(rating >= HELPFUL_RATING)})
+
+
+def forget_session(db, session_id: int, email: str) -> None:
+    """Subtract a session that is about to be deleted, with its messages and their feedback."""
+    messages = db.execute(
+        text("SELECT COUNT(*) FROM chat_history WHERE session_id = :id"), {"id": session_id}
+    ).scalar() or 0
+    rated, helpful = db.execute(text("""
+        SELECT COUNT(*), COALESCE(SUM(f.rating >= :helpful), 0)
+        FROM feedback f JOIN chat_history c ON c.id = f.chat_id
+        WHERE c.session_id = :id
+    """), {"id": session_id, "helpful": HELPFUL_RATING}).one()
+    _subtract(db, email, messages, rated, helpful)
+
+
+def forget_archived_session(db, entry) -> None:
+    """Subtract an archived session that is about to be deleted, from the counts in its manifest row."""
+    _subtract(db, entry.user_email, entry.message_count, entry.rated_responses, entry.helpful_responses)
+
+
+def _subtract(db, email: str, messages: int, rated: int, helpful: int) -> None:
+    db.execute(text("""
+        UPDATE user_chat_stats SET
+            total_chats = GREATEST(total_chats - :messages, 0),
+            total_sessions = GREATEST(total_sessions - 1, 0),
+            rated_responses = GREATEST(rated_responses - :rated, 0),
+            helpful_responses = GREATEST(helpful_responses - :helpful, 0)
+        WHERE user_email = :email
+    """), {"email": email, "messages": messages, "rated": rated, "helpful": helpful})
+
+
+def forget_user(db, email: str) -> None:
+    """Drop the counters of a user whose sessions are all being deleted."""
+    db.execute(text("DELETE FROM user_chat_stats WHERE user_email = :email"), {"email": email})
+
+
+# Rebuild from the source tables (DB-API cursor, as used by backend/migrations)
+
+def rebuild_user(cursor, email: str) -> Dict[str, Any]:
+    """Recompute one user's counters from chat_history and feedback; the caller commits.
+
+    The user's session rows and stats row are locked first, so concurrent
+    writers for this user wait and apply their increments on top of the
+    rebuilt values instead of being lost or counted twice. Archived
+    sessions are counted from their manifest rows.
+    """
+    cursor.execute("SELECT id FROM chat_sessions WHERE user_email = %s AND deleted_at IS NULL FOR UPDATE",
+                   (email,))
+    session_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("""
+        SELECT COUNT(*), COALESCE(SUM(message_count), 0), COALESCE(SUM(rated_responses), 0),
+               COALESCE(SUM(helpful_responses), 0), MAX(COALESCE(last_message_at, created_at))
+        FROM archived_sessions WHERE user_email = %s FOR UPDATE
+    """, (email,))
+    archived, archived_chats, archived_rated, archived_helpful, archived_last = cursor.fetchone()
+    cursor.execute("SELECT user_email FROM user_chat_stats WHERE user_email = %s FOR UPDATE", (email,))
+    cursor.fetchall()
+    if not session_ids and not archived:
+        cursor.execute("DELETE FROM user_chat_stats WHERE user_email = %s", (email,))
+        return {"email": email, "total_sessions": 0}
+
+    cursor.execute("""
+        SELECT session_id, COUNT(*), MAX(created_at) FROM chat_history
+        WHERE user_email = %s GROUP BY session_id
+    """, (email,))
+    live = set(session_ids)
+    per_session = {row[0]: (row[1], row[2]) for row in cursor.fetchall() if row[0] in live}
+    cursor.execute("""
+        SELECT COUNT(*), COALESCE(SUM(f.rating >= %s), 0)
+        FROM feedback f
+        JOIN chat_history c ON c.id = f.chat_id
+        JOIN chat_sessions s ON s.id = c.session_id AND s.deleted_at IS NULL
+        WHERE c.user_email = %s
+    """, (HELPFUL_RATING, email))
+    rated, helpful = cursor.fetchone()
+
+    cursor.executemany(
+        "UPDATE chat_sessions SET message_count = %s, last_message_at = %s WHERE id = %s",
+        [(*per_session.get(session_id, (0, None)), session_id) for session_id in sorted(session_ids)]
+    )
+    stats = {
+        "email": email,
+        "total_chats": sum(count for count, _ in per_session.values()) + int(archived_chats),
+        "total_sessions": len(session_ids) + int(archived),
+        "rated_responses": int(rated) + int(archived_rated),
+        "helpful_responses": int(helpful) + int(archived_helpful),
+        "last_activity": max((last for _, last in per_session.values() if last), default=None),
+    }
+    if stats["last_activity"] is None and session_ids:
+        cursor.execute("SELECT MAX(created_at) FROM chat_sessions WHERE user_email = %s AND deleted_at IS NULL",
+                       (email,))
+        stats["last_activity"] = cursor.fetchone()[0]
+    if archived_last and (stats["last_activity"] is None or archived_last > stats["last_activity"]):
+        stats["last_activity"] = archived_last
+    cursor.execute("""
+        INSERT INTO user_chat_stats
+            (user_email, total_chats, total_sessions, rated_responses, helpful_responses, last_activity)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            total_chats = VALUES(total_chats), total_sessions = VALUES(total_sessions),
+            rated_responses = VALUES(rated_responses), helpful_responses = VALUES(helpful_responses),
+            last_activity = VALUES(last_activity)
+    """, (email, stats["total_chats"], stats["total_sessions"], stats["rated_responses"],
+          stats["helpful_responses"], stats["last_activity"]))
+    return stats
+
+
+def stats_emails(cursor, after: str = "", limit: int = 1000) -> List[str]:
+    """Emails with sessions or a stats row, in order, for a resumable full rebuild."""
+    cursor.execute("""
+        SELECT user_email FROM (
+            SELECT DISTINCT user_email FROM chat_sessions WHERE user_email > %s
+            UNION
+            SELECT DISTINCT user_email FROM archived_sessions WHERE user_email > %s
+            UNION
+            SELECT user_email FROM user_chat_stats WHERE user_email > %s
+        ) emails ORDER BY user_email LIMIT %s
+    """, (after, after, after, limit))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild_all(conn, after: str = "") -> int:
+    """Rebuild every user, one short transaction each; returns the number of users rebuilt."""
+    cursor = conn.cursor()
+    rebuilt = 0
+    try:
+        while True:
+            emails = stats_emails(cursor, after)
+            conn.commit()
+            if not emails:
+                return rebuilt
+            for email in emails:
+                rebuild_user(cursor, email)
+                conn.commit()
+                rebuilt += 1
+            after = emails[-1]
+            logger.info(f"Rebuilt chat stats for {rebuilt} users (through {after})")
+    finally:
+        cursor.close()
+
+
+# Read path
+
+def read_user_stats(cursor, email: str) -> Dict[str, Any]:
+    """Three primary-key/index lookups, independent of how much history the user has."""
+    cursor.execute("""
+        SELECT total_chats, total_sessions, rated_responses, helpful_responses, last_activity
+        FROM user_chat_stats WHERE user_email = %s
+    """, (email,))
+    stats = cursor.fetchone() or {
+        "total_chats": 0, "total_sessions": 0, "rated_responses": 0, "helpful_responses": 0, "last_activity": None,
+    }
+    cursor.execute("""
+        SELECT id, title, created_at, last_message_at, message_count FROM chat_sessions
+        WHERE user_email = %s AND deleted_at IS NULL ORDER BY created_at DESC, id DESC LIMIT %s
+    """, (email, RECENT_SESSIONS))
+    sessions = cursor.fetchall()
+    cursor.execute("""
+        SELECT id, title, created_at, last_message_at, message_count FROM archived_sessions
+        WHERE user_email = %s ORDER BY created_at DESC, id DESC LIMIT %s
+    """, (email, RECENT_SESSIONS))
+    sessions = sorted(sessions + cursor.fetchall(), key=lambda session: (session["created_at"], session["id"]),
+                      reverse=True)[:RECENT_SESSIONS]
+    return {
+        **stats,
+        "last_activity": stats["last_activity"].isoformat() if stats["last_activity"] else None,
+        "recent_sessions": [{
+            "id": session["id"],
+            "topic": session["title"],
+            "start_time": session["created_at"].isoformat(),
+            "end_time": session["last_message_at"].isoformat() if session["last_message_at"] else None,
+            "messages_count": session["message_count"],
+        } for session in sessions],
+    }
+
+
+class StatsCache:
+    """Per-process TTL cache of stats responses, LRU-bounded.
+
+    Writes in this process invalidate their users right after commit; other
+    workers' writes show up within CHAT_STATS_CACHE_TTL seconds.
+    """
+
+    def __init__(self, ttl: float = CHAT_STATS_CACHE_TTL, max_entries: int = CHAT_STATS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, email: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None or entry[1] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(email)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, email: str, value: Dict[str, Any]) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[email] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, emails: Iterable[str]) -> None:
+        with self._lock:
+            for email in emails:
+                self._entries.pop(email, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+stats_cache = StatsCache()
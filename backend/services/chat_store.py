@@ -0,0 +1,300 @@
+import base64
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import selectinload
+from backend.database import get_db_session
+from backend.models.chat import ArchivedSession, ChatHistory, ChatSession, Feedback
+from backend.services import chat_stats
+from backend.services.chat_archive import archive_reader
+from backend.services.chat_writer import UnknownSession, chat_ids, chat_writer
+from backend.services.conversation_context import conversation_context
+from backend.services.conversation_purge import conversation_purger
+from backend.services.semantic_cache import semantic_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of the last row on a page."""
+    raw = f"{created_at.isoformat() if created_at else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def serialize_message(msg: ChatHistory) -> Dict[str, Any]:
+    return {
+        'id': msg.id,
+        'user_message': msg.user_message,
+        'bot_response': msg.bot_response,
+        'created_at': msg.created_at.isoformat()
+    }
+
+
+def save_chat_turn(user_email: str, session_id: Optional[int], user_query: str, bot_response: str) -> Tuple[int, int]:
+    """Store one question/answer pair, creating a session if none exists.
+
+    Ids are generated up front and the rows are handed to the write-behind
+    writer; an existing session is checked (and restored from the archive if
+    needed) first, raising UnknownSession when it is missing or deleted.
+    Returns (session_id, message_id).
+    """
+    new_session = not session_id
+    session_row = None
+    # Create new session if none exists
+    if new_session:
+        session_id = chat_ids.next_id()
+        session_row = {'id': session_id, 'user_email': user_email, 'title': user_query[:50] + "..."}
+
+    message_id = chat_ids.next_id()
+    chat_writer.submit(user_email, session_row, {
+        'id': message_id,
+        'session_id': session_id,
+        'user_email': user_email,
+        'user_message': user_query,
+        'bot_response': bot_response
+    })
+
+    conversation_context.record_turn(session_id, message_id, user_query, bot_response, new_session=new_session)
+    return session_id, message_id
+
+
+def _sessions_page_query(db, email: str, cursor: Optional[str], model=ChatSession):
+    query = db.query(model).filter(model.user_email == email)
+    if model is ChatSession:
+        query = query.filter(ChatSession.deleted_at.is_(None))
+    if cursor:
+        created_at, session_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < session_id)
+        ))
+    return query.order_by(model.created_at.desc(), model.id.desc())
+
+
+def _with_archived(db, email: str, cursor: Optional[str], sessions: List, limit: Optional[int]) -> List:
+    """Merge the user's archived sessions (from the manifest) into a page of hot ones, newest first.
+
+    Both sides are read with the same keyset condition, so the cursor of
+    the merged page is valid for both tables.
+    """
+    query = _sessions_page_query(db, email, cursor, ArchivedSession)
+    archived = (query if limit is None else query.limit(limit + 1)).all()
+    if not archived:
+        return sessions
+    return sorted(sessions + archived, key=lambda session: (session.created_at, session.id), reverse=True)
+
+
+def _page(rows: List, limit: int) -> Tuple[List, Optional[str]]:
+    """Trim the limit+1 probe row and build the next cursor."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+def list_conversations(email: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Sessions with their full messages, newest first.
+
+    Messages are loaded with one batched SELECT ... IN for the whole page, so
+    a page costs three queries regardless of its size. Archived sessions are
+    listed from their manifest with no messages; they are rehydrated when
+    opened (list_session_messages). Without a limit every session is
+    returned (the original /chat/history behaviour).
+    """
+    chat_writer.wait_for(email=email)
+    with next(get_db_session()) as db:
+        query = _sessions_page_query(db, email, cursor).options(selectinload(ChatSession.messages))
+        if limit is None and cursor is None:
+            sessions, next_cursor = _with_archived(db, email, None, query.all(), None), None
+        else:
+            limit = clamp_page_size(limit)
+            sessions, next_cursor = _page(_with_archived(db, email, cursor, query.limit(limit + 1).all(), limit), limit)
+
+        return {
+            'conversations': [
+                {
+                    'id': session.id,
+                    'title': session.title,
+                    'created_at': session.created_at.isoformat(),
+                    'archived': True,
+                    'message_count': session.message_count,
+                    'messages': []
+                } if isinstance(session, ArchivedSession) else {
+                    'id': session.id,
+                    'title': session.title,
+                    'created_at': session.created_at.isoformat(),
+                    'archived': False,
+                    'messages': [serialize_message(msg) for msg in session.messages]
+                } for session in sessions
+            ],
+            'next_cursor': next_cursor
+        }
+
+
+def list_session_summaries(email: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """One page of sessions with message count and last message time instead of bodies (two queries)."""
+    limit = clamp_page_size(limit)
+    chat_writer.wait_for(email=email)
+    with next(get_db_session()) as db:
+        hot = _sessions_page_query(db, email, cursor).limit(limit + 1).all()
+        sessions, next_cursor = _page(_with_archived(db, email, cursor, hot, limit), limit)
+
+        summaries = [{
+            'id': session.id,
+            'title': session.title,
+            'created_at': session.created_at.isoformat(),
+            'message_count': session.message_count,
+            'last_message_at': session.last_message_at.isoformat() if session.last_message_at else None,
+            'archived': isinstance(session, ArchivedSession)
+        } for session in sessions]
+        return {'sessions': summaries, 'next_cursor': next_cursor}
+
+
+def list_session_messages(session_id: int, limit: Optional[int] = None, cursor: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """One page of a session's messages in chronological order, or None if the session does not exist."""
+    limit = clamp_page_size(limit)
+    chat_writer.wait_for(session_id=session_id)
+    with next(get_db_session()) as db:
+        if not db.query(ChatSession.id).filter(ChatSession.id == session_id, ChatSession.deleted_at.is_(None)).first():
+            return _archived_session_messages(session_id, limit, cursor)
+        query = db.query(ChatHistory).filter(ChatHistory.session_id == session_id)
+        if cursor:
+            _, after_id = decode_cursor(cursor)
+            query = query.filter(ChatHistory.id > after_id)
+        messages, next_cursor = _page(query.order_by(ChatHistory.id).limit(limit + 1).all(), limit)
+        return {
+            'session_id': session_id,
+            'messages': [serialize_message(msg) for msg in messages],
+            'next_cursor': next_cursor
+        }
+
+
+def _archived_session_messages(session_id: int, limit: int, cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The same page, rehydrated from the session's archive segment."""
+    rehydrated = archive_reader.session(session_id)
+    if rehydrated is None:
+        return None
+    messages = rehydrated[1]
+    if cursor:
+        _, after_id = decode_cursor(cursor)
+        messages = [msg for msg in messages if msg['id'] > after_id]
+    page = messages[:limit]
+    return {
+        'session_id': session_id,
+        'archived': True,
+        'messages': [{key: msg[key] for key in ('id', 'user_message', 'bot_response', 'created_at')} for msg in page],
+        'next_cursor': encode_cursor(None, page[-1]['id']) if len(messages) > limit else None
+    }
+
+
+def _first_message_ids(db, session_ids: List[int]) -> List[int]:
+    # Only a session's first question can be in the semantic index
+    if not semantic_cache.enabled or not session_ids:
+        return []
+    return [row[0] for row in db.query(func.min(ChatHistory.id)).filter(
+        ChatHistory.session_id.in_(session_ids)
+    ).group_by(ChatHistory.session_id)]
+
+
+def _after_delete(session_ids: List[int], email: str, first_message_ids: List[int]) -> None:
+    chat_stats.stats_cache.invalidate([email])
+    semantic_cache.forget(first_message_ids)
+    for session_id in session_ids:
+        conversation_context.forget(session_id)
+    conversation_purger.submit(session_ids)
+
+
+def delete_conversation(session_id: int) -> bool:
+    """Hide a session at once and leave its rows to the background purge; False if it does not exist."""
+    chat_writer.wait_for(session_id=session_id)
+    with next(get_db_session()) as db:
+        # Lock the session before touching user_chat_stats (lock order: sessions, archived_sessions, stats)
+        session = db.query(ChatSession).filter(
+            ChatSession.id == session_id, ChatSession.deleted_at.is_(None)
+        ).with_for_update().first()
+        if not session:
+            return _delete_archived(db, session_id)
+        email = session.user_email
+        chat_stats.forget_session(db, session_id, email)
+        first_message_ids = _first_message_ids(db, [session_id])
+        session.deleted_at = func.now()
+        db.commit()
+    _after_delete([session_id], email, first_message_ids)
+    return True
+
+
+def _delete_archived(db, session_id: int) -> bool:
+    """Drop an archived session from the manifest; its frame goes with the next segment compaction."""
+    entry = db.query(ArchivedSession).filter(ArchivedSession.id == session_id).with_for_update().first()
+    if not entry:
+        return False
+    email = entry.user_email
+    chat_stats.forget_archived_session(db, entry)
+    db.delete(entry)
+    db.commit()
+    chat_stats.stats_cache.invalidate([email])
+    return True
+
+
+def delete_all_conversations(email: str) -> int:
+    """Hide every session of a user at once and purge them in the background; returns how many.
+
+    Archived sessions are dropped from the manifest in the same transaction.
+    """
+    chat_writer.wait_for(email=email)
+    with next(get_db_session()) as db:
+        session_ids = [row.id for row in db.query(ChatSession.id).filter(
+            ChatSession.user_email == email, ChatSession.deleted_at.is_(None)
+        ).order_by(ChatSession.id).with_for_update()]
+        archived = db.query(ArchivedSession).filter(
+            ArchivedSession.user_email == email
+        ).delete(synchronize_session=False)
+        if not session_ids and not archived:
+            return 0
+        first_message_ids = _first_message_ids(db, session_ids)
+        db.query(ChatSession).filter(
+            ChatSession.user_email == email, ChatSession.deleted_at.is_(None)
+        ).update({ChatSession.deleted_at: func.now()}, synchronize_session=False)
+        chat_stats.forget_user(db, email)
+        db.commit()
+    _after_delete(session_ids, email, first_message_ids)
+    return len(session_ids) + archived
+
+
+def save_feedback(chat_id: int, rating: int, suggestion: Optional[str]) -> bool:
+    """Store a rating for one answer; False if the message does not exist."""
+    # The rated answer may still be in the write-behind buffer
+    chat_writer.wait_for(message_id=chat_id)
+    with next(get_db_session()) as db:
+        # Verify chat exists
+        chat = db.query(ChatHistory.id, ChatHistory.user_email).filter(ChatHistory.id == chat_id).first()
+        if not chat:
+            return False
+        db.add(Feedback(chat_id=chat_id, rating=rating, suggestion=suggestion))
+        chat_stats.record_feedback(db, chat.user_email, rating)
+        db.commit()
+    chat_stats.stats_cache.invalidate([chat.user_email])
+    semantic_cache.record_feedback(chat_id, rating)
+    return True
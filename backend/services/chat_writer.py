@@ -0,0 +1,379 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import DataError, IntegrityError
+
+from backend.database import get_db_session, get_engine
+from backend.models.chat import ChatHistory, ChatSession
+from backend.services import chat_stats
+from backend.services.metrics import watch_queue
+
+logger = logging.getLogger(__name__)
+
+# Write-behind configuration
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "true").lower() == "true"
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "100"))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "0.1"))
+CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", "10000"))
+CHAT_WRITE_MAX_RETRIES = int(os.getenv("CHAT_WRITE_MAX_RETRIES", "5"))
+CHAT_WRITE_READ_TIMEOUT = float(os.getenv("CHAT_WRITE_READ_TIMEOUT", "2"))
+
+ID_EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+ID_NODE_BITS = 8  # up to 256 concurrent processes
+ID_SEQUENCE_BITS = 4  # 16 ids per millisecond per process
+ID_NODE_LEASE = float(os.getenv("ID_NODE_LEASE", "600"))  # seconds a node stays reserved without renewal
+
+# Rows the database rejects outright; retrying them only delays the rest of the batch
+PERMANENT_WRITE_ERRORS = (IntegrityError, DataError)
+
+
+class UnknownSession(LookupError):
+    """Raised when a turn names a chat session that does not exist or was deleted."""
+
+
+class IdGenerator:
+    """Time-ordered 53-bit ids: milliseconds since 2024 | node | sequence.
+
+    Ids are known before their row is written and still sort by creation
+    time across processes, so ORDER BY id stays chronological. 53 bits are
+    exact as JavaScript numbers. Each process leases a node number from the
+    id_node_leases table and renews the lease while it keeps generating ids;
+    a node is only handed out again once its lease has expired, so two live
+    processes never share one.
+    """
+
+    def __init__(self, name: str = "chat"):
+        self.name = name
+        self._node: Optional[int] = None
+        self._holder: Optional[str] = None
+        self._leased_at = 0.0
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _reserve_node(self) -> int:
+        holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+        with get_engine().begin() as conn:
+            # Longest-expired first, so a node given back is the last to be reused
+            claimed = conn.execute(text("""
+                UPDATE id_node_leases
+                SET holder = :holder, leased_until = NOW() + INTERVAL :ttl SECOND
+                WHERE name = :name AND leased_until < NOW()
+                ORDER BY leased_until, node
+                LIMIT 1
+            """), {"name": self.name, "holder": holder, "ttl": int(ID_NODE_LEASE)}).rowcount
+            if claimed != 1:
+                raise RuntimeError(
+                    f"All {1 << ID_NODE_BITS} {self.name} id nodes are leased; "
+                    f"run the database migrations or wait for stale leases to expire"
+                )
+            node = conn.execute(
+                text("SELECT node FROM id_node_leases WHERE name = :name AND holder = :holder"),
+                {"name": self.name, "holder": holder}
+            ).scalar()
+        self._holder = holder
+        logger.info(f"Leased {self.name} id node {node}")
+        return node
+
+    def _renew(self) -> bool:
+        with get_engine().begin() as conn:
+            return conn.execute(text("""
+                UPDATE id_node_leases SET leased_until = NOW() + INTERVAL :ttl SECOND
+                WHERE name = :name AND node = :node AND holder = :holder
+            """), {"name": self.name, "node": self._node, "holder": self._holder,
+                   "ttl": int(ID_NODE_LEASE)}).rowcount == 1
+
+    def _lease(self) -> None:
+        # Timed from before the round-trip, so the local view never outlives the database's
+        leased_at = time.monotonic()
+        try:
+            renewed = self._node is not None and self._renew()
+        except Exception as e:
+            if leased_at - self._leased_at < ID_NODE_LEASE * 0.9:
+                logger.warning(f"Could not renew {self.name} id node {self._node} ({e}); still leased")
+                return
+            raise
+        if not renewed:
+            if self._node is not None:
+                logger.warning(f"Lost the lease on {self.name} id node {self._node}; leasing another")
+            self._node = self._reserve_node()
+        self._leased_at = leased_at
+
+    def release(self) -> None:
+        """Give the node back at exit so it can be leased again without waiting for expiry."""
+        with self._lock:
+            if self._node is None:
+                return
+            try:
+                with get_engine().begin() as conn:
+                    conn.execute(text("""
+                        UPDATE id_node_leases SET holder = NULL, leased_until = '1970-01-01 00:00:01'
+                        WHERE name = :name AND node = :node AND holder = :holder
+                    """), {"name": self.name, "node": self._node, "holder": self._holder})
+            except Exception as e:
+                logger.warning(f"Could not release {self.name} id node {self._node}: {e}")
+            self._node = None
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._node is None or time.monotonic() - self._leased_at > ID_NODE_LEASE / 2:
+                self._lease()
+            # Never go backwards, even if the wall clock does
+            now = max(int(time.time() * 1000) - ID_EPOCH_MS, self._last_ms)
+            if now == self._last_ms:
+                self._sequence += 1
+                if self._sequence >> ID_SEQUENCE_BITS:
+                    now += 1  # sequence exhausted: borrow the next millisecond
+                    self._sequence = 0
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << (ID_NODE_BITS + ID_SEQUENCE_BITS)) | (self._node << ID_SEQUENCE_BITS) | self._sequence
+
+
+class _PendingTurn:
+    __slots__ = ("email", "session", "message")
+
+    def __init__(self, email: str, session: Optional[Dict[str, Any]], message: Dict[str, Any]):
+        self.email = email
+        self.session = session
+        self.message = message
+
+
+class ChatWriter:
+    """Write-behind buffer for chat turns.
+
+    Turns are queued and a background thread inserts them with multi-row
+    INSERTs once CHAT_WRITE_BATCH_SIZE turns are waiting or
+    CHAT_WRITE_FLUSH_INTERVAL has passed. Reads call wait_for() first, which
+    forces an immediate flush when they touch a pending turn (read-your-writes
+    within this process). When the queue is full, turns are written inline.
+    """
+
+    def __init__(self, enabled: bool = CHAT_WRITE_BEHIND, batch_size: int = CHAT_WRITE_BATCH_SIZE,
+                 flush_interval: float = CHAT_WRITE_FLUSH_INTERVAL, maxsize: int = CHAT_WRITE_QUEUE_SIZE):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[_PendingTurn]" = queue.Queue(maxsize)
+        self._cond = threading.Condition()
+        self._pending_emails: Counter = Counter()
+        self._pending_sessions: Counter = Counter()
+        self._pending_messages: set = set()
+        self._waiters = 0  # readers blocked in wait_for(); makes the writer flush without waiting
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.inline_writes = 0
+        self.failed = 0
+        self.forced_flushes = 0
+        self.last_flush_ms = 0.0
+
+    def submit(self, email: str, session: Optional[Dict[str, Any]], message: Dict[str, Any]) -> None:
+        """Persist a turn (and its new session, if any) whose ids were generated by IdGenerator.
+
+        Raises UnknownSession, before anything is queued, when the turn's
+        existing session is missing or deleted.
+        """
+        if session is None:
+            self._check_session(message["session_id"])
+        turn = _PendingTurn(email, session, message)
+        if not self.enabled:
+            self._write([turn])
+            return
+        self._ensure_started()
+        self._track(turn, +1)
+        try:
+            self._queue.put_nowait(turn)
+            self.enqueued += 1
+        except queue.Full:
+            # Backpressure: pay the round-trip now rather than buffer without bound
+            try:
+                self._write([turn])
+                self.inline_writes += 1
+            finally:
+                self._track(turn, -1)
+
+    def wait_for(self, email: Optional[str] = None, session_id: Optional[int] = None,
+                 message_id: Optional[int] = None, timeout: float = CHAT_WRITE_READ_TIMEOUT) -> bool:
+        """Block until no matching turn is waiting to be written; False on timeout."""
+        def flushed() -> bool:
+            return not (
+                (email is not None and self._pending_emails[email])
+                or (session_id is not None and self._pending_sessions[session_id])
+                or (message_id is not None and message_id in self._pending_messages)
+            )
+
+        with self._cond:
+            if flushed():
+                return True
+            self.forced_flushes += 1
+            self._waiters += 1
+            try:
+                done = self._cond.wait_for(flushed, timeout)
+            finally:
+                self._waiters -= 1
+        if not done:
+            logger.warning("Timed out waiting for pending chat writes")
+        return done
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush everything still buffered; called at interpreter exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._flush(leftover)
+
+    def _check_session(self, session_id: int) -> None:
+        with self._cond:
+            if self._pending_sessions[session_id]:
+                return  # created by a turn that is still buffered
+        with next(get_db_session()) as db:
+            found = db.query(ChatSession.id).filter(
+                ChatSession.id == session_id, ChatSession.deleted_at.is_(None)
+            ).first()
+        if found is None:
+            from backend.services.chat_archive import restore_session
+            if not restore_session(session_id):
+                raise UnknownSession(f"Chat session {session_id} not found")
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+                self._thread.start()
+
+    def _track(self, turn: _PendingTurn, delta: int) -> None:
+        with self._cond:
+            for counter, key in ((self._pending_emails, turn.email), (self._pending_sessions, turn.message["session_id"])):
+                counter[key] += delta
+                if counter[key] <= 0:
+                    del counter[key]
+            if delta > 0:
+                self._pending_messages.add(turn.message["id"])
+            else:
+                self._pending_messages.discard(turn.message["id"])
+                self._cond.notify_all()
+
+    def _collect(self) -> List[_PendingTurn]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            urgent = self._waiters > 0 or self._stop.is_set()
+            remaining = deadline - time.monotonic()
+            try:
+                if urgent or remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    # Short polls so a reader's forced flush is noticed quickly
+                    batch.append(self._queue.get(timeout=min(remaining, 0.01)))
+            except queue.Empty:
+                if urgent or remaining <= 0:
+                    break
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: List[_PendingTurn]) -> None:
+        start = time.perf_counter()
+        try:
+            for attempt in range(CHAT_WRITE_MAX_RETRIES):
+                try:
+                    self._write(batch)
+                    self.batches += 1
+                    return
+                except PERMANENT_WRITE_ERRORS as e:
+                    logger.warning(f"Chat batch insert of {len(batch)} turns rejected ({e}), isolating bad rows")
+                    break
+                except Exception as e:
+                    delay = random.uniform(0, min(5.0, 0.1 * (2 ** attempt)))
+                    logger.warning(f"Chat batch insert of {len(batch)} turns failed ({e}), retrying in {delay:.2f}s")
+                    time.sleep(delay)
+            # Isolate the rows that keep failing so the rest of the batch lands
+            for turn in batch:
+                try:
+                    self._write_one(turn)
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Dropping chat turn {turn.message['id']} for {turn.email}: {e}")
+        finally:
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            for turn in batch:
+                self._track(turn, -1)
+
+    def _write_one(self, turn: _PendingTurn) -> None:
+        try:
+            self._write([turn])
+        except IntegrityError:
+            # The session may have been archived after the turn was submitted
+            from backend.services.chat_archive import restore_session
+            if turn.session is not None or not restore_session(turn.message["session_id"]):
+                raise
+            self._write([turn])
+
+    def _write(self, batch: List[_PendingTurn]) -> None:
+        sessions = [turn.session for turn in batch if turn.session is not None]
+        messages = [turn.message for turn in batch]
+        with next(get_db_session()) as db:
+            # executemany: the MySQL driver sends these as multi-row INSERT ... VALUES
+            if sessions:
+                db.execute(insert(ChatSession), sessions)
+            db.execute(insert(ChatHistory), messages)
+            emails = chat_stats.record_turns(db, sessions, messages)
+            db.commit()
+        chat_stats.stats_cache.invalidate(emails)
+        self.written += len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self._queue.qsize(),
+            "pending_turns": len(self._pending_messages),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "inline_writes": self.inline_writes,
+            "forced_flushes": self.forced_flushes,
+            "failed": self.failed,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+
+chat_ids = IdGenerator()
+chat_writer = ChatWriter()
+# atexit runs last-registered first: flush the buffered turns, then give the node back
+atexit.register(chat_ids.release)
+atexit.register(chat_writer.close)
+watch_queue("chat_writer", chat_writer._queue.qsize)
@@ -0,0 +1,282 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import or_
+
+from backend.database import get_db_session
+from backend.models.chat import ChatHistory, ChatSession
+from backend.prompts import SUMMARY_PROMPT
+from backend.services.chat_archive import restore_session
+from backend.services.chat_writer import chat_writer
+from backend.services.llm_resilience import llm_resilience
+from backend.services.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+# Context configuration
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "300"))
+CONTEXT_SUMMARY_MODE = os.getenv("CONTEXT_SUMMARY_MODE", "llm")  # llm | extractive
+CONTEXT_MAX_SESSIONS = int(os.getenv("CONTEXT_MAX_SESSIONS", "1000"))
+CONTEXT_MAX_LOADED_TURNS = int(os.getenv("CONTEXT_MAX_LOADED_TURNS", "50"))
+CONTEXT_REFRESH_TTL = float(os.getenv("CONTEXT_REFRESH_TTL", "5"))  # seconds a cached copy is trusted
+
+# (message_id, user_message, bot_response, estimated tokens)
+Turn = Tuple[int, str, str, int]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); avoids a count_tokens round trip per turn."""
+    return len(text) // 4 + 1
+
+
+def _turn(message_id: int, user_message: str, bot_response: str) -> Turn:
+    return message_id, user_message, bot_response, estimate_tokens(user_message) + estimate_tokens(bot_response)
+
+
+class _SessionContext:
+    def __init__(self, session_id: int, summary: Optional[str], summary_through_id: Optional[int]):
+        self.session_id = session_id
+        self.summary = summary or ""
+        self.summary_through_id = summary_through_id or 0
+        self.turns: Deque[Turn] = deque()
+        self.folding: List[Turn] = []
+        self.fold_scheduled = False
+        self.checked_at = time.monotonic()  # last time MySQL was asked for turns stored elsewhere
+        self.lock = threading.Lock()
+
+    @property
+    def last_id(self) -> int:
+        if self.turns:
+            return self.turns[-1][0]
+        if self.folding:
+            return self.folding[-1][0]
+        return self.summary_through_id
+
+
+class ConversationContextStore:
+    """Builds the Gemini `contents` history for a ChatSession within a token budget.
+
+    The newest turns are replayed verbatim; once they exceed the budget the
+    oldest ones are folded into a per-session summary (persisted on
+    chat_sessions) in the background. Live sessions are kept in an LRU and
+    kept current by this process's own turns (record_turn); MySQL is only
+    asked again on a miss or once a copy is CONTEXT_REFRESH_TTL old, for
+    turns other workers stored and for deletion.
+    """
+
+    def __init__(self, budget: int = CONTEXT_TOKEN_BUDGET, max_sessions: int = CONTEXT_MAX_SESSIONS,
+                 refresh_ttl: float = CONTEXT_REFRESH_TTL):
+        self.budget = budget
+        self.max_sessions = max_sessions
+        self.refresh_ttl = refresh_ttl
+        self._sessions: "OrderedDict[int, _SessionContext]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._summarizer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-summary")
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self.folds = 0
+        self.summary_failures = 0
+
+    def history(self, session_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Prior turns of a session as Gemini contents, or None if it does not exist or was deleted."""
+        ctx = self._get(session_id)
+        if ctx is None:
+            return None
+        with ctx.lock:
+            contents: List[Dict[str, Any]] = []
+            if ctx.summary:
+                contents.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{ctx.summary}"]})
+                contents.append({"role": "model", "parts": ["Understood, I will keep that context in mind."]})
+            # Turns still being folded are replayed until their summary lands
+            for _, user_message, bot_response, _ in list(ctx.folding) + list(ctx.turns):
+                contents.append({"role": "user", "parts": [user_message]})
+                contents.append({"role": "model", "parts": [bot_response]})
+            return contents
+
+    def record_turn(self, session_id: int, message_id: int, user_message: str, bot_response: str,
+                    new_session: bool = False) -> None:
+        """Add a stored turn to a live session (or start one for a session created just now)."""
+        with self._lock:
+            ctx = self._sessions.get(session_id)
+            if ctx is None:
+                if not new_session:
+                    return  # loaded from MySQL on its next use
+                ctx = self._insert(_SessionContext(session_id, None, None))
+        with ctx.lock:
+            if message_id > ctx.last_id:
+                ctx.turns.append(_turn(message_id, user_message, bot_response))
+            self._enforce_budget(ctx)
+
+    def forget(self, session_id: int) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _insert(self, ctx: _SessionContext) -> _SessionContext:
+        self._sessions[ctx.session_id] = ctx
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        return ctx
+
+    def _get(self, session_id: int) -> Optional[_SessionContext]:
+        with self._lock:
+            ctx = self._sessions.get(session_id)
+            if ctx is not None:
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+        if ctx is not None:
+            if time.monotonic() - ctx.checked_at < self.refresh_ttl:
+                return ctx
+            if self._refresh(ctx):
+                return ctx
+            self.forget(session_id)  # deleted since it was cached
+            return None
+
+        self.misses += 1
+        ctx = self._load(session_id)
+        if ctx is None:
+            return None
+        with self._lock:
+            # Another request may have loaded it meanwhile; keep the first copy
+            ctx = self._sessions.get(session_id) or self._insert(ctx)
+        return ctx
+
+    def _load(self, session_id: int) -> Optional[_SessionContext]:
+        chat_writer.wait_for(session_id=session_id)
+        ctx = self._read(session_id)
+        if ctx is None and restore_session(session_id):
+            # The user came back to an archived conversation; it is in the hot tables again
+            ctx = self._read(session_id)
+        return ctx
+
+    def _read(self, session_id: int) -> Optional[_SessionContext]:
+        with next(get_db_session()) as db:
+            session = db.query(ChatSession.summary, ChatSession.summary_through_id).filter(
+                ChatSession.id == session_id,
+                ChatSession.deleted_at.is_(None)
+            ).first()
+            if session is None:
+                return None
+            ctx = _SessionContext(session_id, session.summary, session.summary_through_id)
+            rows = db.query(ChatHistory.id, ChatHistory.user_message, ChatHistory.bot_response).filter(
+                ChatHistory.session_id == session_id,
+                ChatHistory.id > ctx.summary_through_id
+            ).order_by(ChatHistory.id.desc()).limit(CONTEXT_MAX_LOADED_TURNS).all()
+        with ctx.lock:
+            ctx.turns.extend(_turn(*row) for row in reversed(rows))
+            self._enforce_budget(ctx)
+        return ctx
+
+    def _refresh(self, ctx: _SessionContext) -> bool:
+        """Pick up turns another worker process stored since the last check; False if the session is gone."""
+        self.refreshes += 1
+        checked_at = time.monotonic()
+        with next(get_db_session()) as db:
+            live = db.query(ChatSession.id).filter(
+                ChatSession.id == ctx.session_id,
+                ChatSession.deleted_at.is_(None)
+            ).first()
+            if live is None:
+                return False
+            rows = db.query(ChatHistory.id, ChatHistory.user_message, ChatHistory.bot_response).filter(
+                ChatHistory.session_id == ctx.session_id,
+                ChatHistory.id > ctx.last_id
+            ).order_by(ChatHistory.id).limit(CONTEXT_MAX_LOADED_TURNS).all()
+        with ctx.lock:
+            ctx.turns.extend(_turn(*row) for row in rows if row[0] > ctx.last_id)
+            ctx.checked_at = checked_at
+            self._enforce_budget(ctx)
+        return True
+
+    def _enforce_budget(self, ctx: _SessionContext) -> None:
+        # Caller holds ctx.lock. The latest turn always stays verbatim.
+        used = estimate_tokens(ctx.summary) + sum(turn[3] for turn in ctx.turns)
+        while used > self.budget and len(ctx.turns) > 1:
+            turn = ctx.turns.popleft()
+            ctx.folding.append(turn)
+            used -= turn[3]
+        if ctx.folding and not ctx.fold_scheduled:
+            ctx.fold_scheduled = True
+            self._summarizer.submit(self._fold, ctx)
+
+    def _fold(self, ctx: _SessionContext) -> None:
+        with ctx.lock:
+            batch = list(ctx.folding)
+            previous = ctx.summary
+        try:
+            summary = self._summarize(previous, batch)
+        except Exception as e:
+            self.summary_failures += 1
+            logger.warning(f"Summarizing session {ctx.session_id} failed, using extractive summary: {e}")
+            summary = _extractive_summary(previous, batch)
+
+        through_id = batch[-1][0]
+        with ctx.lock:
+            ctx.summary = summary
+            ctx.summary_through_id = through_id
+            del ctx.folding[:len(batch)]
+            ctx.fold_scheduled = False
+            self.folds += 1
+            if ctx.folding:
+                ctx.fold_scheduled = True
+                self._summarizer.submit(self._fold, ctx)
+
+        try:
+            with next(get_db_session()) as db:
+                # The next fold may already be running on the other summarizer thread and
+                # commit first; never let this older summary overwrite a newer one
+                db.query(ChatSession).filter(
+                    ChatSession.id == ctx.session_id,
+                    or_(ChatSession.summary_through_id.is_(None), ChatSession.summary_through_id < through_id)
+                ).update({
+                    ChatSession.summary: summary,
+                    ChatSession.summary_through_id: through_id,
+                    ChatSession.updated_at: ChatSession.updated_at,
+                }, synchronize_session=False)
+                db.commit()
+        except Exception as e:
+            logger.error(f"Could not persist summary for session {ctx.session_id}: {e}")
+
+    def _summarize(self, previous: str, turns: List[Turn]) -> str:
+        if CONTEXT_SUMMARY_MODE != "llm":
+            return _extractive_summary(previous, turns)
+        exchanges = "\n\n".join(f"User: {user}\nAssistant: {bot}" for _, user, bot, _ in turns)
+        prompt = f"Current summary:\n{previous or '(none)'}\n\nNext exchanges:\n{exchanges}"
+        model = model_registry.get(system_instruction=SUMMARY_PROMPT)
+        response = llm_resilience.call(model.generate_content, prompt)
+        model_registry.record_usage(response)
+        return response.text.strip()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "live_sessions": len(self._sessions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "folds": self.folds,
+            "summary_failures": self.summary_failures,
+            "token_budget": self.budget,
+        }
+
+
+def _extractive_summary(previous: str, turns: List[Turn]) -> str:
+    """No-LLM fallback: the earlier summary plus the questions asked, trimmed to the summary budget."""
+    lines = [previous] if previous else []
+    lines.extend(f"- User asked: {user[:200]}" for _, user, _, _ in turns)
+    summary = "\n".join(lines)
+    max_chars = CONTEXT_SUMMARY_MAX_TOKENS * 4
+    return summary[-max_chars:] if len(summary) > max_chars else summary
+
+
+conversation_context = ConversationContextStore()
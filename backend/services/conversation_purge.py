@@ -0,0 +1,152 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import text
+
+from backend.database import get_engine
+from backend.services.metrics import watch_queue
+
+logger = logging.getLogger(__name__)
+
+# Purge configuration
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))  # messages deleted per transaction
+PURGE_BATCH_PAUSE = float(os.getenv("PURGE_BATCH_PAUSE", "0.05"))  # seconds between batches, so other writers get the locks
+PURGE_SWEEP_INTERVAL = float(os.getenv("PURGE_SWEEP_INTERVAL", "300"))
+
+
+class ConversationPurger:
+    """Removes the rows of soft-deleted chat sessions in the background.
+
+    Deleting a conversation only sets chat_sessions.deleted_at, which hides
+    it at once. This thread then deletes its messages in batches of
+    PURGE_BATCH_SIZE, one short transaction each (feedback goes with them
+    through ON DELETE CASCADE), and finally the session row itself. No
+    request waits for a long delete or holds its locks. Sessions left over
+    by a restart or another worker are found by a periodic sweep of
+    deleted_at, so a purge interrupted midway is simply resumed.
+    """
+
+    def __init__(self, batch_size: int = PURGE_BATCH_SIZE, pause: float = PURGE_BATCH_PAUSE,
+                 sweep_interval: float = PURGE_SWEEP_INTERVAL):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.sweep_interval = sweep_interval
+        self._queue: "queue.Queue[int]" = queue.Queue()
+        self._queued: set = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.sessions_purged = 0
+        self.messages_purged = 0
+        self.batches = 0
+        self.failed = 0
+        self.last_batch_ms = 0.0
+
+    def submit(self, session_ids: Iterable[int]) -> None:
+        """Queue soft-deleted sessions for purging."""
+        self.start()
+        with self._lock:
+            for session_id in session_ids:
+                if session_id not in self._queued:
+                    self._queued.add(session_id)
+                    self._queue.put(session_id)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="conversation-purge", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop after the current batch; whatever is left is picked up by the next sweep."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def sweep(self, limit: int = 1000) -> int:
+        """Queue sessions marked deleted but not yet purged; returns how many were found."""
+        with get_engine().connect() as conn:
+            ids = conn.execute(
+                text("SELECT id FROM chat_sessions WHERE deleted_at IS NOT NULL ORDER BY deleted_at LIMIT :limit"),
+                {"limit": limit}
+            ).scalars().all()
+        self.submit(ids)
+        return len(ids)
+
+    def purge_session(self, session_id: int) -> int:
+        """Delete one soft-deleted session batch by batch; returns the number of messages removed."""
+        removed = 0
+        while True:
+            if self._stop.is_set():
+                return removed  # resumed by a later sweep
+            start = time.perf_counter()
+            with get_engine().begin() as conn:
+                deleted = conn.execute(
+                    text("DELETE FROM chat_history WHERE session_id = :id ORDER BY id LIMIT :limit"),
+                    {"id": session_id, "limit": self.batch_size}
+                ).rowcount
+            self.last_batch_ms = (time.perf_counter() - start) * 1000
+            self.batches += 1
+            removed += deleted
+            self.messages_purged += deleted
+            if deleted < self.batch_size:
+                break
+            time.sleep(self.pause)
+        with get_engine().begin() as conn:
+            # Only if still marked deleted; cascades to anything written since the last batch
+            gone = conn.execute(
+                text("DELETE FROM chat_sessions WHERE id = :id AND deleted_at IS NOT NULL"), {"id": session_id}
+            ).rowcount
+        self.sessions_purged += gone
+        return removed
+
+    def _run(self) -> None:
+        next_sweep = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() >= next_sweep:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.warning(f"Purge sweep failed: {e}")
+                # Jittered so several workers do not sweep in lockstep
+                next_sweep = time.monotonic() + self.sweep_interval * random.uniform(0.8, 1.2)
+            try:
+                session_id = self._queue.get(timeout=max(0.1, min(1.0, next_sweep - time.monotonic())))
+            except queue.Empty:
+                continue
+            try:
+                removed = self.purge_session(session_id)
+                logger.info(f"Purged session {session_id} ({removed} messages)")
+            except Exception as e:
+                # Still marked deleted, so the next sweep retries it
+                self.failed += 1
+                logger.error(f"Purging session {session_id} failed: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "sessions_purged": self.sessions_purged,
+            "messages_purged": self.messages_purged,
+            "batches": self.batches,
+            "failed": self.failed,
+            "batch_size": self.batch_size,
+            "last_batch_ms": round(self.last_batch_ms, 2),
+        }
+
+
+conversation_purger = ConversationPurger()
+atexit.register(conversation_purger.stop)
+watch_queue("conversation_purge", conversation_purger._queue.qsize)
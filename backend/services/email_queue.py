@@ -0,0 +1,368 @@
+import atexit
+import heapq
+import itertools
+import logging
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from backend.DATABASE.database import get_db_cursor
+from backend.services.metrics import SMTP_SEND_DURATION, watch_queue
+from backend.services.tracing import span
+from backend.services.email_service import (
+    SMTP_HOST, SMTP_PASS, SMTP_PORT, SMTP_STARTTLS, SMTP_USER, build_message
+)
+
+logger = logging.getLogger(__name__)
+
+# Pipeline configuration
+SMTP_FROM = os.getenv("SMTP_FROM") or SMTP_USER or "noreply@localhost"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "30"))  # most servers drop idle sessions after ~60s
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "10000"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_DELAY = float(os.getenv("EMAIL_RETRY_BASE_DELAY", "2"))
+EMAIL_RETRY_MAX_DELAY = float(os.getenv("EMAIL_RETRY_MAX_DELAY", "300"))
+
+THROUGHPUT_WINDOW = 60.0
+
+
+class EmailQueueFull(Exception):
+    """The outbound queue is at capacity."""
+
+
+class OutgoingEmail:
+    __slots__ = ("to_email", "subject", "body_html", "body_text", "conversation_id", "attempts", "enqueued_at")
+
+    def __init__(self, to_email: str, subject: str, body_html: str,
+                 body_text: Optional[str] = None, conversation_id: Optional[int] = None):
+        self.to_email = to_email
+        self.subject = subject
+        self.body_html = body_html
+        self.body_text = body_text
+        self.conversation_id = conversation_id
+        self.attempts = 0
+        self.enqueued_at = time.time()
+
+
+def is_transient(error: Exception) -> bool:
+    """4xx replies and dropped connections are worth retrying; 5xx replies are final."""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, OSError)
+
+
+class SMTPConnection:
+    """A long-lived SMTP session owned by one worker; TLS and login happen once per connection."""
+
+    def __init__(self, host: str, port: int, user: Optional[str], password: Optional[str], starttls: bool):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.opened = 0
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._sent = 0
+        self._last_used = 0.0
+
+    def _open(self) -> None:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            # Credentials are optional so a local relay or test sink works
+            if self.user and self.password:
+                smtp.login(self.user, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self._sent = 0
+        self.opened += 1
+        logger.info(f"Opened SMTP connection to {self.host}:{self.port}")
+
+    def _usable(self) -> bool:
+        if self._smtp is None:
+            return False
+        if self._sent >= SMTP_MAX_MESSAGES_PER_CONNECTION or time.time() - self._last_used > SMTP_IDLE_TIMEOUT:
+            return False
+        return True
+
+    def send(self, sender: str, to_email: str, message: str) -> None:
+        start = time.perf_counter()
+        try:
+            self._send(sender, to_email, message)
+        except Exception:
+            SMTP_SEND_DURATION.labels("error").observe(time.perf_counter() - start)
+            raise
+        SMTP_SEND_DURATION.labels("ok").observe(time.perf_counter() - start)
+
+    def _send(self, sender: str, to_email: str, message: str) -> None:
+        if not self._usable():
+            self.close()
+            self._open()
+            reused = False
+        else:
+            reused = True
+        try:
+            self._smtp.sendmail(sender, to_email, message)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            if not reused:
+                raise
+            # The server dropped a pooled session; retry once on a fresh one
+            self._open()
+            self._smtp.sendmail(sender, to_email, message)
+        self._sent += 1
+        self._last_used = time.time()
+
+    def close_if_idle(self) -> None:
+        if self._smtp is not None and time.time() - self._last_used > SMTP_IDLE_TIMEOUT:
+            self.close()
+
+    def close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+
+class EmailQueue:
+    """Background email delivery: enqueue returns at once, worker threads send in batches.
+
+    Each worker keeps its own authenticated SMTP connection open across
+    batches. Transient failures are retried with jittered exponential backoff;
+    the final state of messages tied to a conversation is written to
+    chat_conversations.email_status.
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, user: Optional[str] = SMTP_USER,
+                 password: Optional[str] = SMTP_PASS, starttls: bool = SMTP_STARTTLS, sender: str = SMTP_FROM,
+                 workers: int = EMAIL_WORKERS, batch_size: int = EMAIL_BATCH_SIZE,
+                 max_attempts: int = EMAIL_MAX_ATTEMPTS, maxsize: int = EMAIL_QUEUE_SIZE):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.sender = sender
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._queue: "queue.Queue[OutgoingEmail]" = queue.Queue(maxsize)
+        self._retries: List[tuple] = []
+        self._retry_seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._connections: List[SMTPConnection] = []
+        self._sent_times: deque = deque()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"email-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, to_email: str, subject: str, body_html: str,
+                body_text: Optional[str] = None, conversation_id: Optional[int] = None) -> OutgoingEmail:
+        """Queue a message for delivery without waiting for the mail server."""
+        if not self._threads:
+            self.start()
+        email = OutgoingEmail(to_email, subject, body_html, body_text, conversation_id)
+        try:
+            # Delivery happens on the worker threads, outside the request's trace
+            with span("email.enqueue"):
+                self._queue.put_nowait(email)
+        except queue.Full:
+            logger.error(f"Email queue full, rejecting message to {to_email}")
+            raise EmailQueueFull("Email queue is full")
+        return email
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Let the workers drain what is queued, then close their connections.
+
+        Messages still waiting for a retry are given up on and recorded as
+        failed, so their conversations do not stay 'pending'.
+        """
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        self._threads = []
+        with self._lock:
+            abandoned = [entry[2] for entry in self._retries]
+            self._retries = []
+            self.failed += len(abandoned)
+        if abandoned:
+            logger.warning(f"Email queue stopped with {len(abandoned)} messages awaiting retry; marking them failed")
+            self._record_statuses({
+                email.conversation_id: "failed" for email in abandoned if email.conversation_id is not None
+            })
+
+    def _due_retries(self) -> List[OutgoingEmail]:
+        now = time.time()
+        due = []
+        with self._lock:
+            while self._retries and self._retries[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._retries)[2])
+        return due
+
+    def _poll_interval(self) -> float:
+        with self._lock:
+            if not self._retries:
+                return 1.0
+            return min(max(self._retries[0][0] - time.time(), 0.01), 1.0)
+
+    def _next_batch(self) -> List[OutgoingEmail]:
+        batch = self._due_retries()
+        if not batch:
+            try:
+                batch.append(self._queue.get(timeout=self._poll_interval()))
+            except queue.Empty:
+                return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self) -> None:
+        connection = SMTPConnection(self.host, self.port, self.user, self.password, self.starttls)
+        with self._lock:
+            self._connections.append(connection)
+        try:
+            while not (self._stop.is_set() and self._queue.empty()):
+                batch = self._next_batch()
+                if not batch:
+                    connection.close_if_idle()
+                    continue
+                self._record_statuses(self._send_batch(connection, batch))
+        finally:
+            connection.close()
+
+    def _send_batch(self, connection: SMTPConnection, batch: List[OutgoingEmail]) -> Dict[int, str]:
+        statuses: Dict[int, str] = {}
+        for email in batch:
+            email.attempts += 1
+            try:
+                message = build_message(self.sender, email.to_email, email.subject, email.body_html, email.body_text)
+                connection.send(self.sender, email.to_email, message.as_string())
+            except Exception as e:
+                if is_transient(e) and email.attempts < self.max_attempts:
+                    self._schedule_retry(email, e)
+                    continue
+                logger.error(f"Giving up on email to {email.to_email} after {email.attempts} attempts: {e}")
+                with self._lock:
+                    self.failed += 1
+                if email.conversation_id is not None:
+                    statuses[email.conversation_id] = "failed"
+                continue
+
+            lag = time.time() - email.enqueued_at
+            with self._lock:
+                self.sent += 1
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+                self._sent_times.append(time.time())
+            if email.conversation_id is not None:
+                statuses[email.conversation_id] = "sent"
+
+        with self._lock:
+            self.batches += 1
+        return statuses
+
+    def _schedule_retry(self, email: OutgoingEmail, error: Exception) -> None:
+        delay = random.uniform(0, min(EMAIL_RETRY_MAX_DELAY, EMAIL_RETRY_BASE_DELAY * (2 ** email.attempts)))
+        logger.warning(f"Email to {email.to_email} failed ({error}), retrying in {delay:.1f}s")
+        with self._lock:
+            self.retried += 1
+            heapq.heappush(self._retries, (time.time() + delay, next(self._retry_seq), email))
+
+    def _record_statuses(self, statuses: Dict[int, str]) -> None:
+        """One UPDATE per final state for the whole batch."""
+        if not statuses:
+            return
+        by_status: Dict[str, List[int]] = {}
+        for conversation_id, status in statuses.items():
+            by_status.setdefault(status, []).append(conversation_id)
+        try:
+            with get_db_cursor() as (cursor, conn):
+                for status, ids in by_status.items():
+                    placeholders = ", ".join(["%s"] * len(ids))
+                    # Keep last_active: the column is ON UPDATE CURRENT_TIMESTAMP
+                    cursor.execute(
+                        f"UPDATE chat_conversations SET email_status = %s, last_active = last_active "
+                        f"WHERE id IN ({placeholders})",
+                        (status, *ids)
+                    )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to record email status for conversations {list(statuses)}: {e}")
+
+    def _oldest_queued_age(self) -> float:
+        with self._queue.mutex:
+            head = self._queue.queue[0] if self._queue.queue else None
+        return time.time() - head.enqueued_at if head else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            while self._sent_times and self._sent_times[0] < now - THROUGHPUT_WINDOW:
+                self._sent_times.popleft()
+            return {
+                "workers": len(self._threads),
+                "queue_depth": self._queue.qsize(),
+                "awaiting_retry": len(self._retries),
+                "sent": self.sent,
+                "failed": self.failed,
+                "retried": self.retried,
+                "batches": self.batches,
+                "connections_opened": sum(c.opened for c in self._connections),
+                "sent_per_second": round(len(self._sent_times) / THROUGHPUT_WINDOW, 3),
+                "queue_lag_ms": {
+                    "oldest_queued": round(self._oldest_queued_age() * 1000, 1),
+                    "last_sent": round(self.last_lag * 1000, 1),
+                    "max_sent": round(self.max_lag * 1000, 1),
+                },
+            }
+
+
+email_queue = EmailQueue()
+watch_queue("email", email_queue._queue.qsize)
+atexit.register(email_queue.stop)
+
+
+def queue_email(to_email: str, subject: str, body_html: str,
+                body_text: Optional[str] = None, conversation_id: Optional[int] = None) -> OutgoingEmail:
+    """Queue an email for background delivery; see EmailQueue."""
+    return email_queue.enqueue(to_email, subject, body_html, body_text, conversation_id)
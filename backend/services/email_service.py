@@ -1,10 +1,13 @@
 import smtplib
+import time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import os
 from dotenv import load_dotenv
 import logging
 from fastapi import HTTPException
+from backend.services.metrics import SMTP_SEND_DURATION
+from backend.services.tracing import span
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,28 +19,40 @@ SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
 SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
 SMTP_USER = os.getenv('SMTP_USER')
 SMTP_PASS = os.getenv('SMTP_PASS')
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
 
 # Log configuration
 logger.info(f"SMTP Configuration - Host: {SMTP_HOST}, Port: {SMTP_PORT}, User: {SMTP_USER}")
 
-def send_email(to_email, subject, body_html, body_text=None):
-    if not SMTP_USER or not SMTP_PASS:
-        error_msg = "SMTP credentials not configured"
-        logger.error(error_msg)
-        raise HTTPException(status_code=500, detail=error_msg)
-
+def build_message(sender, to_email, subject, body_html, body_text=None):
     msg = MIMEMultipart('alternative')
-    msg['From'] = SMTP_USER
+    msg['From'] = sender
     msg['To'] = to_email
     msg['Subject'] = subject
 
     if body_text:
         msg.attach(MIMEText(body_text, 'plain'))
     msg.attach(MIMEText(body_html, 'html'))
+    return msg
+
+def send_email(to_email, subject, body_html, body_text=None):
+    """Send one email synchronously over a fresh connection.
+
+    Request handlers should use backend.services.email_queue.queue_email instead,
+    which returns immediately and delivers over pooled connections.
+    """
+    if not SMTP_USER or not SMTP_PASS:
+        error_msg = "SMTP credentials not configured"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+    msg = build_message(SMTP_USER, to_email, subject, body_html, body_text)
 
+    start = time.perf_counter()
+    outcome = "error"
     try:
         logger.info(f"Attempting to connect to SMTP server: {SMTP_HOST}:{SMTP_PORT}")
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
+        with span("smtp.send", host=SMTP_HOST), smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
             logger.info("Starting TLS connection")
             server.starttls()
             
@@ -47,6 +62,7 @@ def send_email(to_email, subject, body_html, body_text=None):
             logger.info(f"Sending email to: {to_email}")
             server.sendmail(SMTP_USER, to_email, msg.as_string())
             logger.info("Email sent successfully")
+        outcome = "ok"
         return True
     except smtplib.SMTPAuthenticationError as e:
         error_msg = f"SMTP Authentication Error: {str(e)}"
@@ -60,3 +76,5 @@ def send_email(to_email, subject, body_html, body_text=None):
         error_msg = f"Unexpected error sending email: {str(e)}"
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
+    finally:
+        SMTP_SEND_DURATION.labels(outcome).observe(time.perf_counter() - start)
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Stand-in LLM (see backend/loadtest/fake_gemini.py), selected with LLM_BACKEND=fake
+FAKE_LLM_URL = os.getenv("FAKE_LLM_URL", "http://127.0.0.1:8090")
+FAKE_LLM_TIMEOUT = float(os.getenv("FAKE_LLM_TIMEOUT", "60"))
+
+
+class FakeLLMUnavailable(ConnectionError):
+    """The fake server answered 429/5xx; retryable like a Gemini ServiceUnavailable."""
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _contents_text(contents: Union[str, List[Dict[str, Any]]]) -> str:
+    if isinstance(contents, str):
+        return contents
+    return "\n".join(str(part) for content in contents for part in content.get("parts", []))
+
+
+def _usage(usage: Dict[str, int]) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_token_count=usage.get("prompt_tokens", 0),
+        candidates_token_count=usage.get("output_tokens", 0),
+        cached_content_token_count=0,
+    )
+
+
+def _raise_for_status(status: int, body: str) -> None:
+    if status == 429 or status >= 500:
+        raise FakeLLMUnavailable(f"fake LLM returned {status}: {body[:200]}")
+    if status >= 400:
+        raise ValueError(f"fake LLM rejected the request ({status}): {body[:200]}")
+
+
+class _Response:
+    def __init__(self, text: str, usage: Dict[str, int]):
+        self.text = text
+        self.usage_metadata = _usage(usage)
+
+
+class _StreamResponse:
+    """Iterates NDJSON chunks; usage_metadata is filled in by the final line."""
+
+    def __init__(self, http_response):
+        self._http = http_response
+        self._iterator = self  # where openai_service._cancel_stream looks for cancel()
+        self.usage_metadata = None
+
+    def __iter__(self):
+        try:
+            for line in self._http:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if "usage" in event:
+                    self.usage_metadata = _usage(event["usage"])
+                elif "error" in event:
+                    raise FakeLLMUnavailable(event["error"])
+                else:
+                    yield SimpleNamespace(text=event["text"])
+        finally:
+            self._http.close()
+
+    def cancel(self) -> None:
+        self._http.close()
+
+
+class _AsyncStreamResponse:
+    def __init__(self, http_response):
+        self._http = http_response
+        self._iterator = self
+        self.usage_metadata = None
+
+    async def __aiter__(self):
+        try:
+            async for line in self._http.content:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if "usage" in event:
+                    self.usage_metadata = _usage(event["usage"])
+                elif "error" in event:
+                    raise FakeLLMUnavailable(event["error"])
+                else:
+                    yield SimpleNamespace(text=event["text"])
+        finally:
+            self._http.release()
+
+    def cancel(self) -> None:
+        self._http.close()
+
+
+class FakeGenerativeModel:
+    """Implements the parts of genai.GenerativeModel the services use, over HTTP to the fake server.
+
+    Sync calls use urllib (one connection per call, like a cold client);
+    async calls share one aiohttp session per event loop.
+    """
+
+    def __init__(self, model_name: str, system_instruction: Optional[str] = None,
+                 generation_config: Optional[Dict[str, Any]] = None, base_url: str = FAKE_LLM_URL):
+        self.model_name = model_name
+        self.system_instruction = system_instruction or ""
+        self.generation_config = generation_config or {}
+        self.base_url = base_url.rstrip("/")
+        self._sessions: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def _payload(self, contents, stream: bool) -> bytes:
+        return json.dumps({
+            "model": self.model_name,
+            "system_instruction": self.system_instruction,
+            "contents": contents,
+            "stream": stream,
+        }).encode()
+
+    def generate_content(self, contents, stream: bool = False):
+        request = urllib.request.Request(
+            f"{self.base_url}/generate", data=self._payload(contents, stream),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        try:
+            http_response = urllib.request.urlopen(request, timeout=FAKE_LLM_TIMEOUT)
+        except urllib.error.HTTPError as e:
+            _raise_for_status(e.code, e.read().decode(errors="replace"))
+            raise
+        if stream:
+            return _StreamResponse(http_response)
+        with http_response:
+            body = json.loads(http_response.read())
+        return _Response(body["text"], body["usage"])
+
+    def _session(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.get(id(loop))
+            if session is None or session.closed:
+                session = self._sessions[id(loop)] = aiohttp.ClientSession(
+                    timeout=aiohttp.ClientTimeout(total=None, sock_read=FAKE_LLM_TIMEOUT)
+                )
+            return session
+
+    async def generate_content_async(self, contents, stream: bool = False):
+        http_response = await self._session().post(
+            f"{self.base_url}/generate", data=self._payload(contents, stream),
+            headers={"Content-Type": "application/json"},
+        )
+        if http_response.status >= 400:
+            body = await http_response.text()
+            http_response.release()
+            _raise_for_status(http_response.status, body)
+        if stream:
+            return _AsyncStreamResponse(http_response)
+        try:
+            body = await http_response.json()
+        finally:
+            http_response.release()
+        return _Response(body["text"], body["usage"])
+
+    def count_tokens(self, contents) -> SimpleNamespace:
+        return SimpleNamespace(total_tokens=_estimate_tokens(_contents_text(contents)))
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from backend.services.metrics import watch_queue
+
+logger = logging.getLogger(__name__)
+
+# Concurrency configuration
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "200"))
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "15"))
+
+
+class SlotTimeout(asyncio.TimeoutError):
+    """No slot freed up before the deadline: this process is saturated, which says nothing about Gemini."""
+
+
+class LLMConcurrencyLimiter:
+    """Bounds the number of in-flight LLM calls and enforces a per-call deadline.
+
+    The deadline covers both the wait for a slot and the call itself; when it
+    expires the outstanding coroutine is cancelled, which cancels the request.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, default_timeout: float = LLM_CALL_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop, not the importer's.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def has_free_slot(self) -> bool:
+        """True if slot() would not wait; used to skip optional calls (hedges) under load."""
+        return not self._get_semaphore().locked()
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold one concurrency slot; raises SlotTimeout if none frees up in time.
+
+        Used directly by streaming calls, whose duration is bounded by the client.
+        """
+        semaphore = self._get_semaphore()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=timeout if timeout is not None else self.default_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logger.warning("Timed out waiting for a free LLM slot")
+            raise SlotTimeout() from None
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    async def run(self, func: Callable[..., Awaitable[Any]], *args, timeout: Optional[float] = None) -> Any:
+        """Await func(*args) once a slot is free; raises asyncio.TimeoutError past the deadline.
+
+        SlotTimeout (a subclass) means the call was never sent.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout if timeout is not None else self.default_timeout)
+
+        async with self.slot(timeout=deadline - loop.time()):
+            if deadline - loop.time() <= 0:
+                self.timed_out += 1
+                raise SlotTimeout()  # the whole deadline went on waiting for the slot
+            try:
+                result = await asyncio.wait_for(func(*args), timeout=max(deadline - loop.time(), 0))
+                self.completed += 1
+                return result
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise
+            except Exception:
+                self.failed += 1
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and call counters for monitoring."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+        }
+
+
+llm_limiter = LLMConcurrencyLimiter()
+watch_queue("llm", lambda: llm_limiter.waiting, lambda: llm_limiter.in_flight)
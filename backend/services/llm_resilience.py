@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from backend.services.llm_concurrency import SlotTimeout, llm_limiter
+
+logger = logging.getLogger(__name__)
+
+# Resilience configuration
+LLM_TIMEOUT_MIN = float(os.getenv("LLM_TIMEOUT_MIN", "3"))
+LLM_TIMEOUT_MAX = float(os.getenv("LLM_TIMEOUT_MAX", "15"))
+LLM_TIMEOUT_PERCENTILE = float(os.getenv("LLM_TIMEOUT_PERCENTILE", "99"))
+LLM_TIMEOUT_MULTIPLIER = float(os.getenv("LLM_TIMEOUT_MULTIPLIER", "1.5"))
+LLM_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", "30"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.2"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "2"))
+LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.1"))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_TIMEOUT = float(os.getenv("LLM_BREAKER_RESET_TIMEOUT", "30"))
+
+DEGRADED_RESPONSE = (
+    "- Our tax assistant is temporarily unavailable because the AI service is experiencing problems.\n\n"
+    "- Please try again in a minute.\n\n"
+    "- For urgent GST or income tax matters, please contact a certified tax professional."
+)
+
+@lru_cache(maxsize=1)
+def retryable_errors() -> Tuple[type, ...]:
+    """Errors worth another attempt; anything else (bad request, auth) fails immediately."""
+    # Imported on first failure: google.api_core drags in grpc, which dominates import time
+    from google.api_core import exceptions as google_exceptions
+    return (
+        asyncio.TimeoutError,
+        TimeoutError,
+        ConnectionError,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.InternalServerError,
+    )
+
+
+class LLMUnavailableError(Exception):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Gemini API is temporarily unavailable")
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies used to derive the adaptive timeout."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def count(self) -> int:
+        return len(self._samples)
+
+
+class RetryBudget:
+    """Caps retries to a fraction of overall traffic so retries cannot amplify an outage.
+
+    Every first attempt deposits `ratio` tokens and every retry withdraws one.
+    """
+
+    def __init__(self, ratio: float = LLM_RETRY_BUDGET_RATIO, min_tokens: float = 10):
+        self.ratio = ratio
+        self.max_tokens = max(min_tokens, ratio * 1000)
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures; half-open lets one probe through after the reset timeout."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._probe = 0  # number of the latest half-open probe
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[int]:
+        """None if the call is rejected; otherwise 0, or the probe number of the one call let through half-open.
+
+        The caller must pass that number to release_probe() once the call is over.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe += 1
+                return self._probe
+            self.rejected += 1
+            return None
+
+    def release_probe(self, probe: int) -> None:
+        """Let the next call probe if this probe ended without an outcome (cancelled, or never sent)."""
+        if not probe:
+            return
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probe_in_flight and self._probe == probe:
+                self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Gemini circuit breaker closed")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Gemini circuit breaker opened after {self.consecutive_failures} failures")
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class ResilientLLMCaller:
+    """Adaptive timeouts, jittered exponential backoff under a retry budget, and a circuit breaker."""
+
+    def __init__(self):
+        self.latency = LatencyTracker()
+        self.retry_budget = RetryBudget()
+        self.breaker = CircuitBreaker()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def adaptive_timeout(self) -> float:
+        """Per-attempt timeout derived from the observed latency percentile."""
+        if self.latency.count() < 20:
+            return LLM_TIMEOUT_MAX
+        observed = self.latency.percentile(LLM_TIMEOUT_PERCENTILE) * LLM_TIMEOUT_MULTIPLIER
+        return min(LLM_TIMEOUT_MAX, max(LLM_TIMEOUT_MIN, observed))
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter" keeps synchronized clients from retrying in lockstep.
+        return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)))
+
+    def _should_retry(self, error: Exception, attempt: int, remaining: float) -> bool:
+        if not isinstance(error, retryable_errors()):
+            return False
+        if attempt + 1 >= LLM_MAX_ATTEMPTS or remaining <= 0:
+            return False
+        if self.breaker.state != CircuitBreaker.CLOSED:
+            return False
+        return self.retry_budget.try_spend()
+
+    def record_error(self, error: Exception) -> None:
+        """Feed a failed call into the breaker."""
+        # Only upstream-health errors trip the breaker; a rejected request proves Gemini is up.
+        # A call that never got a slot says nothing either way.
+        if isinstance(error, SlotTimeout):
+            return
+        if isinstance(error, retryable_errors()):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def check_breaker(self) -> int:
+        """Raise LLMUnavailableError if the breaker rejects this call; returns the probe number for release_probe."""
+        probe = self.breaker.acquire()
+        if probe is None:
+            raise LLMUnavailableError(self.breaker.retry_after())
+        return probe
+
+    async def call_async(self, func: Callable[..., Awaitable[Any]], *args, deadline: float = LLM_REQUEST_DEADLINE) -> Any:
+        """Await func(*args) through the concurrency limiter with retries and breaker checks."""
+        probe = self.check_breaker()
+        self.calls += 1
+        self.retry_budget.record_request()
+        request_deadline = time.monotonic() + deadline
+        attempt = 0
+        try:
+            while True:
+                remaining = request_deadline - time.monotonic()
+                if remaining <= 0:
+                    # Spent in backoff or queueing here, not waiting on Gemini
+                    self.failures += 1
+                    raise SlotTimeout()
+                start = time.monotonic()
+                try:
+                    result = await llm_limiter.run(func, *args, timeout=min(self.adaptive_timeout(), remaining))
+                except Exception as e:
+                    self.record_error(e)
+                    remaining = request_deadline - time.monotonic()
+                    if not self._should_retry(e, attempt, remaining):
+                        self.failures += 1
+                        raise
+                    delay = min(self._backoff(attempt), max(remaining, 0))
+                    logger.warning(f"Gemini call failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                    self.retries += 1
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                self.latency.record(time.monotonic() - start)
+                self.breaker.record_success()
+                return result
+        finally:
+            # Cancelled (client gone, shared task dropped) or never sent: free half-open for the next probe
+            self.breaker.release_probe(probe)
+
+    def call(self, func: Callable[..., Any], *args) -> Any:
+        """Blocking variant for the Flask app.
+
+        The sync SDK call cannot be cancelled, so only retries, backoff and the
+        breaker apply here; the async path is the one that enforces timeouts.
+        """
+        probe = self.check_breaker()
+        self.calls += 1
+        self.retry_budget.record_request()
+        request_deadline = time.monotonic() + LLM_REQUEST_DEADLINE
+        attempt = 0
+        try:
+            while True:
+                start = time.monotonic()
+                try:
+                    result = func(*args)
+                except Exception as e:
+                    self.record_error(e)
+                    remaining = request_deadline - time.monotonic()
+                    if not self._should_retry(e, attempt, remaining):
+                        self.failures += 1
+                        raise
+                    delay = min(self._backoff(attempt), max(remaining, 0))
+                    logger.warning(f"Gemini call failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                    self.retries += 1
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+                self.latency.record(time.monotonic() - start)
+                self.breaker.record_success()
+                return result
+        finally:
+            self.breaker.release_probe(probe)
+
+    def state(self) -> Dict[str, Any]:
+        """Breaker, latency and retry state for the health endpoint."""
+        return {
+            "circuit_breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "times_opened": self.breaker.times_opened,
+                "rejected": self.breaker.rejected,
+                "retry_after": round(self.breaker.retry_after(), 2) if self.breaker.state != CircuitBreaker.CLOSED else 0,
+            },
+            "latency": {
+                "samples": self.latency.count(),
+                "p50": self.latency.percentile(50),
+                "p95": self.latency.percentile(95),
+                "p99": self.latency.percentile(99),
+                "adaptive_timeout": round(self.adaptive_timeout(), 2),
+            },
+            "retries": {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "budget_tokens": round(self.retry_budget.tokens, 2),
+            },
+        }
+
+
+llm_resilience = ResilientLLMCaller()
@@ -0,0 +1,287 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0)
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class _Sharded:
+    """Values kept in one list per thread, summed only when scraped.
+
+    A thread only ever writes its own shard, so the hot path takes no lock;
+    the lock is taken once per thread to register the shard. Shards of
+    threads that have exited are folded into a base total, so short-lived
+    threads (one per request under the Flask dev server) do not pile up.
+    """
+
+    __slots__ = ("_size", "_local", "_shards", "_base", "_lock")
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, List[float]]] = []
+        self._base = [0.0] * size
+        self._lock = threading.Lock()
+
+    def shard(self) -> List[float]:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = [0.0] * self._size
+            with self._lock:
+                self._fold_dead()
+                self._shards.append((threading.current_thread(), values))
+            self._local.values = values
+            return values
+
+    def _fold_dead(self) -> None:
+        # Caller holds the lock. A finished thread can no longer write its shard.
+        live = []
+        for owner, values in self._shards:
+            if owner.is_alive():
+                live.append((owner, values))
+            else:
+                for i, value in enumerate(values):
+                    self._base[i] += value
+        self._shards = live
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            self._fold_dead()
+            totals = list(self._base)
+            shards = [values for _, values in self._shards]
+        for shard in shards:
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class _CounterChild:
+    __slots__ = ("_values",)
+
+    def __init__(self):
+        self._values = _Sharded(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._values.shard()[0] += amount
+
+    def value(self) -> float:
+        return self._values.totals()[0]
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_values")
+
+    def __init__(self, bounds: Sequence[float]):
+        self._bounds = bounds
+        # one slot per bucket, +Inf, then the running sum
+        self._values = _Sharded(len(bounds) + 2)
+
+    def observe(self, value: float) -> None:
+        shard = self._values.shard()
+        shard[bisect_left(self._bounds, value)] += 1
+        shard[-1] += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[float], float]:
+        totals = self._values.totals()
+        return totals[:-1], totals[-1]
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._child.observe(time.perf_counter() - self._start)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Child for one label combination; created once, then a dict lookup."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def expose(self) -> List[str]:
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{self._label_text(values)} {_number(child.value())}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Gauge read from existing state (pool sizes, queue lengths) at scrape time; free on the hot path."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._callbacks: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set_function(self, func: Callable[[], float], *values: str) -> None:
+        self._callbacks[values] = func
+
+    def expose(self) -> List[str]:
+        lines = self.header()
+        for values, func in list(self._callbacks.items()):
+            try:
+                value = func()
+            except Exception:
+                continue
+            if value is not None:
+                lines.append(f"{self.name}{self._label_text(values)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def expose(self) -> List[str]:
+        lines = self.header()
+        bounds = [_number(b) for b in self.buckets] + ["+Inf"]
+        for values, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0.0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = 'le="' + bound + '"'
+                lines.append(f"{self.name}_bucket{self._label_text(values, le)} {_number(cumulative)}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {_number(cumulative)}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.floor(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def expose(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, tuple(labelnames)))
+
+
+def callback_gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> CallbackGauge:
+    return registry.register(CallbackGauge(name, documentation, tuple(labelnames)))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, tuple(labelnames), buckets))
+
+
+# Hot-path metrics, shared by the modules that record them
+HTTP_REQUESTS = counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_DURATION = histogram("http_request_duration_seconds", "HTTP request latency until the body is sent",
+                          ("method", "route", "status"))
+LLM_DURATION = histogram("llm_request_duration_seconds", "Gemini call latency", ("model", "outcome"), LLM_BUCKETS)
+LLM_TTFT = histogram("llm_time_to_first_token_seconds", "Time until a streamed answer's first chunk", ("model",),
+                     LLM_BUCKETS)
+LLM_TOKENS = counter("llm_tokens_total", "Tokens reported in Gemini usage metadata", ("kind",))
+DB_POOL_WAIT = histogram("db_pool_wait_seconds", "Time spent waiting for a pooled DB connection", ("pool",),
+                         WAIT_BUCKETS)
+DB_POOL_IN_USE = callback_gauge("db_pool_in_use", "DB connections checked out of the pool", ("pool",))
+SMTP_SEND_DURATION = histogram("smtp_send_duration_seconds", "SMTP send latency per message", ("outcome",))
+QUEUE_DEPTH = callback_gauge("queue_depth", "Work waiting in an in-process queue or executor", ("queue",))
+IN_FLIGHT = callback_gauge("in_flight", "Work currently being processed", ("queue",))
+
+
+def observe_http(method: str, route: str, status: int, seconds: float) -> None:
+    labels = (method, route, str(status))
+    HTTP_REQUESTS.labels(*labels).inc()
+    HTTP_DURATION.labels(*labels).observe(seconds)
+
+
+def watch_queue(name: str, depth: Callable[[], float], in_flight: Optional[Callable[[], float]] = None) -> None:
+    """Report a component's existing counters as queue_depth / in_flight gauges."""
+    QUEUE_DEPTH.set_function(depth, name)
+    if in_flight is not None:
+        IN_FLIGHT.set_function(in_flight, name)
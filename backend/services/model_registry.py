@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+
+from backend.prompts import SYSTEM_PROMPT
+from backend.services.metrics import LLM_TOKENS
+from backend.services.response_cache import prompt_version
+
+logger = logging.getLogger(__name__)
+
+# Model configuration
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # gemini | fake (load tests, see backend/loadtest)
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash-latest")
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+# Context caching needs a pinned model version (gemini-1.5-flash-002), not an alias such as -latest
+_VERSIONED_MODEL_RE = re.compile(r"-\d{3}$")
+
+
+def _genai():
+    # The SDK pulls in grpc and protobuf (most of a cold start), so it is imported on first model use
+    import google.generativeai as genai
+    return genai
+
+
+class _Entry:
+    def __init__(self, model, expires_at: Optional[float] = None, cached: bool = False):
+        self.model = model
+        self.expires_at = expires_at
+        self.cached = cached
+
+
+class ModelRegistry:
+    """Process-wide GenerativeModel instances, one per (model, system instruction, generation config).
+
+    The system prompt travels as a system instruction rather than being
+    pasted into every user turn. With GEMINI_CONTEXT_CACHE=true it is stored
+    once upstream as cached content, per model, and billed at the
+    cached-token rate. Models without a pinned version, and caches Gemini
+    rejects (e.g. below its minimum size), use the plain system instruction. Cached tokens are the per-request saving
+    reported by stats(). All models share the SDK's default client,
+    so one transport (and TLS session) serves every request.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str, str], _Entry] = {}
+        self._lock = threading.Lock()
+        self._configured = False
+        self.created = 0
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.output_tokens = 0
+        self.system_prompt_tokens: Optional[int] = None
+
+    def _configure(self) -> None:
+        if self._configured:
+            return
+        if LLM_BACKEND == "fake":
+            logger.warning("LLM_BACKEND=fake: answers come from the fake LLM server, not Gemini")
+        else:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                logger.error("GEMINI_API_KEY is not set in environment variables.")
+                raise RuntimeError("GEMINI_API_KEY is not set in environment variables.")
+            _genai().configure(api_key=api_key)
+        self._configured = True
+
+    def get(self, model_name: str = MODEL_NAME, system_instruction: str = SYSTEM_PROMPT,
+            generation_config: Optional[Dict[str, Any]] = None):
+        key = (model_name, prompt_version(system_instruction), json.dumps(generation_config or {}, sort_keys=True))
+        entry = self._entries.get(key)
+        if entry is not None and (entry.expires_at is None or entry.expires_at > time.time()):
+            return entry.model
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry.expires_at is not None and entry.expires_at <= time.time()):
+                self._configure()
+                entry = self._entries[key] = self._create(model_name, system_instruction, generation_config)
+                self.created += 1
+            return entry.model
+
+    def _create(self, model_name: str, system_instruction: str, generation_config: Optional[Dict[str, Any]]) -> _Entry:
+        if LLM_BACKEND == "fake":
+            from backend.services.fake_llm import FakeGenerativeModel
+            return _Entry(FakeGenerativeModel(model_name, system_instruction, generation_config))
+        genai = _genai()
+        if GEMINI_CONTEXT_CACHE and not _VERSIONED_MODEL_RE.search(model_name):
+            logger.warning(f"Context caching needs a versioned model name, not {model_name}; "
+                           f"using system_instruction instead")
+        elif GEMINI_CONTEXT_CACHE:
+            try:
+                cache = genai.caching.CachedContent.create(
+                    model=model_name,
+                    system_instruction=system_instruction,
+                    ttl=timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL),
+                )
+                model = genai.GenerativeModel.from_cached_content(cached_content=cache, generation_config=generation_config)
+                logger.info(f"Using Gemini context cache {cache.name} for the {model_name} system prompt")
+                # Recreate shortly before the upstream cache expires
+                return _Entry(model, time.time() + GEMINI_CONTEXT_CACHE_TTL * 0.9, cached=True)
+            except Exception as e:
+                logger.warning(f"Context caching unavailable for {model_name}, using system_instruction instead: {e}")
+        model = genai.GenerativeModel(
+            model_name, generation_config=generation_config, system_instruction=system_instruction
+        )
+        return _Entry(model)
+
+    def record_usage(self, response) -> None:
+        """Accumulate token counts from a finished response's usage metadata."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        prompt = getattr(usage, "prompt_token_count", 0) or 0
+        cached = getattr(usage, "cached_content_token_count", 0) or 0
+        output = getattr(usage, "candidates_token_count", 0) or 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt
+            self.cached_prompt_tokens += cached
+            self.output_tokens += output
+        LLM_TOKENS.labels("input").inc(prompt)
+        LLM_TOKENS.labels("cached_input").inc(cached)
+        LLM_TOKENS.labels("output").inc(output)
+
+    def warm_up(self) -> None:
+        """Create the default model and open the transport before the first user request."""
+        try:
+            model = self.get()
+            self.system_prompt_tokens = model.count_tokens(SYSTEM_PROMPT).total_tokens
+            logger.info(f"Gemini client warmed up; system prompt is {self.system_prompt_tokens} tokens")
+        except Exception as e:
+            logger.warning(f"Gemini warm-up failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.requests
+        return {
+            "backend": LLM_BACKEND,
+            "models": len(self._entries),
+            "models_created": self.created,
+            "context_cache": any(entry.cached for entry in self._entries.values()),
+            "requests": requests,
+            "system_prompt_tokens": self.system_prompt_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "prompt_tokens_saved_per_request": round(self.cached_prompt_tokens / requests, 1) if requests else 0.0,
+        }
+
+
+model_registry = ModelRegistry()
+
+
+def get_model(**kwargs):
+    """Shared model for the default chat configuration; see ModelRegistry.get."""
+    return model_registry.get(**kwargs)
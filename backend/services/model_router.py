@@ -0,0 +1,228 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional, Set
+
+from backend.services.llm_concurrency import llm_limiter
+from backend.services.llm_resilience import LatencyTracker, RetryBudget
+from backend.services.metrics import LLM_DURATION
+from backend.services.model_registry import MODEL_NAME, model_registry
+from backend.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Hedging configuration
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", "gemini-1.5-flash-002")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_BUDGET_RATIO = float(os.getenv("LLM_HEDGE_BUDGET_RATIO", "0.05"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "4"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_THREADS = int(os.getenv("LLM_HEDGE_THREADS", "64"))  # sync path: caps concurrent Flask LLM calls
+
+
+class ModelRouter:
+    """Sends each request to the primary model and hedges slow ones to a secondary.
+
+    If the primary has not answered by its rolling p95 latency, the same
+    request goes to the secondary model and whichever answers first wins;
+    the other call is cancelled (async) or abandoned (sync, where the SDK
+    call cannot be interrupted). Hedges draw from a budget that refills by
+    LLM_HEDGE_BUDGET_RATIO per request, so they add at most that fraction
+    of extra calls. A failed call falls back to the other one if it is
+    still running.
+
+    On the async path the hedge takes its own llm_limiter slot and is only
+    sent when one is free, so hedging never exceeds LLM_MAX_CONCURRENCY. The
+    Flask path has no limiter; there LLM_HEDGE_THREADS bounds calls.
+    """
+
+    def __init__(self, primary: str = MODEL_NAME, secondary: str = LLM_HEDGE_MODEL,
+                 enabled: bool = LLM_HEDGE_ENABLED, budget_ratio: float = LLM_HEDGE_BUDGET_RATIO):
+        self.primary = primary
+        self.secondary = secondary
+        self.enabled = enabled and bool(secondary) and secondary != primary
+        self.budget = RetryBudget(ratio=budget_ratio, min_tokens=1)
+        self.latency: Dict[str, LatencyTracker] = {primary: LatencyTracker(), secondary: LatencyTracker()}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.primary_wins_after_hedge = 0
+        self.skipped_no_budget = 0
+        self.skipped_no_slot = 0
+        self.fallbacks = 0
+        self.cancelled = 0
+
+    def hedge_delay(self) -> float:
+        """How long to wait for the primary before hedging: its p95, once there are enough samples."""
+        tracker = self.latency[self.primary]
+        if tracker.count() < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY
+        return max(LLM_HEDGE_MIN_DELAY, tracker.percentile(LLM_HEDGE_PERCENTILE))
+
+    def _record(self, model_name: str, start: float) -> None:
+        elapsed = time.monotonic() - start
+        self.latency[model_name].record(elapsed)
+        LLM_DURATION.labels(model_name, "ok").observe(elapsed)
+
+    def _call(self, model_name: str, contents) -> Any:
+        start = time.monotonic()
+        try:
+            with span("llm.generate", model=model_name):
+                response = model_registry.get(model_name=model_name).generate_content(contents)
+        except Exception:
+            LLM_DURATION.labels(model_name, "error").observe(time.monotonic() - start)
+            raise
+        self._record(model_name, start)
+        return response
+
+    async def _call_async(self, model_name: str, contents) -> Any:
+        start = time.monotonic()
+        try:
+            with span("llm.generate", model=model_name):
+                response = await model_registry.get(model_name=model_name).generate_content_async(contents)
+        except asyncio.CancelledError:
+            LLM_DURATION.labels(model_name, "cancelled").observe(time.monotonic() - start)
+            raise
+        except Exception:
+            LLM_DURATION.labels(model_name, "error").observe(time.monotonic() - start)
+            raise
+        self._record(model_name, start)
+        return response
+
+    async def _hedge_async(self, contents) -> Any:
+        # The primary's slot is held by the caller (llm_limiter.run); the hedge is a second upstream call
+        async with llm_limiter.slot():
+            return await self._call_async(self.secondary, contents)
+
+    def _should_hedge(self) -> bool:
+        if self.budget.try_spend():
+            self.hedges += 1
+            logger.debug(f"{self.primary} slower than {self.hedge_delay():.2f}s, hedging to {self.secondary}")
+            return True
+        self.skipped_no_budget += 1
+        return False
+
+    def _settle(self, winner: str, hedged: bool, failed_first: bool) -> None:
+        if failed_first:
+            self.fallbacks += 1
+        if hedged:
+            if winner == self.secondary:
+                self.hedge_wins += 1
+            else:
+                self.primary_wins_after_hedge += 1
+
+    async def generate_async(self, contents) -> Any:
+        """generate_content_async on the primary model, hedged to the secondary past the primary's p95."""
+        self.requests += 1
+        if not self.enabled:
+            return await self._call_async(self.primary, contents)
+        self.budget.record_request()
+        start = time.monotonic()
+        tasks: Dict[asyncio.Task, str] = {asyncio.ensure_future(self._call_async(self.primary, contents)): self.primary}
+        hedged = failed_first = False
+        first_error: Optional[BaseException] = None
+        try:
+            pending: Set[asyncio.Task] = set(tasks)
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay())
+            if not done and not llm_limiter.has_free_slot():
+                self.skipped_no_slot += 1
+            elif not done and self._should_hedge():
+                hedged = True
+                tasks[asyncio.ensure_future(self._hedge_async(contents))] = self.secondary
+                pending = set(tasks)
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        self._settle(tasks[task], hedged, failed_first)
+                        return task.result()
+                    failed_first = True
+                    first_error = first_error or task.exception()
+                if not pending:
+                    raise first_error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task, model_name in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    self.cancelled += 1
+                    if hedged and model_name == self.primary:
+                        # A lower bound on the primary's latency; recording only the calls that
+                        # finished would drop the slow tail and pull the hedge delay down
+                        self.latency[self.primary].record(time.monotonic() - start)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_THREADS, thread_name_prefix="llm-hedge")
+        return self._executor
+
+    def generate(self, contents) -> Any:
+        """Blocking variant for the Flask app; a losing call runs to completion in the background."""
+        self.requests += 1
+        if not self.enabled:
+            return self._call(self.primary, contents)
+        self.budget.record_request()
+        executor = self._get_executor()
+        # Each call runs in a copy of the caller's context so its trace span nests under the request
+        futures: Dict[Future, str] = {
+            executor.submit(contextvars.copy_context().run, self._call, self.primary, contents): self.primary
+        }
+        hedged = failed_first = False
+        first_error: Optional[BaseException] = None
+        done, pending = wait(set(futures), timeout=self.hedge_delay())
+        if not done and self._should_hedge():
+            hedged = True
+            futures[executor.submit(contextvars.copy_context().run, self._call, self.secondary, contents)] = self.secondary
+            pending = set(futures)
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    self._settle(futures[future], hedged, failed_first)
+                    self.cancelled += len(pending)
+                    return future.result()
+                failed_first = True
+                first_error = first_error or future.exception()
+            if not pending:
+                raise first_error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def stats(self) -> Dict[str, Any]:
+        def latency(model_name: str) -> Dict[str, Any]:
+            tracker = self.latency[model_name]
+            return {
+                "samples": tracker.count(),
+                "p50": tracker.percentile(50),
+                "p95": tracker.percentile(95),
+                "p99": tracker.percentile(99),
+            }
+
+        return {
+            "enabled": self.enabled,
+            "primary": self.primary,
+            "secondary": self.secondary,
+            "hedge_delay": round(self.hedge_delay(), 3),
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.requests, 4) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 4) if self.hedges else 0.0,
+            "primary_wins_after_hedge": self.primary_wins_after_hedge,
+            "skipped_no_budget": self.skipped_no_budget,
+            "skipped_no_slot": self.skipped_no_slot,
+            "budget_tokens": round(self.budget.tokens, 2),
+            "fallbacks": self.fallbacks,
+            "cancelled": self.cancelled,
+            "latency": {self.primary: latency(self.primary), self.secondary: latency(self.secondary)},
+        }
+
+
+model_router = ModelRouter()
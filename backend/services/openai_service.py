@@ -1,8 +1,25 @@
 import os
+import asyncio
+import time
 from dotenv import load_dotenv
 import logging
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
 from fastapi import HTTPException
-import google.generativeai as genai
+from backend.prompts import SYSTEM_PROMPT
+from backend.services.llm_concurrency import llm_limiter
+from backend.services.llm_resilience import LLM_REQUEST_DEADLINE, LLMUnavailableError, llm_resilience
+from backend.services.metrics import LLM_DURATION, LLM_TTFT
+from backend.services.model_registry import MODEL_NAME, model_registry
+from backend.services.model_router import model_router
+from backend.services.response_cache import RESPONSE_CACHE_ENABLED, request_key, response_cache
+from backend.services.semantic_cache import semantic_cache
+from backend.services.single_flight import (
+    llm_async_single_flight,
+    llm_async_stream_flight,
+    llm_single_flight,
+    llm_stream_flight,
+)
+from backend.services.tracing import span
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,65 +28,269 @@ logger = logging.getLogger(__name__)
 # Always load .env from project root
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
-SYSTEM_PROMPT = """You are an expert tax and finance chatbot of advit itec, specializing in GST filing, income tax, financial planning, and accounting services.
-
-Guidelines:
-1. Always respond only in English.
-2. Focus on accuracy and clarity in tax and finance-related information.
-3. Keep explanations clear, concise, and professional.
-4. For GST and tax-related queries, always mention applicable sections and rules.
-5. Break down complex financial concepts into simple steps.
-6. Provide disclaimers when necessary about consulting a qualified professional.
-7. Stay updated with current tax rates and GST slabs.
-
-Key Areas of Expertise:
-- GST Filing and Compliance
-- Income Tax Returns
-- Tax Planning and Savings
-- Financial Record Keeping
-- Business Accounting
-- Corporate Tax
-- Tax Deductions and Exemptions
-
-Remember:
-- Always provide accurate tax-related information
-- Include relevant tax laws and regulations
-- Suggest proper documentation requirements
-- Explain filing deadlines and compliance requirements
-
-**Formatting Instructions:**
-- ALWAYS use markdown for your output.
-- Use bullet points or numbered lists for all answers.
-- Add TWO line breaks between each point or paragraph for clear separation.
-- Never return a single long paragraph.
-- Never combine multiple points in one paragraph.
-- Each point must be on its own line, separated by two line breaks.
-- Use bold or italics for emphasis where appropriate.
-- Mimic the style and clarity of ChatGPT.
-
-Do not provide responses in any language other than English.
-Important: Always include disclaimers for complex tax matters and recommend consulting a certified tax professional for specific cases."""
-
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    logger.error("GEMINI_API_KEY is not set in environment variables.")
-    raise RuntimeError("GEMINI_API_KEY is not set in environment variables.")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
-def get_openai_response(user_query: str) -> str:
-    """Synchronous Gemini API call for FastAPI route (blocking, but reliable)."""
+# GEMINI_API_KEY is checked when the first model is created (ModelRegistry._configure)
+
+# Earlier turns of a conversation as Gemini contents (see services/conversation_context.py)
+History = List[Dict[str, Any]]
+
+def _contents(user_query: str, history: Optional[History]) -> Union[str, History]:
+    if not history:
+        return user_query
+    return history + [{"role": "user", "parts": [user_query]}]
+
+def _cached_response(user_query: str) -> Optional[str]:
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    cached = response_cache.get(user_query, SYSTEM_PROMPT, MODEL_NAME)
+    if cached is not None:
+        logger.info("Serving answer from response cache")
+    return cached
+
+def _reused_response(user_query: str) -> Optional[str]:
+    # A well-rated answer to a paraphrase of this question (see services/semantic_cache.py)
+    reused = semantic_cache.lookup(user_query)
+    if reused is not None:
+        _cache_response(user_query, reused)
+    return reused
+
+async def _cached_response_async(user_query: str) -> Optional[str]:
+    # The SQLite backend can wait on another worker's write lock; keep that off the event loop
+    if RESPONSE_CACHE_ENABLED and response_cache.backend.blocking:
+        return await asyncio.to_thread(_cached_response, user_query)
+    return _cached_response(user_query)
+
+async def _reused_response_async(user_query: str) -> Optional[str]:
+    if not semantic_cache.enabled:
+        return None
+    return await asyncio.to_thread(_reused_response, user_query)
+
+def _request_key(user_query: str) -> str:
+    return request_key(user_query, SYSTEM_PROMPT, MODEL_NAME)
+
+def _cache_response(user_query: str, response: str) -> None:
+    if RESPONSE_CACHE_ENABLED and response:
+        response_cache.set(user_query, SYSTEM_PROMPT, MODEL_NAME, response)
+
+async def _cache_response_async(user_query: str, response: str) -> None:
+    if RESPONSE_CACHE_ENABLED and response_cache.backend.blocking:
+        await asyncio.to_thread(_cache_response, user_query, response)
+    else:
+        _cache_response(user_query, response)
+
+def _generate(contents: Union[str, History]) -> str:
+    # The system prompt is part of the shared model (system_instruction), not the request;
+    # slow calls are hedged to a second model (see model_router)
+    response = model_router.generate(contents)
+    model_registry.record_usage(response)
+    if hasattr(response, "text"):
+        logger.info(f"Gemini reply: {response.text}")
+        return response.text
+    logger.error(f"Unexpected Gemini response format: {response}")
+    raise HTTPException(status_code=502, detail="Gemini API returned unexpected response format")
+
+def _fetch(user_query: str) -> str:
+    response = llm_resilience.call(_generate, user_query)
+    _cache_response(user_query, response)
+    return response
+
+def get_openai_response(user_query: str, history: Optional[History] = None) -> str:
+    """Synchronous Gemini API call (blocking), with retries and the circuit breaker.
+
+    Concurrent identical questions share one upstream call. Follow-ups with
+    conversation history bypass the cache and coalescing, since their answer
+    depends on the history. Raises LLMUnavailableError without calling Gemini
+    while the breaker is open.
+    """
     logger.info(f"Processing query: {user_query[:100]}...")
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash-latest")
-        prompt = f"{SYSTEM_PROMPT}\n\nUser: {user_query}"
-        response = model.generate_content(prompt)
-        if hasattr(response, "text"):
-            logger.info(f"Gemini reply: {response.text}")
-            return response.text
-        else:
-            logger.error(f"Unexpected Gemini response format: {response}")
-            raise HTTPException(status_code=502, detail="Gemini API returned unexpected response format")
+        if history:
+            return llm_resilience.call(_generate, _contents(user_query, history))
+        cached = _cached_response(user_query)
+        if cached is None:
+            cached = _reused_response(user_query)
+        if cached is not None:
+            return cached
+        return llm_single_flight.do(_request_key(user_query), _fetch, user_query)
+    except (HTTPException, LLMUnavailableError):
+        raise
     except Exception as e:
         logger.error(f"Error in get_openai_response: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+async def _generate_async(contents: Union[str, History]) -> str:
+    response = await model_router.generate_async(contents)
+    model_registry.record_usage(response)
+    if hasattr(response, "text"):
+        return response.text
+    logger.error(f"Unexpected Gemini response format: {response}")
+    raise HTTPException(status_code=502, detail="Gemini API returned unexpected response format")
+
+async def _fetch_async(user_query: str, deadline: float) -> str:
+    response = await llm_resilience.call_async(_generate_async, user_query, deadline=deadline)
+    await _cache_response_async(user_query, response)
+    return response
+
+async def get_openai_response_async(user_query: str, deadline: float = LLM_REQUEST_DEADLINE,
+                                    history: Optional[History] = None) -> str:
+    """Non-blocking Gemini call through the resilience layer.
+
+    Each attempt runs under the global concurrency limiter with an adaptive
+    timeout that cancels the outstanding request; failed attempts are retried
+    with jittered backoff until the per-request deadline or the retry budget
+    runs out. Concurrent identical questions without history share one
+    upstream call. Raises LLMUnavailableError while the circuit breaker is open.
+    """
+    logger.info(f"Processing query: {user_query[:100]}...")
+    try:
+        if history:
+            return await llm_resilience.call_async(_generate_async, _contents(user_query, history), deadline=deadline)
+        cached = await _cached_response_async(user_query)
+        if cached is None:
+            cached = await _reused_response_async(user_query)
+        if cached is not None:
+            return cached
+        return await llm_async_single_flight.do(_request_key(user_query), _fetch_async, user_query, deadline)
+    except asyncio.TimeoutError:
+        logger.error("Gemini API call timed out")
+        raise HTTPException(status_code=504, detail="Gemini API call timed out")
+    except (HTTPException, LLMUnavailableError):
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_openai_response_async: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+def _chunk_text(chunk) -> str:
+    """Text of one streamed chunk; empty when the chunk carries no parts (e.g. safety metadata)."""
+    try:
+        return chunk.text
+    except (ValueError, AttributeError):
+        return ""
+
+def _cancel_stream(response) -> None:
+    """Best-effort cancel of the underlying gRPC stream so Gemini stops generating."""
+    call = getattr(response, "_iterator", None)
+    if call is not None and hasattr(call, "cancel"):
+        try:
+            call.cancel()
+        except Exception as e:
+            logger.warning(f"Could not cancel Gemini stream: {e}")
+
+def _stream_gemini(user_query: str, history: Optional[History] = None) -> Iterator[str]:
+    probe = llm_resilience.check_breaker()
+    try:
+        start = time.monotonic()
+        # A leaf span finished by hand: this generator yields, so it must not become the current span
+        stream_span = span("llm.stream", model=MODEL_NAME)
+        try:
+            response = model_registry.get().generate_content(_contents(user_query, history), stream=True)
+        except Exception as e:
+            llm_resilience.record_error(e)
+            LLM_DURATION.labels(MODEL_NAME, "error").observe(time.monotonic() - start)
+            stream_span.finish()
+            raise
+        llm_resilience.breaker.record_success()
+        finished = False
+        try:
+            chunks = []
+            for chunk in response:
+                text = _chunk_text(chunk)
+                if text:
+                    if not chunks:
+                        LLM_TTFT.labels(MODEL_NAME).observe(time.monotonic() - start)
+                    chunks.append(text)
+                    yield text
+            finished = True
+            LLM_DURATION.labels(MODEL_NAME, "stream").observe(time.monotonic() - start)
+            model_registry.record_usage(response)
+            if not history:
+                _cache_response(user_query, "".join(chunks))
+        finally:
+            stream_span.finish()
+            if not finished:
+                _cancel_stream(response)
+    finally:
+        # Closed before Gemini answered: no outcome to record, so let the next call probe
+        llm_resilience.breaker.release_probe(probe)
+
+async def _astream_gemini(user_query: str, history: Optional[History] = None) -> AsyncIterator[str]:
+    # Holds an llm_limiter slot for the lifetime of the stream.
+    probe = llm_resilience.check_breaker()
+    try:
+        async with llm_limiter.slot():
+            start = time.monotonic()
+            stream_span = span("llm.stream", model=MODEL_NAME)
+            try:
+                response = await model_registry.get().generate_content_async(_contents(user_query, history), stream=True)
+            except Exception as e:
+                llm_resilience.record_error(e)
+                LLM_DURATION.labels(MODEL_NAME, "error").observe(time.monotonic() - start)
+                stream_span.finish()
+                raise
+            llm_resilience.breaker.record_success()
+            finished = False
+            try:
+                chunks = []
+                async for chunk in response:
+                    text = _chunk_text(chunk)
+                    if text:
+                        if not chunks:
+                            LLM_TTFT.labels(MODEL_NAME).observe(time.monotonic() - start)
+                        chunks.append(text)
+                        yield text
+                finished = True
+                LLM_DURATION.labels(MODEL_NAME, "stream").observe(time.monotonic() - start)
+                model_registry.record_usage(response)
+                if not history:
+                    await _cache_response_async(user_query, "".join(chunks))
+            finally:
+                stream_span.finish()
+                if not finished:
+                    _cancel_stream(response)
+    finally:
+        # The slot wait timed out, or the stream was cancelled or closed before Gemini
+        # answered: no outcome either way, so let the next call probe
+        llm_resilience.breaker.release_probe(probe)
+
+def stream_openai_response(user_query: str, history: Optional[History] = None) -> Iterator[str]:
+    """Yield Gemini response text chunks as they are generated.
+
+    Concurrent identical questions share one upstream stream; late joiners
+    replay the chunks produced so far. Closing the generator before it is
+    exhausted cancels the upstream call once no other subscriber is left.
+    Follow-ups with history get a stream of their own.
+    """
+    logger.info(f"Streaming query: {user_query[:100]}...")
+    if history:
+        yield from _stream_gemini(user_query, history)
+        return
+    cached = _cached_response(user_query)
+    if cached is None:
+        cached = _reused_response(user_query)
+    if cached is not None:
+        yield cached
+        return
+    yield from llm_stream_flight.subscribe(_request_key(user_query), lambda: _stream_gemini(user_query))
+
+async def astream_openai_response(user_query: str, history: Optional[History] = None) -> AsyncIterator[str]:
+    """Async variant of stream_openai_response using the SDK's async streaming."""
+    logger.info(f"Streaming query: {user_query[:100]}...")
+    if history:
+        upstream = _astream_gemini(user_query, history)
+        try:
+            async for text in upstream:
+                yield text
+        finally:
+            await upstream.aclose()
+        return
+    cached = await _cached_response_async(user_query)
+    if cached is None:
+        cached = await _reused_response_async(user_query)
+    if cached is not None:
+        yield cached
+        return
+    subscription = llm_async_stream_flight.subscribe(_request_key(user_query), lambda: _astream_gemini(user_query))
+    try:
+        async for text in subscription:
+            yield text
+    finally:
+        await subscription.aclose()
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+import bcrypt
+
+from backend.services.metrics import watch_queue
+from backend.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Hashing configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 1)))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "256"))
+
+_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+def _hash_password(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)).decode()
+
+
+def _verify_password(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+    except Exception:
+        return False
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    """Cost factor encoded in a bcrypt hash, or None if it is not a bcrypt hash."""
+    match = _COST_RE.match(hashed or "")
+    return int(match.group(1)) if match else None
+
+
+def needs_rehash(hashed: str, rounds: int = BCRYPT_ROUNDS) -> bool:
+    """True when a stored hash was made with a different cost than the configured one."""
+    return hash_cost(hashed) != rounds
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashing requests are already waiting for a worker."""
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool so hashing never holds the event loop (or the GIL).
+
+    Work beyond `max_pending` outstanding requests is rejected with
+    PasswordHasherBusy rather than queued without limit. If a worker dies
+    the pool is replaced and the request retried once.
+    """
+
+    def __init__(self, workers: int = BCRYPT_WORKERS, rounds: int = BCRYPT_ROUNDS, max_pending: int = BCRYPT_MAX_PENDING):
+        self.workers = workers
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that already runs threads (DB pool, event loop) is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _replace_executor(self, broken: ProcessPoolExecutor) -> None:
+        # Concurrent requests all see the same broken pool; only the first replaces it
+        if self._executor is broken:
+            self._executor = None
+            self.restarts += 1
+            logger.warning("Password hashing pool broke (a worker died); starting a new one")
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, func, *args) -> Any:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many password hashing requests in progress")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(executor, func, *args)
+            except BrokenProcessPool:
+                self._replace_executor(executor)
+                return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        with span("bcrypt.hash", rounds=self.rounds):
+            return await self._submit(_hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        with span("bcrypt.verify"):
+            return await self._submit(_verify_password, password, hashed)
+
+    def warm_up(self) -> None:
+        """Start the worker processes now instead of on the first login."""
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(hash_cost, "")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "queue_depth": max(self.pending - self.workers, 0),
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+        }
+
+
+password_hasher = PasswordHasher()
+watch_queue("password_hasher", lambda: max(password_hasher.pending - password_hasher.workers, 0),
+            lambda: min(password_hasher.pending, password_hasher.workers))
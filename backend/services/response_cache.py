@@ -0,0 +1,254 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory | sqlite
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(6 * 60 * 60)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TOUCH_INTERVAL = 60  # seconds; coarser LRU order in exchange for far fewer writes on hits
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a question: case, punctuation and whitespace differences removed."""
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = _PUNCTUATION_RE.sub(" ", query)
+    return _WHITESPACE_RE.sub(" ", query).strip()
+
+
+def prompt_version(system_prompt: str) -> str:
+    """Short fingerprint of the system prompt; a prompt edit changes every cache key."""
+    return hashlib.sha256(system_prompt.encode()).hexdigest()[:16]
+
+
+def request_key(query: str, system_prompt: str, model_name: str) -> str:
+    """Identity of an LLM request for caching and coalescing."""
+    raw = f"{model_name}\0{prompt_version(system_prompt)}\0{normalize_query(query)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class MemoryCacheBackend:
+    """Per-process LRU bounded by entry count and total response size."""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, version, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, version: str, ttl: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, version, time.time() + ttl)
+            self._bytes += len(value)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def purge_versions_except(self, version: str) -> int:
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[1] != version]
+            for key in stale:
+                self._remove(key)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        value = self._entries.pop(key)[0]
+        self._bytes -= len(value)
+
+
+class SQLiteCacheBackend:
+    """File-backed LRU that several worker processes on one host can share.
+
+    Calls may wait on another process's write lock, so async callers run
+    them in a thread (see `blocking`). The file and table are created on
+    first use, not at import.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = RESPONSE_CACHE_PATH, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_access ON response_cache (last_access)")
+            self._schema_ready = True
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._schema_ready:
+            self._create_schema(conn)
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires_at, last_access FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] <= now:
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            return None
+        # A hot entry is touched at most once per interval instead of taking the write lock on every hit
+        if now - row[2] >= RESPONSE_CACHE_TOUCH_INTERVAL:
+            conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key: str, value: str, version: str, ttl: int) -> None:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("""
+            INSERT OR REPLACE INTO response_cache (key, value, prompt_version, expires_at, last_access)
+            VALUES (?, ?, ?, ?, ?)
+        """, (key, value, version, now + ttl, now))
+        overflow = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+            cursor = conn.execute("""
+                DELETE FROM response_cache WHERE key IN (
+                    SELECT key FROM response_cache ORDER BY last_access LIMIT ?
+                )
+            """, (overflow,))
+            self.evictions += cursor.rowcount
+
+    def purge_versions_except(self, version: str) -> int:
+        cursor = self._connect().execute("DELETE FROM response_cache WHERE prompt_version != ?", (version,))
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM response_cache")
+
+    def size(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """LLM answer cache keyed on (model, system prompt version, normalized query)."""
+
+    def __init__(self, backend, ttl: int = RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._current_version: Optional[str] = None
+
+    def _key(self, query: str, system_prompt: str, model_name: str) -> str:
+        if prompt_version(system_prompt) != self._current_version:
+            self.invalidate_prompt(system_prompt)
+        return request_key(query, system_prompt, model_name)
+
+    def get(self, query: str, system_prompt: str, model_name: str) -> Optional[str]:
+        try:
+            value = self.backend.get(self._key(query, system_prompt, model_name))
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, query: str, system_prompt: str, model_name: str, response: str) -> None:
+        try:
+            key = self._key(query, system_prompt, model_name)
+            self.backend.set(key, response, prompt_version(system_prompt), self.ttl)
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def invalidate_prompt(self, system_prompt: str) -> None:
+        """Drop every entry produced under a different system prompt."""
+        version = prompt_version(system_prompt)
+        removed = self.backend.purge_versions_except(version)
+        if removed:
+            logger.info(f"Response cache: dropped {removed} entries from old system prompts")
+        self._current_version = version
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": RESPONSE_CACHE_ENABLED,
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.backend.evictions,
+            "ttl": self.ttl,
+        }
+
+
+def _create_backend():
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        return SQLiteCacheBackend()
+    return MemoryCacheBackend()
+
+
+response_cache = ResponseCache(_create_backend())
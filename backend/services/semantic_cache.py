@@ -0,0 +1,225 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from backend.database import get_db_session
+from backend.services.metrics import counter
+from backend.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Semantic cache configuration (off by default: it answers with a different user's earlier answer)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", "auto")  # auto | sentence-transformers | hashed
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "semantic_index.npz")
+SEMANTIC_CACHE_MIN_RATING = float(os.getenv("SEMANTIC_CACHE_MIN_RATING", "4"))  # average feedback rating
+SEMANTIC_CACHE_MIN_RATINGS = int(os.getenv("SEMANTIC_CACHE_MIN_RATINGS", "1"))
+SEMANTIC_CACHE_NPROBE = int(os.getenv("SEMANTIC_CACHE_NPROBE", "8"))
+# Cosine similarity needed for reuse; unset picks the embedder's default below
+SEMANTIC_CACHE_MIN_SIMILARITY = float(os.getenv("SEMANTIC_CACHE_MIN_SIMILARITY") or 0) or None
+# The hashed embedder scores paraphrases lower than a trained model does
+DEFAULT_MIN_SIMILARITY = {"sentence-transformers": 0.88, "hashed": 0.80}
+
+SEMANTIC_LOOKUPS = counter("semantic_cache_lookups_total", "Semantic answer reuse lookups by outcome", ("outcome",))
+
+# Only a session's first question is indexed: later ones depend on the conversation before them
+_FIRST_TURNS = """
+    SELECT c.id, c.user_message, COALESCE(SUM(f.rating), 0) AS rating_sum, COUNT(f.id) AS rating_count
+    FROM chat_history c
+    JOIN chat_sessions s ON s.id = c.session_id AND s.deleted_at IS NULL
+    {join} feedback f ON f.chat_id = c.id
+    WHERE c.id > :after AND c.id = (SELECT MIN(h.id) FROM chat_history h WHERE h.session_id = c.session_id)
+    GROUP BY c.id
+    ORDER BY c.id
+    LIMIT :limit
+"""
+
+
+def create_embedder(kind: str = SEMANTIC_CACHE_EMBEDDER, model_name: str = SEMANTIC_CACHE_MODEL):
+    """The configured embedder; "auto" uses sentence-transformers when installed, else hashed n-grams."""
+    from backend.services.vector_index import HashedNgramEmbedder, SentenceTransformerEmbedder
+    if kind in ("auto", "sentence-transformers"):
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except ImportError:
+            if kind != "auto":
+                raise
+            logger.info("sentence-transformers is not installed; semantic cache uses hashed n-gram embeddings")
+    return HashedNgramEmbedder()
+
+
+def embedder_family(embedder) -> str:
+    return "hashed" if embedder.name.startswith("hashed") else "sentence-transformers"
+
+
+class SemanticCache:
+    """Reuses well-rated answers to earlier questions that mean the same as a new one.
+
+    The index holds the first question of every rated session (embedded on
+    CPU) with the rating sum and count of its answer. A lookup embeds the
+    question, takes its nearest neighbour and serves that answer only when
+    both the similarity and the average rating clear their thresholds.
+    numpy and the embedding model load on first use, not at import.
+
+    Each worker loads the index saved by the rebuild tool and keeps it
+    current with the feedback and deletes it handles itself; rebuild
+    periodically so every worker sees everyone's ratings.
+    """
+
+    def __init__(self, enabled: bool = SEMANTIC_CACHE_ENABLED, path: str = SEMANTIC_CACHE_PATH,
+                 min_similarity: Optional[float] = SEMANTIC_CACHE_MIN_SIMILARITY,
+                 min_rating: float = SEMANTIC_CACHE_MIN_RATING, min_ratings: int = SEMANTIC_CACHE_MIN_RATINGS):
+        self.enabled = enabled
+        self.path = path
+        self._min_similarity = min_similarity
+        self.min_rating = min_rating
+        self.min_ratings = min_ratings
+        self.embedder = None
+        self.index = None
+        self._load_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_ms = 0.0
+
+    @property
+    def min_similarity(self) -> float:
+        if self._min_similarity is not None:
+            return self._min_similarity
+        return DEFAULT_MIN_SIMILARITY[embedder_family(self.embedder)] if self.embedder else 1.0
+
+    def _ensure_loaded(self) -> None:
+        if self.index is not None:
+            return
+        with self._load_lock:
+            if self.index is not None:
+                return
+            from backend.services.vector_index import VectorIndex
+            embedder = create_embedder()
+            index = None
+            if os.path.exists(self.path):
+                try:
+                    index, meta = VectorIndex.load(self.path, nprobe=SEMANTIC_CACHE_NPROBE)
+                    if meta.get("embedder") != embedder.name:
+                        logger.warning(f"Semantic index {self.path} was built with {meta.get('embedder')}, "
+                                       f"not {embedder.name}; starting empty until it is rebuilt")
+                        index = None
+                except Exception as e:
+                    logger.warning(f"Could not load semantic index {self.path}: {e}")
+            self.embedder = embedder
+            self.index = index or VectorIndex(embedder.dim, nprobe=SEMANTIC_CACHE_NPROBE)
+            logger.info(f"Semantic index ready with {len(self.index)} entries ({embedder.name})")
+
+    def warm_up(self) -> None:
+        if self.enabled:
+            self._ensure_loaded()
+
+    def passes(self, match: Dict[str, Any]) -> bool:
+        return (match["similarity"] >= self.min_similarity
+                and match["rating_count"] >= self.min_ratings
+                and match["rating_sum"] / match["rating_count"] >= self.min_rating)
+
+    def lookup(self, query: str) -> Optional[str]:
+        """A stored answer to a question that means the same as `query`, or None. Blocking (DB read)."""
+        if not self.enabled:
+            return None
+        with span("llm.semantic_cache"):
+            start = time.perf_counter()
+            self._ensure_loaded()
+            matches = self.index.search(self.embedder.embed([query])[0]) if len(self.index) else []
+            answer = None
+            if not matches:
+                outcome = "empty"
+            elif matches[0]["similarity"] < self.min_similarity:
+                outcome = "not_similar"
+            elif not self.passes(matches[0]):
+                outcome = "low_rating"
+            else:
+                answer = self._answer(matches[0]["id"])
+                outcome = "hit" if answer is not None else "deleted"
+            self.lookup_ms = (time.perf_counter() - start) * 1000
+        SEMANTIC_LOOKUPS.labels(outcome).inc()
+        if answer is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        logger.info(f"Reusing answer {matches[0]['id']} (similarity {matches[0]['similarity']:.3f})")
+        return answer
+
+    def _answer(self, chat_id: int) -> Optional[str]:
+        with next(get_db_session()) as db:
+            answer = db.execute(text("""
+                SELECT c.bot_response FROM chat_history c
+                JOIN chat_sessions s ON s.id = c.session_id AND s.deleted_at IS NULL
+                WHERE c.id = :id
+            """), {"id": chat_id}).scalar()
+        if answer is None:
+            # Deleted through another worker since this index was loaded
+            self.index.remove(chat_id)
+        return answer
+
+    def record_feedback(self, chat_id: int, rating: int) -> None:
+        """Index a newly rated first question, or add the rating to an indexed one (after the feedback commit)."""
+        if not self.enabled:
+            return
+        with next(get_db_session()) as db:
+            row = db.execute(text("""
+                SELECT c.user_message FROM chat_history c
+                WHERE c.id = :id AND c.id = (SELECT MIN(h.id) FROM chat_history h WHERE h.session_id = c.session_id)
+            """), {"id": chat_id}).first()
+        if row is None:
+            return
+        self._ensure_loaded()
+        self.index.add(chat_id, self.embedder.embed([row.user_message])[0], rating, 1)
+
+    def forget(self, chat_ids: Iterable[int]) -> None:
+        if self.enabled and self.index is not None:
+            for chat_id in chat_ids:
+                self.index.remove(chat_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "embedder": self.embedder.name if self.embedder else None,
+            "min_similarity": self.min_similarity if self.embedder else None,
+            "min_rating": self.min_rating,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "last_lookup_ms": round(self.lookup_ms, 2),
+            **({"index": self.index.stats()} if self.index is not None else {}),
+        }
+
+
+def first_turns(batch_size: int = 5000, rated_only: bool = True) -> Iterable[List[Any]]:
+    """Batches of sessions' first questions as (id, user_message, rating_sum, rating_count), in id order."""
+    query = text(_FIRST_TURNS.format(join="JOIN" if rated_only else "LEFT JOIN"))
+    after = 0
+    while True:
+        with next(get_db_session()) as db:
+            rows = db.execute(query, {"after": after, "limit": batch_size}).all()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1].id
+
+
+def build_index(embedder, nprobe: int = SEMANTIC_CACHE_NPROBE, batch_size: int = 5000):
+    """A trained index of every rated first question, read from the database in batches."""
+    from backend.services.vector_index import VectorIndex
+    index = VectorIndex(embedder.dim, nprobe=nprobe)
+    for rows in first_turns(batch_size):
+        vectors = embedder.embed([row.user_message for row in rows])
+        for row, vector in zip(rows, vectors):
+            index.add(row.id, vector, float(row.rating_sum), int(row.rating_count))
+        logger.info(f"Embedded {len(index)} questions")
+    index.train()
+    return index
+
+
+semantic_cache = SemanticCache()
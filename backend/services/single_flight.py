@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import threading
+from contextlib import closing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StreamCancelled(Exception):
+    """The shared stream was stopped because every subscriber left; its chunks are incomplete."""
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls (same key) into one execution, for threaded code.
+
+    The first caller runs the function; callers arriving while it is in flight
+    wait for and share its result or exception.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.collapsed = 0
+
+    def do(self, key: str, func: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self) -> Dict[str, int]:
+        return {"executions": self.executions, "collapsed": self.collapsed, "in_flight": len(self._calls)}
+
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight.
+
+    The shared call runs as its own task, so a waiter being cancelled (client
+    gone) does not cancel it for the others; it is cancelled only once every
+    waiter has left.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _AsyncCall] = {}
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key: str, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _AsyncCall(asyncio.ensure_future(func(*args)))
+            self.executions += 1
+            call.task.add_done_callback(lambda _t: self._forget(key, call))
+        else:
+            self.collapsed += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _AsyncCall) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"executions": self.executions, "collapsed": self.collapsed, "in_flight": len(self._calls)}
+
+
+class _SharedStream:
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.cancelled = False
+
+
+class StreamFlight:
+    """Fans one upstream chunk stream out to every concurrent subscriber with the same key.
+
+    A background thread drains the upstream iterator into a shared buffer;
+    late joiners first replay the chunks produced so far. The upstream is
+    closed once the last subscriber disconnects, and the stream is dropped
+    from the table at that moment, so a caller arriving afterwards starts a
+    new one instead of joining a truncated answer.
+    """
+
+    def __init__(self):
+        self._streams: Dict[str, _SharedStream] = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self.executions = 0
+        self.collapsed = 0
+
+    def subscribe(self, key: str, factory: Callable[[], Iterator[str]]) -> Iterator[str]:
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is None:
+                shared = self._streams[key] = _SharedStream()
+                self.executions += 1
+                threading.Thread(target=self._produce, args=(key, shared, factory), daemon=True).start()
+            else:
+                self.collapsed += 1
+            shared.subscribers += 1
+
+        position = 0
+        try:
+            while True:
+                with self._cond:
+                    while position >= len(shared.chunks) and not shared.done:
+                        self._cond.wait()
+                    pending = shared.chunks[position:]
+                    position += len(pending)
+                    finished = shared.done and position >= len(shared.chunks)
+                for chunk in pending:
+                    yield chunk
+                if finished:
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+        finally:
+            with self._lock:
+                shared.subscribers -= 1
+                if shared.subscribers == 0 and not shared.done:
+                    shared.cancelled = True
+                    if self._streams.get(key) is shared:
+                        del self._streams[key]
+
+    def _produce(self, key: str, shared: _SharedStream, factory: Callable[[], Iterator[str]]) -> None:
+        try:
+            with closing(factory()) as upstream:
+                for chunk in upstream:
+                    with self._cond:
+                        shared.chunks.append(chunk)
+                        self._cond.notify_all()
+                        if shared.cancelled:
+                            logger.info("All stream subscribers left, closing upstream")
+                            shared.error = StreamCancelled()
+                            break
+        except BaseException as e:
+            shared.error = e
+        finally:
+            with self._cond:
+                shared.done = True
+                if self._streams.get(key) is shared:
+                    del self._streams[key]
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        return {"executions": self.executions, "collapsed": self.collapsed, "in_flight": len(self._streams)}
+
+
+class _AsyncSharedStream(_SharedStream):
+    def __init__(self):
+        super().__init__()
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class AsyncStreamFlight:
+    """asyncio counterpart of StreamFlight; the upstream is drained by a task."""
+
+    def __init__(self):
+        self._streams: Dict[str, _AsyncSharedStream] = {}
+        self.executions = 0
+        self.collapsed = 0
+
+    async def subscribe(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = _AsyncSharedStream()
+            self.executions += 1
+            shared.task = asyncio.ensure_future(self._produce(key, shared, factory))
+        else:
+            self.collapsed += 1
+        shared.subscribers += 1
+
+        position = 0
+        try:
+            while True:
+                while position >= len(shared.chunks) and not shared.done:
+                    shared.changed.clear()
+                    await shared.changed.wait()
+                pending = shared.chunks[position:]
+                position += len(pending)
+                for chunk in pending:
+                    yield chunk
+                if shared.done and position >= len(shared.chunks):
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+        finally:
+            shared.subscribers -= 1
+            if shared.subscribers == 0 and not shared.done:
+                # Forget it now: the cancelled task stays alive until upstream.aclose() returns
+                if self._streams.get(key) is shared:
+                    del self._streams[key]
+                shared.task.cancel()
+
+    async def _produce(self, key: str, shared: _AsyncSharedStream, factory: Callable[[], AsyncIterator[str]]) -> None:
+        upstream = factory()
+        try:
+            async for chunk in upstream:
+                shared.chunks.append(chunk)
+                shared.changed.set()
+        except asyncio.CancelledError:
+            logger.info("All stream subscribers left, closing upstream")
+            shared.error = StreamCancelled()
+        except Exception as e:
+            shared.error = e
+        finally:
+            await upstream.aclose()
+            shared.done = True
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+            shared.changed.set()
+
+    def stats(self) -> Dict[str, int]:
+        return {"executions": self.executions, "collapsed": self.collapsed, "in_flight": len(self._streams)}
+
+
+llm_single_flight = SingleFlight()
+llm_async_single_flight = AsyncSingleFlight()
+llm_stream_flight = StreamFlight()
+llm_async_stream_flight = AsyncStreamFlight()
+
+
+def coalescing_stats() -> Dict[str, Dict[str, int]]:
+    """How many upstream LLM calls were made vs. collapsed into an in-flight one."""
+    return {
+        "blocking": llm_single_flight.stats(),
+        "async": llm_async_single_flight.stats(),
+        "stream": llm_stream_flight.stats(),
+        "async_stream": llm_async_stream_flight.stats(),
+    }
@@ -0,0 +1,267 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tracing configuration (both rates default to off; a request can opt in with TRACE_HEADER)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+TRACE_HEADER = os.getenv("TRACE_HEADER", "X-Debug-Trace")
+TRACE_TOKEN = os.getenv("TRACE_TOKEN", "")  # header value that enables trace + profile; unset disables the header
+TRACE_DIR = Path(os.getenv("TRACE_DIR", "traces"))
+TRACE_LOG_MS = float(os.getenv("TRACE_LOG_MS", "0"))  # only log traced requests slower than this
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_ACTIVE = int(os.getenv("PROFILE_MAX_ACTIVE", "2"))
+
+
+class Span:
+    """One timed operation; spans started while it is current become its children."""
+
+    __slots__ = ("name", "attributes", "start", "end", "children", "trace", "_token")
+
+    def __init__(self, name: str, trace: "Trace", attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.trace = trace
+        self._token = None
+
+    def finish(self) -> None:
+        if self.end is None:
+            self.end = time.perf_counter()
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        if self.trace.profiled:
+            self.trace.enter_thread()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.finish()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        if self.trace.profiled:
+            self.trace.exit_thread()
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Exited from another context (e.g. a generator closed elsewhere); just detach
+            _current.set(None)
+
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration_ms(), 3),
+            "self_ms": round(self.duration_ms() - sum(c.duration_ms() for c in self.children), 3),
+            **({"attributes": {k: _short(v) for k, v in self.attributes.items()}} if self.attributes else {}),
+            **({"children": [c.to_dict(origin) for c in self.children]} if self.children else {}),
+        }
+
+
+def _short(value: Any, limit: int = 300) -> Any:
+    # SQL statements and the like are recorded as-is and only cut down when written out
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit] + "..."
+    return value
+
+
+class _NoopSpan:
+    """Returned when the request is not traced: no allocation, no timing."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def finish(self) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+_current: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("trace_span", default=None)
+
+
+class Trace:
+    """The span tree of one request, plus stack samples when it is profiled."""
+
+    def __init__(self, name: str, profiled: bool):
+        self.id = uuid.uuid4().hex[:16]
+        self.root = Span(name, self, {})
+        self.profiled = profiled
+        self.samples: Counter = Counter()
+        self._threads: Dict[int, int] = {}
+
+    def enter_thread(self) -> None:
+        ident = threading.get_ident()
+        self._threads[ident] = self._threads.get(ident, 0) + 1
+
+    def exit_thread(self) -> None:
+        ident = threading.get_ident()
+        remaining = self._threads.get(ident, 1) - 1
+        if remaining:
+            self._threads[ident] = remaining
+        else:
+            self._threads.pop(ident, None)
+
+    def threads(self) -> List[int]:
+        return list(self._threads)
+
+
+def span(name: str, **attributes: Any):
+    """Time `name` as a child of the current span; a shared no-op outside a traced request.
+
+    Use it as a context manager, or call .finish() on it for a leaf span
+    that outlives a block (event callbacks, generator yields).
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    child = Span(name, parent.trace, attributes)
+    parent.children.append(child)
+    return child
+
+
+def current_trace() -> Optional[Trace]:
+    current = _current.get()
+    return current.trace if current is not None else None
+
+
+def sampling_decision(header_value: Optional[str]) -> Optional[bool]:
+    """None when the request is not traced, otherwise whether to profile it too."""
+    if TRACE_TOKEN and header_value == TRACE_TOKEN:
+        return True
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return True
+    if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE:
+        return False
+    return None
+
+
+class SamplingProfiler:
+    """Samples the stacks of threads working on profiled requests into folded-stack counts.
+
+    One daemon thread runs only while a profiled request is active. Samples
+    are taken from threads currently inside one of the request's spans; the
+    event-loop thread is shared, so its samples can include concurrent
+    requests. Output is one "frame;frame;frame count" line per stack, the
+    format flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000, max_active: int = PROFILE_MAX_ACTIVE):
+        self.interval = interval
+        self.max_active = max_active
+        self._active: List[Trace] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.profiled = 0
+        self.skipped = 0
+
+    def start(self, trace: Trace) -> bool:
+        with self._lock:
+            if len(self._active) >= self.max_active:
+                self.skipped += 1
+                return False
+            self._active.append(trace)
+            self.profiled += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        return True
+
+    def stop(self, trace: Trace) -> None:
+        with self._lock:
+            if trace in self._active:
+                self._active.remove(trace)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for trace in active:
+                for ident in trace.threads():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        trace.samples[_fold(frame)] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": len(self._active), "profiled": self.profiled, "skipped": self.skipped}
+
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+profiler = SamplingProfiler()
+
+
+def begin(name: str, header_value: Optional[str] = None):
+    """Start a trace for this request if it is sampled; returns (trace, token) or None."""
+    profile = sampling_decision(header_value)
+    if profile is None:
+        return None
+    trace = Trace(name, profiled=False)
+    trace.profiled = profile and profiler.start(trace)
+    token = _current.set(trace.root)
+    if trace.profiled:
+        trace.enter_thread()
+    return trace, token
+
+
+def end(started, **attributes: Any) -> Trace:
+    """Finish a trace from begin() in the context that started it; pass the result to write()."""
+    trace, token = started
+    trace.root.finish()
+    trace.root.attributes.update(attributes)
+    if trace.profiled:
+        profiler.stop(trace)
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)
+    return trace
+
+
+def write(trace: Trace) -> None:
+    """Log the span summary and save the span tree (and profile) under TRACE_DIR."""
+    root = trace.root
+    if root.duration_ms() < TRACE_LOG_MS:
+        return
+    parts = ", ".join(f"{c.name}={c.duration_ms():.1f}ms" for c in root.children)
+    logger.info(f"trace {trace.id} {root.name} {root.duration_ms():.1f}ms [{parts}]")
+    try:
+        TRACE_DIR.mkdir(parents=True, exist_ok=True)
+        (TRACE_DIR / f"{trace.id}.json").write_text(json.dumps(root.to_dict(root.start), indent=2))
+        if trace.samples:
+            lines = [f"{stack} {count}" for stack, count in trace.samples.most_common()]
+            (TRACE_DIR / f"{trace.id}.folded").write_text("\n".join(lines) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not write trace {trace.id}: {e}")
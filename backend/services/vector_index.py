@@ -0,0 +1,266 @@
+import json
+import logging
+import re
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.services.response_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Words that carry no topic; dropped so "GST on hotel rooms" and "hotel room GST rate" share their features
+_STOPWORDS = frozenset("""
+    a an and are as at be by can do does for from how i if in is it me my of on or please should the to
+    what when where which who why will with you your
+""".split())
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashedNgramEmbedder:
+    """Feature-hashed word, word-bigram and character-trigram vectors; no model download, ~0.1 ms per query.
+
+    Catches rewordings, plurals and reordered words, not synonyms. crc32 keeps
+    the vectors identical across processes, so a saved index stays valid.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.name = f"hashed-ngram-{dim}"
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        words = [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+                 for w in _WORD_RE.findall(normalize_query(text)) if w not in _STOPWORDS]
+        features = [("w:" + w, 1.0) for w in words]
+        features += [("b:" + " ".join(sorted(pair)), 0.5) for pair in zip(words, words[1:])]
+        for w in words:
+            padded = f"<{w}>"
+            features += [("c:" + padded[i:i + 3], 0.3) for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """A local sentence-transformers model on CPU; understands synonyms, ~5-20 ms per query."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+        return vectors.astype(np.float32, copy=False)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """Inverted-file (IVF) nearest-neighbour index over unit vectors, with incremental adds and deletes.
+
+    Vectors live in one growable float32 matrix; similarity is the dot
+    product (cosine, since vectors are normalized). Once trained, every
+    vector belongs to the list of its nearest centroid and a search only
+    scores the `nprobe` lists closest to the query. Untrained or small
+    indexes are searched exhaustively. Deletes only mark the row dead;
+    compact() reclaims them. Each entry carries a feedback rating sum
+    and count.
+    """
+
+    EXACT_BELOW = 2048  # rows; below this a full scan is faster than probing lists
+
+    def __init__(self, dim: int, nprobe: int = 8):
+        self.dim = dim
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._size = 0
+        self._vectors = np.zeros((1024, dim), dtype=np.float32)
+        self._ids = np.zeros(1024, dtype=np.int64)
+        self._rating_sum = np.zeros(1024, dtype=np.float32)
+        self._rating_count = np.zeros(1024, dtype=np.int32)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._rows: Dict[int, int] = {}
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._list_arrays: Dict[int, np.ndarray] = {}
+        self.trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _grow(self) -> None:
+        capacity = len(self._ids) * 2
+        for name in ("_vectors", "_ids", "_rating_sum", "_rating_count", "_alive"):
+            old = getattr(self, name)
+            grown = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def add(self, entry_id: int, vector: np.ndarray, rating_sum: float, rating_count: int) -> None:
+        """Insert an entry, or add to the ratings of one that is already indexed."""
+        with self._lock:
+            row = self._rows.get(entry_id)
+            if row is not None:
+                self._rating_sum[row] += rating_sum
+                self._rating_count[row] += rating_count
+                return
+            if self._size == len(self._ids):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._vectors[row] = vector
+            self._ids[row] = entry_id
+            self._rating_sum[row] = rating_sum
+            self._rating_count[row] = rating_count
+            self._alive[row] = True
+            self._rows[entry_id] = row
+            if self.centroids is not None:
+                nearest = int(np.argmax(self.centroids @ vector))
+                self._lists[nearest].append(row)
+                self._list_arrays.pop(nearest, None)
+
+    def remove(self, entry_id: int) -> bool:
+        with self._lock:
+            row = self._rows.pop(entry_id, None)
+            if row is None:
+                return False
+            self._alive[row] = False
+            return True
+
+    def search(self, vector: np.ndarray, k: int = 1) -> List[Dict[str, Any]]:
+        """The k most similar live entries, most similar first."""
+        with self._lock:
+            if not self._rows:
+                return []
+            if self.centroids is None or len(self._rows) < self.EXACT_BELOW:
+                rows = np.flatnonzero(self._alive[:self._size])
+            else:
+                probe = np.argsort(self.centroids @ vector)[-self.nprobe:]
+                rows = np.concatenate([self._list_array(int(i)) for i in probe])
+                rows = rows[self._alive[rows]]
+            if not len(rows):
+                return []
+            scores = self._vectors[rows] @ vector
+            top = np.argsort(scores)[::-1][:k] if k > 1 else [int(np.argmax(scores))]
+            return [{
+                "id": int(self._ids[rows[i]]),
+                "similarity": float(scores[i]),
+                "rating_sum": float(self._rating_sum[rows[i]]),
+                "rating_count": int(self._rating_count[rows[i]]),
+            } for i in top]
+
+    def _list_array(self, index: int) -> np.ndarray:
+        array = self._list_arrays.get(index)
+        if array is None:
+            array = self._list_arrays[index] = np.asarray(self._lists[index], dtype=np.int64)
+        return array
+
+    def train(self, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0) -> None:
+        """Spherical k-means over (a sample of) the live vectors, then reassign every vector to a list."""
+        self.compact()
+        with self._lock:
+            vectors = self._vectors[:self._size]
+            if self._size < self.EXACT_BELOW:
+                self.centroids, self._lists, self._list_arrays = None, [], {}
+                return
+            nlist = nlist or max(16, int(np.sqrt(self._size)))
+            rng = np.random.default_rng(seed)
+            sample = vectors[rng.choice(self._size, size=min(self._size, nlist * 64), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                for i in range(nlist):
+                    members = sample[assignment == i]
+                    if len(members):
+                        centroids[i] = members.sum(axis=0)
+                centroids = _normalize(centroids)
+            assignment = np.concatenate([
+                np.argmax(vectors[start:start + 8192] @ centroids.T, axis=1)
+                for start in range(0, self._size, 8192)
+            ])
+            self.centroids = centroids
+            self._lists = [[] for _ in range(nlist)]
+            for row, i in enumerate(assignment):
+                self._lists[int(i)].append(row)
+            self._list_arrays = {}
+            self.trained_size = self._size
+
+    def compact(self) -> None:
+        """Drop deleted rows; list membership is rebuilt by the caller (train) when trained."""
+        with self._lock:
+            live = np.flatnonzero(self._alive[:self._size])
+            if len(live) == self._size:
+                return
+            self._load_arrays(self._ids[live], self._vectors[live], self._rating_sum[live], self._rating_count[live])
+
+    def _load_arrays(self, ids, vectors, rating_sum, rating_count) -> None:
+        capacity = max(1024, len(ids))
+        self._vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        self._vectors[:len(ids)] = vectors
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._ids[:len(ids)] = ids
+        self._rating_sum = np.zeros(capacity, dtype=np.float32)
+        self._rating_sum[:len(ids)] = rating_sum
+        self._rating_count = np.zeros(capacity, dtype=np.int32)
+        self._rating_count[:len(ids)] = rating_count
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:len(ids)] = True
+        self._size = len(ids)
+        self._rows = {int(entry_id): row for row, entry_id in enumerate(ids)}
+        if self.centroids is not None:
+            self._reassign()
+
+    def _reassign(self) -> None:
+        self._lists = [[] for _ in range(len(self.centroids))]
+        for start in range(0, self._size, 8192):
+            assignment = np.argmax(self._vectors[start:min(start + 8192, self._size)] @ self.centroids.T, axis=1)
+            for offset, i in enumerate(assignment):
+                self._lists[int(i)].append(start + offset)
+        self._list_arrays = {}
+
+    def save(self, path: str, **meta: Any) -> None:
+        self.compact()
+        with self._lock:
+            arrays = {
+                "ids": self._ids[:self._size],
+                "vectors": self._vectors[:self._size],
+                "rating_sum": self._rating_sum[:self._size],
+                "rating_count": self._rating_count[:self._size],
+            }
+            if self.centroids is not None:
+                arrays["centroids"] = self.centroids
+            with open(path, "wb") as f:
+                np.savez(f, meta=np.array([json.dumps(meta)]), **arrays)
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = 8) -> Tuple["VectorIndex", Dict[str, Any]]:
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"][0]))
+            index = cls(data["vectors"].shape[1], nprobe)
+            index.centroids = data["centroids"] if "centroids" in data else None
+            index._load_arrays(data["ids"], data["vectors"], data["rating_sum"], data["rating_count"])
+            index.trained_size = len(index)
+        return index, meta
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._rows),
+            "dead_rows": self._size - len(self._rows),
+            "lists": len(self._lists),
+            "nprobe": self.nprobe,
+            "trained_size": self.trained_size,
+        }
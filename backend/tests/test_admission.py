@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from backend.services.admission import PRIORITY_ANONYMOUS, PRIORITY_USER, AdmissionController, Overloaded
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_admits_up_to_the_cap_then_queues_in_priority_order():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, queue_size=4, queue_timeout=5)
+        release = await controller.enter()
+        order = []
+
+        async def wait(name, priority):
+            done = await controller.enter(priority)
+            order.append(name)
+            done()
+
+        waiters = [asyncio.ensure_future(wait("anonymous", PRIORITY_ANONYMOUS)),
+                   asyncio.ensure_future(wait("user", PRIORITY_USER))]
+        await asyncio.sleep(0.01)
+        assert controller.stats()["queue_depth"] == 2
+        release()
+        await asyncio.gather(*waiters)
+        return order, controller.stats()
+
+    order, stats = run(scenario())
+    assert order == ["user", "anonymous"]
+    assert stats["in_flight"] == 0
+    assert stats["admitted"] == 3
+
+
+def test_full_queue_rejects_anonymous_and_user_displaces_newest_anonymous():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, queue_size=1, queue_timeout=5)
+        release = await controller.enter()
+        queued = asyncio.ensure_future(controller.enter(PRIORITY_ANONYMOUS))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded):
+            await controller.enter(PRIORITY_ANONYMOUS)
+        user = asyncio.ensure_future(controller.enter(PRIORITY_USER))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded):
+            await queued
+        release()
+        (await user)()
+        return controller.stats()
+
+    stats = run(scenario())
+    assert stats["rejected"] == 1
+    assert stats["displaced"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_waiter_times_out_and_leaves_the_queue():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, queue_size=4, queue_timeout=0.02)
+        release = await controller.enter()
+        with pytest.raises(Overloaded):
+            await controller.enter()
+        release()
+        return controller.stats()
+
+    stats = run(scenario())
+    assert stats["timed_out"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, queue_size=4, queue_timeout=5)
+        release = await controller.enter()
+        waiter = asyncio.ensure_future(controller.enter())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+        release()
+        release()  # idempotent
+        return controller.stats()
+
+    stats = run(scenario())
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
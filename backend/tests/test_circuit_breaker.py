@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from backend.services.llm_concurrency import SlotTimeout
+from backend.services.llm_resilience import CircuitBreaker, LLMUnavailableError, ResilientLLMCaller
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.acquire() == 0
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.acquire() is None
+    assert breaker.rejected == 1
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    probe = breaker.acquire()
+    assert probe and breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.acquire() is None
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.acquire() == 0
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    assert breaker.acquire()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_release_probe_frees_half_open_after_probe_without_outcome():
+    # Regression: a cancelled probe used to leave half-open blocked forever
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    probe = breaker.acquire()
+    assert breaker.acquire() is None
+    breaker.release_probe(probe)
+    assert breaker.acquire() == probe + 1
+
+
+def test_stale_release_does_not_free_a_newer_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(breaker)
+    first = breaker.acquire()
+    breaker.release_probe(first)
+    second = breaker.acquire()
+    breaker.release_probe(first)
+    assert breaker.acquire() is None
+    breaker.release_probe(second)
+    assert breaker.acquire()
+
+
+def test_release_of_normal_call_is_a_no_op():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.release_probe(0)
+    assert breaker.acquire() == 0
+
+
+def test_cancelled_async_probe_releases_half_open():
+    caller = ResilientLLMCaller()
+    caller.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    open_breaker(caller.breaker)
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    async def ok():
+        return "answer"
+
+    async def scenario():
+        probe = asyncio.ensure_future(caller.call_async(hang, deadline=30))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LLMUnavailableError):
+            await caller.call_async(ok)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await caller.call_async(ok)
+
+    assert asyncio.run(scenario()) == "answer"
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_slot_timeout_does_not_count_as_upstream_failure():
+    caller = ResilientLLMCaller()
+    caller.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    caller.record_error(SlotTimeout())
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+    assert caller.breaker.consecutive_failures == 0
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import pytest
+
+from backend.services.chat_search import decode_search_cursor, encode_search_cursor
+from backend.services.chat_store import InvalidCursor, clamp_page_size, decode_cursor, encode_cursor
+
+
+def test_page_cursor_round_trips():
+    created_at = datetime(2025, 3, 4, 5, 6, 7, 891011)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+
+
+def test_search_cursor_round_trips_the_score_exactly():
+    score = 0.1 + 0.2
+    assert decode_search_cursor(encode_search_cursor(score, 99)) == (score, 99)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "bm9waXBl", encode_cursor(None, 1)[:-4]])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+    with pytest.raises(InvalidCursor):
+        decode_search_cursor(cursor)
+
+
+def test_page_size_is_clamped():
+    assert clamp_page_size(None) > 0
+    assert clamp_page_size(0) >= 1
+    assert clamp_page_size(10 ** 6) <= 100
@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from backend.services.chat_writer import ID_NODE_BITS, ID_SEQUENCE_BITS, IdGenerator
+
+
+@pytest.fixture
+def generator():
+    gen = IdGenerator()
+    gen._node = 5
+    gen._leased_at = time.monotonic()
+    return gen
+
+
+def test_ids_are_unique_and_increasing(generator):
+    ids = [generator.next_id() for _ in range(5000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert max(ids) < 2 ** 53
+
+
+def test_node_is_encoded_in_every_id(generator):
+    node_mask = (1 << ID_NODE_BITS) - 1
+    assert all((generator.next_id() >> ID_SEQUENCE_BITS) & node_mask == 5 for _ in range(100))
+
+
+def test_exhausted_sequence_borrows_the_next_millisecond(generator, monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1750000000.0)
+    ids = [generator.next_id() for _ in range(3 << ID_SEQUENCE_BITS)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+
+def test_lost_lease_leases_another_node(generator, monkeypatch):
+    monkeypatch.setattr(generator, "_renew", lambda: False)
+    monkeypatch.setattr(generator, "_reserve_node", lambda: 9)
+    generator._leased_at = 0.0  # lease due for renewal
+    assert (generator.next_id() >> ID_SEQUENCE_BITS) & ((1 << ID_NODE_BITS) - 1) == 9
+
+
+def test_renewal_error_keeps_a_lease_that_is_still_valid(generator, monkeypatch):
+    def unavailable():
+        raise ConnectionError("database down")
+
+    monkeypatch.setattr(generator, "_renew", unavailable)
+    monkeypatch.setattr("backend.services.chat_writer.ID_NODE_LEASE", 600.0)
+    generator._leased_at = time.monotonic() - 400  # past half the lease, well inside it
+    assert (generator.next_id() >> ID_SEQUENCE_BITS) & ((1 << ID_NODE_BITS) - 1) == 5
+    generator._leased_at = time.monotonic() - 590
+    with pytest.raises(ConnectionError):
+        generator.next_id()
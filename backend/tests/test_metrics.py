@@ -0,0 +1,34 @@
+import threading
+
+from backend.services.metrics import _CounterChild, _HistogramChild
+
+
+def test_counter_sums_every_thread():
+    counter = _CounterChild()
+    threads = [threading.Thread(target=lambda: [counter.inc() for _ in range(100)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc(0.5)
+    assert counter.value() == 800.5
+
+
+def test_exited_threads_do_not_leave_shards_behind():
+    # Regression: one shard per thread that ever touched the metric was kept forever
+    counter = _CounterChild()
+    for _ in range(200):
+        thread = threading.Thread(target=counter.inc)
+        thread.start()
+        thread.join()
+    assert counter.value() == 200
+    assert len(counter._values._shards) == 0
+
+
+def test_histogram_buckets_and_sum():
+    histogram = _HistogramChild((0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+    buckets, total = histogram.snapshot()
+    assert buckets == [1, 2, 1]
+    assert total == 6.05
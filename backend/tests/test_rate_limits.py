@@ -0,0 +1,55 @@
+import pytest
+
+from backend.services.admission import MemoryRateLimiter, RateLimited, RequestLimiter, SQLiteRateLimiter
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteRateLimiter(str(tmp_path / "rate_limits.sqlite3"))
+    return MemoryRateLimiter()
+
+
+def test_bucket_allows_burst_then_reports_wait(backend):
+    bucket = [("k", 2.0, 3.0)]
+    for _ in range(3):
+        assert backend.acquire(bucket) == [0.0]
+    (wait,) = backend.acquire(bucket)
+    assert 0 < wait <= 0.5
+
+
+def test_buckets_are_debited_together_or_not_at_all(backend):
+    user = ("user:a", 0.001, 5.0)
+    ip = ("ip:1", 0.001, 1.0)
+    assert backend.acquire([user, ip]) == [0.0, 0.0]
+    user_wait, ip_wait = backend.acquire([user, ip])
+    assert user_wait == 0 and ip_wait > 0
+    # The refused request left the user's remaining four tokens alone
+    assert backend.acquire([user], cost=4.0) == [0.0]
+
+
+def test_request_limiter_does_not_spend_user_token_when_ip_refuses(backend, monkeypatch):
+    # Regression: the user bucket used to be charged before the IP bucket refused
+    monkeypatch.setattr("backend.services.admission.RATE_LIMIT_IP_BURST", 1.0)
+    monkeypatch.setattr("backend.services.admission.RATE_LIMIT_IP_RATE", 0.001)
+    monkeypatch.setattr("backend.services.admission.RATE_LIMIT_USER_BURST", 2.0)
+    monkeypatch.setattr("backend.services.admission.RATE_LIMIT_USER_RATE", 0.001)
+    limiter = RequestLimiter(backend, enabled=True)
+    limiter._check(None, "10.0.0.1")
+    for _ in range(5):
+        with pytest.raises(RateLimited) as refused:
+            limiter._check("alice", "10.0.0.1")
+        assert refused.value.scope == "ip"
+    limiter._check("alice", "10.0.0.2")
+    limiter._check("alice", "10.0.0.3")
+    with pytest.raises(RateLimited) as refused:
+        limiter._check("alice", "10.0.0.4")
+    assert refused.value.scope == "user"
+    assert limiter.limited == {"user": 1, "ip": 5}
+
+
+def test_memory_limiter_is_bounded():
+    backend = MemoryRateLimiter(max_keys=10)
+    for i in range(50):
+        backend.acquire([(f"k{i}", 1.0, 1.0)])
+    assert backend.size() == 10
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.services.single_flight import (
+    AsyncSingleFlight, AsyncStreamFlight, SingleFlight, StreamCancelled, StreamFlight
+)
+
+
+def test_single_flight_collapses_concurrent_calls():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while flight.collapsed < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"executions": 1, "collapsed": 4, "in_flight": 0}
+
+
+def test_single_flight_shares_the_error():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_async_single_flight_survives_one_waiter_cancelling():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.do("k", work))
+        second = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "result"
+    assert len(calls) == 1
+
+
+def test_async_single_flight_cancels_when_last_waiter_leaves():
+    flight = AsyncSingleFlight()
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def scenario():
+        waiter = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert cancelled == [1]
+    assert flight.stats()["in_flight"] == 0
+
+
+def _chunks(n, delay=0.0):
+    for i in range(n):
+        if delay:
+            time.sleep(delay)
+        yield f"c{i}"
+
+
+def test_stream_flight_late_joiner_replays_chunks():
+    flight = StreamFlight()
+    gate = threading.Event()
+
+    def upstream():
+        yield "a"
+        gate.wait(5)
+        yield "b"
+
+    first = flight.subscribe("k", upstream)
+    assert next(first) == "a"
+    second = flight.subscribe("k", upstream)
+    assert next(second) == "a"  # replayed from the buffer
+    gate.set()
+    assert list(first) == ["b"]
+    assert list(second) == ["b"]
+    assert flight.stats()["executions"] == 1
+
+
+def test_stream_flight_never_joins_a_cancelled_stream():
+    # Regression: a caller arriving after every subscriber left used to get a truncated answer
+    flight = StreamFlight()
+    upstreams = []
+
+    def upstream():
+        upstreams.append(1)
+        return _chunks(20, delay=0.01)
+
+    first = flight.subscribe("k", upstream)
+    assert next(first) == "c0"
+    first.close()
+    assert list(flight.subscribe("k", upstream)) == [f"c{i}" for i in range(20)]
+    assert len(upstreams) == 2
+
+
+def test_async_stream_flight_late_joiner_replays_chunks():
+    flight = AsyncStreamFlight()
+    gate = asyncio.Event()
+
+    async def upstream():
+        yield "a"
+        await gate.wait()
+        yield "b"
+
+    async def scenario():
+        first = flight.subscribe("k", upstream)
+        assert await first.__anext__() == "a"
+        second = flight.subscribe("k", upstream)
+        assert await second.__anext__() == "a"  # replayed from the buffer
+        gate.set()
+        return [chunk async for chunk in first], [chunk async for chunk in second]
+
+    assert asyncio.run(scenario()) == (["b"], ["b"])
+    assert flight.stats() == {"executions": 1, "collapsed": 1, "in_flight": 0}
+
+
+def test_async_stream_flight_never_joins_a_cancelled_stream():
+    # Regression: the cancelled stream stayed joinable until upstream.aclose() returned
+    flight = AsyncStreamFlight()
+    upstreams = []
+
+    async def upstream():
+        upstreams.append(1)
+        try:
+            for i in range(5):
+                await asyncio.sleep(0.01)
+                yield f"c{i}"
+        finally:
+            await asyncio.sleep(0.05)  # slow close, as a gRPC stream can be
+
+    async def scenario():
+        first = flight.subscribe("k", upstream)
+        assert await first.__anext__() == "c0"
+        await first.aclose()
+        return [chunk async for chunk in flight.subscribe("k", upstream)]
+
+    assert asyncio.run(scenario()) == [f"c{i}" for i in range(5)]
+    assert len(upstreams) == 2
+
+
+def test_async_stream_flight_cancelled_stream_reports_an_error():
+    flight = AsyncStreamFlight()
+
+    async def upstream():
+        yield "a"
+        await asyncio.sleep(60)
+
+    async def scenario():
+        subscription = flight.subscribe("k", upstream)
+        await subscription.__anext__()
+        shared = flight._streams["k"]
+        await subscription.aclose()
+        await asyncio.wait_for(shared.task, 5)
+        return shared
+
+    shared = asyncio.run(scenario())
+    assert shared.done
+    assert isinstance(shared.error, StreamCancelled)
@@ -0,0 +1,78 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from backend.services.vector_index import HashedNgramEmbedder, VectorIndex  # noqa: E402
+
+
+def unit_vectors(count, dim, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_exact_search_finds_the_nearest_entry():
+    index = VectorIndex(dim=16)
+    vectors = unit_vectors(50, 16)
+    for i, vector in enumerate(vectors):
+        index.add(i, vector, rating_sum=4.0, rating_count=1)
+    result = index.search(vectors[17], k=3)
+    assert result[0]["id"] == 17
+    assert result[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+    assert [r["similarity"] for r in result] == sorted((r["similarity"] for r in result), reverse=True)
+
+
+def test_adding_an_indexed_id_accumulates_ratings():
+    index = VectorIndex(dim=4)
+    vector = unit_vectors(1, 4)[0]
+    index.add(1, vector, 5.0, 1)
+    index.add(1, vector, 3.0, 1)
+    assert len(index) == 1
+    assert index.search(vector)[0]["rating_sum"] == 8.0
+    assert index.search(vector)[0]["rating_count"] == 2
+
+
+def test_removed_entries_are_not_returned_and_compact_reclaims_them():
+    index = VectorIndex(dim=8)
+    vectors = unit_vectors(10, 8)
+    for i, vector in enumerate(vectors):
+        index.add(i, vector, 0.0, 0)
+    assert index.remove(3)
+    assert not index.remove(3)
+    assert all(r["id"] != 3 for r in index.search(vectors[3], k=10))
+    index.compact()
+    assert len(index) == 9
+    assert index.search(vectors[4])[0]["id"] == 4
+
+
+def test_trained_index_keeps_recall_for_stored_vectors():
+    index = VectorIndex(dim=32, nprobe=8)
+    vectors = unit_vectors(VectorIndex.EXACT_BELOW + 500, 32)
+    for i, vector in enumerate(vectors):
+        index.add(i, vector, 0.0, 0)
+    index.train(seed=1)
+    assert index.centroids is not None
+    hits = sum(index.search(vectors[i])[0]["id"] == i for i in range(0, len(vectors), 25))
+    assert hits / len(range(0, len(vectors), 25)) >= 0.95
+    extra = unit_vectors(1, 32, seed=7)[0]
+    index.add(10 ** 6, extra, 0.0, 0)
+    assert index.search(extra)[0]["id"] == 10 ** 6
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = VectorIndex(dim=8)
+    vectors = unit_vectors(5, 8)
+    for i, vector in enumerate(vectors):
+        index.add(i + 100, vector, float(i), i)
+    path = str(tmp_path / "index.npz")
+    index.save(path, embedder="test")
+    loaded, meta = VectorIndex.load(path)
+    assert meta == {"embedder": "test"}
+    assert len(loaded) == 5
+    assert loaded.search(vectors[2])[0] == index.search(vectors[2])[0]
+
+
+def test_hashed_embedder_matches_rewordings():
+    embedder = HashedNgramEmbedder(dim=256)
+    a, b, c = embedder.embed(["GST on hotel rooms", "hotel room GST rate", "how do I reset my password"])
+    assert float(a @ b) > float(a @ c)
+    assert float(a @ a) == pytest.approx(1.0, abs=1e-5)
@@ -36,7 +36,7 @@ const MessagesSection = ({ isLoggedIn, onAuthSuccess }) => {
                     .then((data) => {
                         setConversations(data || []);
                         if (data && data.length > 0) {
-                            setActiveConversation(data[0]);
+                            openConversation(data[0]);
                         }
                     })
                     .catch((error) => {
@@ -182,6 +182,20 @@ const MessagesSection = ({ isLoggedIn, onAuthSuccess }) => {
         }
     };
 
+    // Archived conversations come without messages; fetch them the first time one is opened
+    const openConversation = async (conversation) => {
+        setActiveConversation(conversation);
+        if (!conversation.archived) return;
+        try {
+            const messages = await chatService.getConversationMessages(conversation.id);
+            const loaded = { ...conversation, archived: false, messages };
+            setConversations(convs => convs.map(conv => conv.id === conversation.id ? loaded : conv));
+            setActiveConversation(active => (active && active.id === conversation.id ? loaded : active));
+        } catch (error) {
+            alert(error);
+        }
+    };
+
     const handleDeleteConversation = async (conversationId) => {
         try {
             await chatService.deleteConversation(conversationId);
@@ -245,7 +259,7 @@ const MessagesSection = ({ isLoggedIn, onAuthSuccess }) => {
                             <div
                                 key={conversation.id}
                                 className={`conversation-item ${fadeClass}`}
-                                onClick={() => setActiveConversation(conversation)}
+                                onClick={() => openConversation(conversation)}
                             >
                                 <div className="conversation-title">{conversation.title}</div>
                                 <div className="conversation-preview">{conversation.messages.length > 0 ? conversation.messages[conversation.messages.length-1].content : ''}</div>
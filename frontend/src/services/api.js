@@ -39,6 +39,24 @@ api.interceptors.response.use(
 );
 
 // Authentication Services
+// Turn stored question/answer pairs into the user and bot messages the chat view shows
+const toChatMessages = (messages) => messages.flatMap(msg => ([
+    {
+        id: msg.id,
+        sender: "user",
+        senderName: "You",
+        time: new Date(msg.created_at).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
+        content: msg.user_message
+    },
+    {
+        id: msg.id,
+        sender: "system",
+        senderName: "Chatbot",
+        time: new Date(msg.created_at).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
+        content: msg.bot_response
+    }
+]));
+
 export const authService = {
     // Register new user
     signup: async (userData) => {
@@ -179,22 +197,9 @@ export const chatService = {
                 id: session.id,
                 title: session.title,
                 created_at: session.created_at,
-                messages: session.messages.flatMap(msg => ([
-                    {
-                        id: msg.id,
-                        sender: "user",
-                        senderName: "You",
-                        time: new Date(msg.created_at).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-                        content: msg.user_message
-                    },
-                    {
-                        id: msg.id,
-                        sender: "system",
-                        senderName: "Chatbot",
-                        time: new Date(msg.created_at).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-                        content: msg.bot_response
-                    }
-                ]))
+                // Archived conversations are listed without messages; load them when opened
+                archived: Boolean(session.archived),
+                messages: toChatMessages(session.messages)
             }));
         } catch (error) {
             console.error('Get conversations error:', error);
@@ -202,6 +207,26 @@ export const chatService = {
         }
     },
 
+    // Get all messages of one conversation, page by page
+    getConversationMessages: async (sessionId) => {
+        try {
+            if (!sessionId) throw new Error('Session ID is required');
+            const messages = [];
+            let cursor = null;
+            do {
+                const response = await api.get(`/chat/conversation/${sessionId}/messages`, {
+                    params: cursor ? { limit: 100, cursor } : { limit: 100 }
+                });
+                messages.push(...response.data.messages);
+                cursor = response.data.next_cursor;
+            } while (cursor);
+            return toChatMessages(messages);
+        } catch (error) {
+            console.error('Get conversation messages error:', error);
+            throw error.response?.data?.error || error.message || 'Failed to fetch conversation messages';
+        }
+    },
+
     // Delete a conversation
     deleteConversation: async (sessionId) => {
         try {
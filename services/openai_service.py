@@ -3,7 +3,7 @@ from dotenv import load_dotenv
 from typing import List, Dict, Any
 import json
 import logging
-import google.generativeai as genai
+import threading
 from config import GEMINI_API_KEY
 
 # Configure logging
@@ -12,15 +12,40 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-# Configure the Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
+MODEL_NAME = 'gemini-1.5-pro-latest'
 
-# List available models
-available_models = [m.name for m in genai.list_models()]
-logger.info(f"Available models: {available_models}")
+# The SDK is configured and the model created on first use, not at import
+_model = None
+_available_models = None
+_lock = threading.Lock()
 
-# Initialize the model
-model = genai.GenerativeModel('gemini-1.5-pro-latest')
+def _genai():
+    import google.generativeai as genai
+    return genai
+
+def get_model():
+    """Configure the Gemini API and create the model on first call"""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                genai = _genai()
+                genai.configure(api_key=GEMINI_API_KEY)
+                _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+def list_available_models() -> List[str]:
+    """Model names visible to this API key (one network call, then cached)"""
+    global _available_models
+    if _available_models is None:
+        get_model()
+        _available_models = [m.name for m in _genai().list_models()]
+        logger.info(f"Available models: {_available_models}")
+    return _available_models
+
+def warm_up() -> None:
+    """Create the model ahead of the first request"""
+    get_model()
 
 # System prompt for the chatbot
 SYSTEM_PROMPT = """You are a professional tax and finance expert chatbot. Your expertise includes:
@@ -41,7 +66,7 @@ def get_chat_response(message: str) -> str:
         prompt = f"{SYSTEM_PROMPT}\n\nUser: {message}"
         
         # Generate response
-        response = model.generate_content(prompt)
+        response = get_model().generate_content(prompt)
         
         # Extract and return the response text
         return response.text